@@ -0,0 +1,57 @@
+"""
+Benchmark: per-record vs. NumPy patient generation
+
+Compares records per second of the original per-record generator
+(generate_patient) against the batched NumPy engine
+(iter_patients_vectorized). Only generation is timed; nothing is written.
+
+Usage:
+    python generators/benchmark_patient_engines.py [--records N] [--batch-size N]
+
+Example output:
+    record engine :    100,000 patients in   6.79s  (    14,721 rec/s)
+    numpy engine  :    100,000 patients in   1.56s  (    64,104 rec/s)
+    speedup       : 4.4x
+"""
+
+import argparse
+import random
+import time
+
+import generate_patient_data as gpd
+
+
+def time_engine(label, make_records, num_records):
+    start = time.perf_counter()
+    count = sum(1 for _ in make_records())
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else float("inf")
+    print(f"{label:<14}: {count:>10,} patients in {elapsed:6.2f}s  ({rate:>10,.0f} rec/s)")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark patient generation engines")
+    parser.add_argument("--records", type=int, default=100_000, help="Patients per engine")
+    parser.add_argument("--batch-size", type=int, default=gpd.DEFAULT_BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if not gpd.HAS_NUMPY:
+        print("✗ numpy not installed. Run: pip install numpy")
+        return
+
+    random.seed(args.seed)
+    record_rate = time_engine(
+        "record engine", lambda: gpd.iter_patients(args.records), args.records
+    )
+    numpy_rate = time_engine(
+        "numpy engine",
+        lambda: gpd.iter_patients_vectorized(args.records, args.seed, args.batch_size),
+        args.records,
+    )
+    print(f"{'speedup':<14}: {numpy_rate / record_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
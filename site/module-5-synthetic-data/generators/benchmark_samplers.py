@@ -0,0 +1,107 @@
+"""
+Benchmark: per-record random.choices(weights=...) vs. precomputed samplers
+
+Times the categorical draws generate_vehicle() makes for every record (make,
+condition, title status, recall status) three ways:
+
+    choices : random.choices(values, weights=[...])[0] and
+              random.choice(list(MAKES_MODELS.keys())) — the old per-record code
+    cdf     : CategoricalSampler.draw() — cumulative weights built once
+    alias   : AliasTable.draw() and a precomputed MAKES list — what the generator uses
+
+and the batched AliasTable.sample(k) path for comparison. Then times the full
+generate_vehicle() for the same number of records, to put the savings in context.
+
+Usage:
+    python generators/benchmark_samplers.py [--records N]
+
+Example output (1M vehicles):
+    choices      :  1,000,000 vehicles   7.80s  (7.80 us/record)
+    cdf          :  1,000,000 vehicles   1.93s  (1.93 us/record)
+    alias        :  1,000,000 vehicles   2.11s  (2.11 us/record)
+    alias batch  :  1,000,000 vehicles   0.93s  (0.93 us/record)
+    vehicle      :  1,000,000 vehicles  18.79s  (18.79 us/record)
+    saved        : 5.68 us/record (5.7s per 1,000,000 vehicles, 23% of generate_vehicle)
+
+With only 3-6 categories the alias and CDF draws cost about the same; the win
+comes from not rebuilding the weights (and the makes list) on every record.
+"""
+
+import argparse
+import random
+import time
+
+import generate_lithia_data as gld
+from samplers import AliasTable, CategoricalSampler
+
+CATEGORIES = [
+    (gld.CONDITIONS, [30, 50, 20]),
+    (gld.TITLE_STATUS, [85, 5, 7, 3]),
+    (gld.RECALL_STATUS, [70, 15, 15]),
+]
+
+
+def draw_choices(n):
+    for _ in range(n):
+        random.choice(list(gld.MAKES_MODELS.keys()))
+        for values, weights in CATEGORIES:
+            random.choices(values, weights=weights)[0]
+
+
+def make_draw_sampler(sampler_cls):
+    draws = [sampler_cls(values, weights).draw for values, weights in CATEGORIES]
+    makes = list(gld.MAKES_MODELS)
+
+    def run(n):
+        for _ in range(n):
+            random.choice(makes)
+            for draw in draws:
+                draw()
+
+    return run
+
+
+def draw_alias_batch(n):
+    makes = list(gld.MAKES_MODELS)
+    random.choices(makes, k=n)
+    for values, weights in CATEGORIES:
+        AliasTable(values, weights).sample(n)
+
+
+def draw_vehicles(n):
+    for _ in range(n):
+        gld.generate_vehicle()
+
+
+def time_run(label, run, num_records):
+    start = time.perf_counter()
+    run(num_records)
+    elapsed = time.perf_counter() - start
+    per_record = elapsed / num_records * 1e6
+    print(f"{label:<13}: {num_records:>10,} vehicles {elapsed:6.2f}s  ({per_record:.2f} us/record)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark categorical samplers")
+    parser.add_argument("--records", type=int, default=1_000_000, help="Vehicles to simulate")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    n = args.records
+
+    random.seed(args.seed)
+    baseline = time_run("choices", draw_choices, n)
+    time_run("cdf", make_draw_sampler(CategoricalSampler), n)
+    alias = time_run("alias", make_draw_sampler(AliasTable), n)
+    time_run("alias batch", draw_alias_batch, n)
+    full = time_run("vehicle", draw_vehicles, n)
+
+    saved = baseline - alias
+    print(
+        f"{'saved':<13}: {saved / n * 1e6:.2f} us/record "
+        f"({saved:.1f}s per {n:,} vehicles, {saved / (full + saved):.0%} of generate_vehicle)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Parallel, throttled DynamoDB bulk loader
+
+Loads an iterable of records into a DynamoDB table with BatchWriteItem calls
+(25 items each) spread over a thread pool:
+
+- Records are converted straight to DynamoDB's wire format (AttributeValues)
+  one at a time as batches are formed — no Decimal deep copy of the dataset.
+- Items DynamoDB returns as UnprocessedItems, and batches rejected with a
+  throttling error, are retried with exponential backoff plus jitter.
+- --target-wps caps the write rate with a token bucket. When DynamoDB pushes
+  back, the rate is halved and then climbs back toward the target (AIMD).
+- Only a bounded number of batches is in flight, so memory stays flat for any
+  input size.
+- Table existence is checked with DescribeTable (one call, no pagination).
+
+Throughput, retries and throttling events are reported at the end.
+
+Usage:
+    python generators/dynamo_loader.py --file datasets/lithia/vehicles.jsonl --table lithia-vehicles
+        [--threads 16] [--target-wps 5000] [--endpoint-url http://localhost:8000]
+
+    --endpoint-url points at a local stand-in (DynamoDB Local or `moto_server`)
+    so loads can be tested without AWS.
+
+From Python:
+    from dynamo_loader import BulkLoader, ensure_table, make_client
+
+    client = make_client(region="us-west-2", threads=16)
+    ensure_table(client, "lithia-vehicles")
+    stats = BulkLoader(client, "lithia-vehicles", threads=16).load(records)
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+try:
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+
+    HAS_BOTO3 = True
+except ImportError:
+    HAS_BOTO3 = False
+
+# BatchWriteItem accepts at most 25 put requests
+BATCH_SIZE = 25
+
+DEFAULT_THREADS = 16
+
+# Retry schedule for unprocessed / throttled batches (seconds)
+BASE_BACKOFF = 0.05
+MAX_BACKOFF = 5.0
+MAX_ATTEMPTS = 12
+
+THROTTLE_ERRORS = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+}
+
+
+def require_boto3():
+    if not HAS_BOTO3:
+        raise ImportError("boto3 is required for DynamoDB uploads — run: pip install boto3")
+
+
+def to_attribute_value(value):
+    """Convert one Python value to a DynamoDB AttributeValue"""
+    if isinstance(value, str):
+        return {"S": value}
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, (int, float)):
+        return {"N": str(value)}
+    if isinstance(value, dict):
+        return {"M": {k: to_attribute_value(v) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {"L": [to_attribute_value(v) for v in value]}
+    if value is None:
+        return {"NULL": True}
+    return {"N": str(value)}  # Decimal
+
+
+def to_item(record):
+    return {k: to_attribute_value(v) for k, v in record.items()}
+
+
+def positive_int(value):
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return n
+
+
+class TokenBucket:
+    """Thread-safe write-rate limiter with multiplicative decrease on throttling
+
+    `target` is items per second (None = unlimited). After a throttle the rate
+    is halved (at most once per second, since every in-flight batch sees the
+    same throttling), then grows by 5% of the target per second.
+    """
+
+    def __init__(self, target=None, min_rate=25):
+        self.target = target
+        self.rate = target
+        # never push the rate back above a target that is lower than min_rate
+        self.min_rate = min(min_rate, target) if target else min_rate
+        self._tokens = float(target or 0)
+        self._last = time.monotonic()
+        self._last_cut = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, n):
+        if not self.target:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed = now - self._last
+                self._last = now
+                self.rate = min(self.target, self.rate + 0.05 * self.target * elapsed)
+                # a burst of n must fit, or acquire(n) with n > rate never succeeds
+                self._tokens = min(max(self.rate, n), self._tokens + elapsed * self.rate)
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return
+                wait_for = (n - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+    def throttled(self):
+        if self.target:
+            with self._lock:
+                now = time.monotonic()
+                if now - self._last_cut >= 1.0:
+                    self.rate = max(self.min_rate, self.rate / 2)
+                    self._last_cut = now
+
+
+class LoadStats:
+    def __init__(self):
+        self.items = 0
+        self.batches = 0
+        self.retried_items = 0
+        self.throttle_events = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, items=0, batches=0, retried_items=0, throttle_events=0):
+        with self._lock:
+            self.items += items
+            self.batches += batches
+            self.retried_items += retried_items
+            self.throttle_events += throttle_events
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def items_per_second(self):
+        return self.items / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (
+            f"{self.items:,} items in {self.elapsed:.1f}s ({self.items_per_second:,.0f} items/s), "
+            f"{self.batches:,} batches, {self.retried_items:,} items retried, "
+            f"{self.throttle_events:,} throttle events"
+        )
+
+
+class BulkLoader:
+    """Write records to one table with BatchWriteItem across a thread pool"""
+
+    def __init__(
+        self,
+        client,
+        table_name,
+        threads=DEFAULT_THREADS,
+        target_wps=None,
+        max_attempts=MAX_ATTEMPTS,
+    ):
+        self.client = client
+        self.table_name = table_name
+        self.threads = threads
+        self.bucket = TokenBucket(target_wps)
+        self.max_attempts = max_attempts
+        self.stats = None
+
+    def _batches(self, records):
+        batch = []
+        for record in records:
+            batch.append({"PutRequest": {"Item": to_item(record)}})
+            if len(batch) == BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _backoff(self, attempt):
+        time.sleep(random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2**attempt)))
+
+    def _write_batch(self, requests):
+        written = len(requests)
+        for attempt in range(self.max_attempts):
+            self.bucket.acquire(len(requests))
+            try:
+                response = self.client.batch_write_item(RequestItems={self.table_name: requests})
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in THROTTLE_ERRORS:
+                    raise
+                self.stats.add(throttle_events=1, retried_items=len(requests))
+                self.bucket.throttled()
+                self._backoff(attempt)
+                continue
+
+            requests = response.get("UnprocessedItems", {}).get(self.table_name, [])
+            if not requests:
+                self.stats.add(items=written, batches=1)
+                return
+            self.stats.add(throttle_events=1, retried_items=len(requests))
+            self.bucket.throttled()
+            self._backoff(attempt)
+        raise RuntimeError(
+            f"{len(requests)} items still unprocessed after {self.max_attempts} attempts "
+            f"writing to {self.table_name}"
+        )
+
+    def load(self, records, progress_every=100_000):
+        """Write every record; returns LoadStats. Raises on the first failed batch."""
+        self.stats = LoadStats()
+        max_in_flight = self.threads * 2
+        next_report = progress_every
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            for batch in self._batches(records):
+                if len(pending) >= max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(pool.submit(self._write_batch, batch))
+                if progress_every and self.stats.items >= next_report:
+                    elapsed = time.perf_counter() - self.stats.started
+                    print(f"    {self.stats.items:,} items ({self.stats.items / elapsed:,.0f}/s)")
+                    next_report += progress_every
+            for future in wait(pending).done:
+                future.result()
+        return self.stats.finish()
+
+
+def make_client(profile=None, region="us-west-2", endpoint_url=None, threads=DEFAULT_THREADS):
+    """Low-level DynamoDB client sized for `threads` concurrent requests
+
+    Clients (unlike boto3 resources) are thread-safe, so one is shared by the
+    whole pool. Local endpoints get dummy credentials if none are configured.
+    """
+    require_boto3()
+    session = boto3.Session(profile_name=profile, region_name=region)
+    kwargs = {}
+    if endpoint_url:
+        kwargs["endpoint_url"] = endpoint_url
+        if session.get_credentials() is None:
+            kwargs.update(aws_access_key_id="local", aws_secret_access_key="local")
+    config = Config(max_pool_connections=threads, retries={"mode": "standard"})
+    return session.client("dynamodb", config=config, **kwargs)
+
+
+def ensure_table(client, name, key="id"):
+    """Create the table (on-demand billing) unless DescribeTable finds it"""
+    try:
+        client.describe_table(TableName=name)
+        print(f"  ✓ Table exists: {name}")
+        return
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ResourceNotFoundException":
+            raise
+    print(f"  Creating table: {name}")
+    client.create_table(
+        TableName=name,
+        AttributeDefinitions=[{"AttributeName": key, "AttributeType": "S"}],
+        KeySchema=[{"AttributeName": key, "KeyType": "HASH"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    client.get_waiter("table_exists").wait(TableName=name)
+    print(f"  ✓ Table ready: {name}")
+
+
+def main():
+    from synth_io import iter_jsonl
+
+    parser = argparse.ArgumentParser(description="Bulk-load a JSON Lines file into DynamoDB")
+    parser.add_argument("--file", required=True, help="JSON Lines file of records")
+    parser.add_argument("--table", required=True, help="DynamoDB table name")
+    parser.add_argument("--key", default="id", help="Partition key if the table is created")
+    parser.add_argument("--threads", type=positive_int, default=DEFAULT_THREADS)
+    parser.add_argument("--target-wps", type=positive_int, default=None, help="Target writes per second")
+    parser.add_argument("--endpoint-url", default=None, help="e.g. http://localhost:8000")
+    parser.add_argument("--profile", default=os.environ.get("AWS_PROFILE"))
+    parser.add_argument("--region", default=os.environ.get("AWS_DEFAULT_REGION", "us-west-2"))
+    args = parser.parse_args()
+
+    if not HAS_BOTO3:
+        print("✗ boto3 not installed. Run: pip install boto3")
+        return
+
+    client = make_client(args.profile, args.region, args.endpoint_url, args.threads)
+    ensure_table(client, args.table, args.key)
+    loader = BulkLoader(client, args.table, args.threads, args.target_wps)
+    stats = loader.load(iter_jsonl(args.file))
+    print(f"  ✓ {args.table}: {stats.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,17 +3,44 @@ Synthetic Dental Records Generator
 
 This script generates synthetic dental examination records for educational purposes.
 All data is completely fictional and does not represent real patients.
+
+Usage:
+    python generate_dental_data.py [--records N] [--format json|jsonl|parquet] [--seed S]
+
+    --records N      Number of visits to generate (default: 100)
+    --format jsonl   Stream records to JSON Lines + CSV in one pass instead of
+                     building the whole list in memory (use for 10M+ rows)
+    --format parquet Stream records into a zstd-compressed Parquet file with
+                     teeth_assessment, pocket_depths etc. as nested list columns
+                     (requires pyarrow)
+    --seed S         Random seed (default: 42); root seed for sharded runs
+    --shards M       Split generation into M shards, each with its own seed
+                     derived from --seed (requires --format jsonl or parquet)
+    --workers N      Generate shards across N processes; output is identical
+                     for any N
+    --merge          Concatenate the shard part files into one dataset
 """
 
+import argparse
 import random
-import json
 from datetime import datetime, timedelta
-import csv
-import os
+from functools import partial
+
+from synth_io import FORMATS, require_pyarrow, write_dataset
+from synth_shards import (
+    add_shard_arguments,
+    merge_dataset,
+    part_base,
+    resolve_shard_arguments,
+    run_shards,
+)
 
 # Seed for reproducibility
 random.seed(42)
 
+# Reference time for generated dates (pinned for sharded runs; None = now)
+AS_OF = None
+
 # Configuration
 NUM_VISITS = 100
 
@@ -65,6 +92,10 @@ CHIEF_COMPLAINTS = [
 ORAL_HYGIENE_RATINGS = ["excellent", "good", "fair", "poor"]
 
 
+def _now():
+    return AS_OF or datetime.now()
+
+
 def generate_visit_id(index):
     """Generate unique visit ID"""
     return f"V{index:010d}"
@@ -83,7 +114,7 @@ def generate_provider_id():
 def generate_visit_date():
     """Generate visit date within last 2 years"""
     days_ago = random.randint(0, 730)
-    return (datetime.now() - timedelta(days=days_ago)).strftime("%Y-%m-%d")
+    return (_now() - timedelta(days=days_ago)).strftime("%Y-%m-%d")
 
 
 def generate_teeth_assessment():
@@ -264,12 +295,19 @@ def generate_imaging():
     return images
 
 
-def generate_dental_visit():
-    """Generate a complete synthetic dental visit record"""
-    visit_index = random.randint(1, 9999999999)
-    visit_id = generate_visit_id(visit_index)
-    patient_id = generate_patient_id()
-    provider_id = generate_provider_id()
+def generate_dental_visit(patient_id=None, provider_id=None, visit_id=None):
+    """Generate a complete synthetic dental visit record
+
+    IDs are random unless given; generate_linked_data.py passes IDs drawn from
+    shared patient and provider pools so visits join to real patients.
+    """
+    if visit_id is None:
+        visit_index = random.randint(1, 9999999999)
+        visit_id = generate_visit_id(visit_index)
+    if patient_id is None:
+        patient_id = generate_patient_id()
+    if provider_id is None:
+        provider_id = generate_provider_id()
     visit_date = generate_visit_date()
 
     chief_complaint = random.choice(CHIEF_COMPLAINTS)
@@ -285,9 +323,7 @@ def generate_dental_visit():
     if random.random() < 0.8:
         days_forward = random.choice([180, 365])  # 6 months or 1 year
         next_apt = {
-            "recommended_date": (datetime.now() + timedelta(days=days_forward)).strftime(
-                "%Y-%m-%d"
-            ),
+            "recommended_date": (_now() + timedelta(days=days_forward)).strftime("%Y-%m-%d"),
             "reason": "Routine checkup and cleaning",
         }
 
@@ -309,67 +345,200 @@ def generate_dental_visit():
     }
 
 
+CSV_FIELDS = [
+    "visit_id",
+    "patient_id",
+    "visit_date",
+    "provider_id",
+    "chief_complaint",
+    "num_teeth_issues",
+    "psr_code",
+    "bleeding_on_probing",
+    "oral_hygiene_index",
+    "num_treatments_planned",
+    "num_procedures_performed",
+    "num_images",
+    "next_appointment_scheduled",
+]
+
+
+def flatten_visit(visit):
+    """Flatten a dental visit record into a CSV summary row"""
+    examination = visit["examination"]
+    return {
+        "visit_id": visit["visit_id"],
+        "patient_id": visit["patient_id"],
+        "visit_date": visit["visit_date"],
+        "provider_id": visit["provider_id"],
+        "chief_complaint": examination["chief_complaint"],
+        "num_teeth_issues": len(examination["teeth_assessment"]),
+        "psr_code": examination["periodontal_screening"]["psr_code"],
+        "bleeding_on_probing": examination["periodontal_screening"]["bleeding_on_probing"],
+        "oral_hygiene_index": examination["oral_hygiene_index"],
+        "num_treatments_planned": len(visit["treatment_plan"]),
+        "num_procedures_performed": len(visit["procedures_performed"]),
+        "num_images": len(visit["imaging"]),
+        "next_appointment_scheduled": visit["next_appointment"] is not None,
+    }
+
+
+def iter_dental_visits(num_visits):
+    """Yield `num_visits` dental visit records"""
+    for _ in range(num_visits):
+        yield generate_dental_visit()
+
+
+def parquet_schema():
+    """Arrow schema for the nested visit record (teeth, pockets etc. stay list columns)"""
+    pa = require_pyarrow()
+    procedure = [("procedure_code", pa.string()), ("description", pa.string())]
+    return pa.schema(
+        [
+            ("patient_id", pa.string()),
+            ("visit_id", pa.string()),
+            ("visit_date", pa.string()),
+            ("provider_id", pa.string()),
+            (
+                "examination",
+                pa.struct(
+                    [
+                        ("chief_complaint", pa.string()),
+                        (
+                            "teeth_assessment",
+                            pa.list_(
+                                pa.struct(
+                                    [
+                                        ("tooth_number", pa.int8()),
+                                        ("condition", pa.string()),
+                                        ("surface", pa.string()),
+                                        ("notes", pa.string()),
+                                    ]
+                                )
+                            ),
+                        ),
+                        (
+                            "periodontal_screening",
+                            pa.struct(
+                                [
+                                    ("psr_code", pa.int8()),
+                                    ("bleeding_on_probing", pa.bool_()),
+                                    (
+                                        "pocket_depths",
+                                        pa.list_(
+                                            pa.struct(
+                                                [
+                                                    ("tooth_number", pa.int8()),
+                                                    ("measurements", pa.list_(pa.int8())),
+                                                ]
+                                            )
+                                        ),
+                                    ),
+                                ]
+                            ),
+                        ),
+                        ("oral_hygiene_index", pa.string()),
+                    ]
+                ),
+            ),
+            (
+                "treatment_plan",
+                pa.list_(
+                    pa.struct(
+                        procedure
+                        + [
+                            ("tooth_number", pa.int8()),
+                            ("priority", pa.string()),
+                            ("estimated_cost", pa.int32()),
+                        ]
+                    )
+                ),
+            ),
+            (
+                "procedures_performed",
+                pa.list_(
+                    pa.struct(
+                        procedure + [("tooth_number", pa.int8()), ("anesthesia_used", pa.bool_())]
+                    )
+                ),
+            ),
+            (
+                "imaging",
+                pa.list_(
+                    pa.struct(
+                        [
+                            ("image_type", pa.string()),
+                            ("image_id", pa.string()),
+                            ("findings", pa.string()),
+                        ]
+                    )
+                ),
+            ),
+            (
+                "next_appointment",
+                pa.struct([("recommended_date", pa.string()), ("reason", pa.string())]),
+            ),
+        ]
+    )
+
+
+BASE_PATH = "datasets/dental-records/synthetic_dental_visits"
+
+
+def write_visits(visits, base, fmt):
+    """Write visits as json/jsonl (+ CSV) or parquet; returns (count, path)"""
+    return write_dataset(visits, base, fmt, CSV_FIELDS, flatten_visit, parquet_schema)
+
+
+def write_shard(index, seed, as_of, counts, fmt="jsonl"):
+    """Generate one shard into its own part files (runs in a worker process)"""
+    global AS_OF
+    AS_OF = as_of
+    (num_visits,) = counts
+    random.seed(seed)
+    count, _ = write_visits(iter_dental_visits(num_visits), part_base(BASE_PATH, index), fmt)
+    return count
+
+
 def main():
     """Generate synthetic dental visit dataset"""
-    print(f"Generating {NUM_VISITS} synthetic dental visit records...")
-
-    visits = []
-    for i in range(NUM_VISITS):
-        visit = generate_dental_visit()
-        visits.append(visit)
-
-    # Create output directory if it doesn't exist
-    os.makedirs("datasets/dental-records", exist_ok=True)
-
-    # Save as JSON
-    json_file = "datasets/dental-records/synthetic_dental_visits.json"
-    with open(json_file, "w") as f:
-        json.dump(visits, f, indent=2)
-    print(f"Saved JSON to {json_file}")
-
-    # Save as CSV (flattened version)
-    csv_file = "datasets/dental-records/synthetic_dental_visits.csv"
-    with open(csv_file, "w", newline="") as f:
-        fieldnames = [
-            "visit_id",
-            "patient_id",
-            "visit_date",
-            "provider_id",
-            "chief_complaint",
-            "num_teeth_issues",
-            "psr_code",
-            "bleeding_on_probing",
-            "oral_hygiene_index",
-            "num_treatments_planned",
-            "num_procedures_performed",
-            "num_images",
-            "next_appointment_scheduled",
-        ]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for visit in visits:
-            row = {
-                "visit_id": visit["visit_id"],
-                "patient_id": visit["patient_id"],
-                "visit_date": visit["visit_date"],
-                "provider_id": visit["provider_id"],
-                "chief_complaint": visit["examination"]["chief_complaint"],
-                "num_teeth_issues": len(visit["examination"]["teeth_assessment"]),
-                "psr_code": visit["examination"]["periodontal_screening"]["psr_code"],
-                "bleeding_on_probing": visit["examination"]["periodontal_screening"][
-                    "bleeding_on_probing"
-                ],
-                "oral_hygiene_index": visit["examination"]["oral_hygiene_index"],
-                "num_treatments_planned": len(visit["treatment_plan"]),
-                "num_procedures_performed": len(visit["procedures_performed"]),
-                "num_images": len(visit["imaging"]),
-                "next_appointment_scheduled": visit["next_appointment"] is not None,
-            }
-            writer.writerow(row)
-    print(f"Saved CSV to {csv_file}")
+    parser = argparse.ArgumentParser(description="Generate synthetic dental visit records")
+    parser.add_argument("--records", type=int, default=NUM_VISITS, help="Number of visits")
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="json",
+        help="json: pretty-printed array; jsonl: stream one record per line (bounded memory); "
+        "parquet: compressed columnar file with nested list columns",
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Random (root) seed")
+    add_shard_arguments(parser)
+    args = parser.parse_args()
+    sharded = resolve_shard_arguments(parser, args)
+
+    global AS_OF
+    AS_OF = args.as_of
 
-    print(f"\nGeneration complete! Created {NUM_VISITS} synthetic dental visit records.")
+    print(f"Generating {args.records} synthetic dental visit records...")
+
+    if sharded:
+        print(f"  {args.shards} shard(s) across {args.workers} worker(s)")
+        shard_fn = partial(write_shard, fmt=args.format)
+        count = sum(
+            run_shards(shard_fn, (args.records,), args.shards, args.workers, args.seed, args.as_of)
+        )
+        if args.merge:
+            path = merge_dataset(BASE_PATH, args.format, args.shards)
+            print(f"Merged shards into {path}")
+        else:
+            print(f"Saved part files to {BASE_PATH}.part-*")
+    else:
+        random.seed(args.seed)
+        count, path = write_visits(iter_dental_visits(args.records), BASE_PATH, args.format)
+        print(f"Saved {args.format.upper()} to {path}")
+        if args.format != "parquet":
+            print(f"Saved CSV to {BASE_PATH}.csv")
+
+    print(f"\nGeneration complete! Created {count} synthetic dental visit records.")
     print("Note: All data is synthetic and for educational purposes only.")
 
 
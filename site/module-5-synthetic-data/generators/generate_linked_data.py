@@ -0,0 +1,329 @@
+"""
+Linked Healthcare Dataset Generator
+
+Generates patients, dental providers and dental visits that actually join:
+every visit's patient_id is a generated patient and every provider_id a
+generated provider. Use it to benchmark the knowledge graph and DynamoDB
+loaders with realistic join cardinalities.
+
+A provider pool is created once and indexed in memory (provider index ->
+provider_id, plus an alias table of provider popularity). Patients are then
+generated one at a time with sequential IDs; each patient's diagnoses,
+medications and visits are written right after it, with counts drawn from
+configurable fan-out distributions. Only the provider pool stays in memory, so
+millions of patients stream through with bounded memory.
+
+Output (datasets/linked/):
+    patients.jsonl              full patient records (generate_patient_data.py format)
+    providers.jsonl             provider pool
+    dental_visits.jsonl         visits (generate_dental_data.py format)
+    diagnoses.jsonl             diagnosis reference table (diagnosis_code, name, category)
+    medications.jsonl           medication reference table (medication_id, name, class, form)
+    patient_diagnoses.jsonl     patient -> diagnosis edges (patient_id, diagnosis_code, date, severity)
+    patient_medications.jsonl   patient -> medication edges (patient_id, medication_id, date, frequency)
+    ...plus a flattened .csv per table, or one .parquet per table with --format parquet
+
+    The reference and edge tables match what
+    site/deployment-scripts/healthcare_neo4j_loader.py reads.
+
+Fan-out specs (see samplers.fanout_sampler):
+    fixed:N, uniform:LO-HI, poisson:MEAN, zipf:S[:MAX]
+
+Usage:
+    python generators/generate_linked_data.py [--patients N] [--providers N]
+        [--visits-per-patient SPEC] [--diagnoses-per-patient SPEC]
+        [--provider-skew S] [--provider-loyalty P] [--format jsonl|parquet] [--seed S]
+
+Example:
+    python generators/generate_linked_data.py --patients 1000000 --providers 2000 \\
+        --visits-per-patient zipf:1.3:40 --provider-skew 1.1
+"""
+
+import argparse
+import random
+
+import generate_dental_data as gdd
+import generate_patient_data as gpd
+from samplers import AliasTable, fanout_sampler
+from synth_io import open_sink, require_pyarrow
+
+DATA_DIR = "datasets/linked"
+
+DIAGNOSIS_CATEGORIES = {
+    "E": "Endocrine",
+    "I": "Circulatory",
+    "J": "Respiratory",
+    "M": "Musculoskeletal",
+    "F": "Mental health",
+}
+
+# Drug class and form for the medication reference table
+MEDICATION_DETAILS = {
+    "Metformin": ("Biguanide", "Tablet"),
+    "Lisinopril": ("ACE inhibitor", "Tablet"),
+    "Atorvastatin": ("Statin", "Tablet"),
+    "Albuterol": ("Bronchodilator", "Inhaler"),
+    "Sertraline": ("SSRI", "Tablet"),
+    "Omeprazole": ("Proton pump inhibitor", "Capsule"),
+}
+
+PROVIDER_ROLES = ["General Dentist", "Hygienist", "Periodontist", "Endodontist", "Orthodontist"]
+PROVIDER_ROLE_WEIGHTS = [60, 25, 6, 5, 4]
+PROVIDER_FIRST = ["Avery", "Jamie", "Quinn", "Reese", "Rowan", "Skyler", "Emerson", "Hayden"]
+PROVIDER_LAST = ["Nguyen", "Garcia", "Okafor", "Larsen", "Haddad", "Moreno", "Tanaka", "Walsh"]
+CLINICS = [
+    "Eugene Family Dental",
+    "Springfield Smiles",
+    "Willamette Dental Group",
+    "Coburg Road Dentistry",
+    "River Valley Oral Health",
+]
+
+
+# ── Reference tables ──────────────────────────────────────────────────────────
+
+
+def diagnosis_rows():
+    return [
+        {
+            "diagnosis_code": d["code"],
+            "name": d["description"],
+            "category": DIAGNOSIS_CATEGORIES.get(d["code"][0], "General"),
+        }
+        for d in gpd.DIAGNOSES
+    ]
+
+
+def medication_id(name):
+    return f"MED-{name.upper()}"
+
+
+def medication_rows():
+    rows = []
+    for m in gpd.MEDICATIONS:
+        drug_class, form = MEDICATION_DETAILS.get(m["name"], ("General", "Tablet"))
+        rows.append(
+            {
+                "medication_id": medication_id(m["name"]),
+                "name": m["name"],
+                "class": drug_class,
+                "form": form,
+            }
+        )
+    return rows
+
+
+# ── Pools ─────────────────────────────────────────────────────────────────────
+
+
+def generate_providers(num_providers):
+    """Create the provider pool; provider i gets ID D{i+1:06d}"""
+    role_draw = AliasTable(PROVIDER_ROLES, PROVIDER_ROLE_WEIGHTS).draw
+    return [
+        {
+            "provider_id": f"D{i + 1:06d}",
+            "name": f"{random.choice(PROVIDER_FIRST)} {random.choice(PROVIDER_LAST)}",
+            "role": role_draw(),
+            "clinic": random.choice(CLINICS),
+        }
+        for i in range(num_providers)
+    ]
+
+
+def provider_popularity(num_providers, skew):
+    """Alias table over provider indices; skew > 0 gives Zipf-like popularity"""
+    weights = [(rank + 1) ** -skew for rank in range(num_providers)]
+    random.shuffle(weights)  # popular providers spread across the ID range
+    return AliasTable(range(num_providers), weights)
+
+
+# ── Linked rows for one patient ───────────────────────────────────────────────
+
+
+def diagnosis_edges(patient):
+    return [
+        {
+            "patient_id": patient["patient_id"],
+            "diagnosis_code": d["code"],
+            "date": d["onset_date"],
+            "severity": d["status"],
+        }
+        for d in patient["diagnoses"]
+    ]
+
+
+def medication_edges(patient):
+    edges = []
+    for m in patient["medications"]:
+        dose, _, frequency = m["dosage"].partition(" ")
+        edges.append(
+            {
+                "patient_id": patient["patient_id"],
+                "medication_id": medication_id(m["name"]),
+                "date": m["start_date"],
+                "frequency": frequency or dose,
+            }
+        )
+    return edges
+
+
+# ── Output ────────────────────────────────────────────────────────────────────
+
+
+def _flat_schema(*fields):
+    def schema():
+        pa = require_pyarrow()
+        return pa.schema([(name, pa.string()) for name in fields])
+
+    return schema
+
+
+PROVIDER_FIELDS = ["provider_id", "name", "role", "clinic"]
+DIAGNOSIS_FIELDS = ["diagnosis_code", "name", "category"]
+MEDICATION_FIELDS = ["medication_id", "name", "class", "form"]
+DIAGNOSIS_EDGE_FIELDS = ["patient_id", "diagnosis_code", "date", "severity"]
+MEDICATION_EDGE_FIELDS = ["patient_id", "medication_id", "date", "frequency"]
+
+# table -> (fieldnames, flatten, parquet schema)
+TABLES = {
+    "patients": (gpd.CSV_FIELDS, gpd.flatten_patient, gpd.parquet_schema),
+    "providers": (PROVIDER_FIELDS, dict, _flat_schema(*PROVIDER_FIELDS)),
+    "dental_visits": (gdd.CSV_FIELDS, gdd.flatten_visit, gdd.parquet_schema),
+    "diagnoses": (DIAGNOSIS_FIELDS, dict, _flat_schema(*DIAGNOSIS_FIELDS)),
+    "medications": (MEDICATION_FIELDS, dict, _flat_schema(*MEDICATION_FIELDS)),
+    "patient_diagnoses": (DIAGNOSIS_EDGE_FIELDS, dict, _flat_schema(*DIAGNOSIS_EDGE_FIELDS)),
+    "patient_medications": (MEDICATION_EDGE_FIELDS, dict, _flat_schema(*MEDICATION_EDGE_FIELDS)),
+}
+
+
+def generate_linked(
+    num_patients,
+    num_providers,
+    visits_spec,
+    diagnoses_spec,
+    skew,
+    loyalty,
+    fmt="jsonl",
+    data_dir=DATA_DIR,
+):
+    """Generate and write every table; returns (counts per table, visits per provider)"""
+    sinks = {}
+    try:
+        for table, (fieldnames, flatten, schema) in TABLES.items():
+            sinks[table], _ = open_sink(f"{data_dir}/{table}", fmt, fieldnames, flatten, schema)
+
+        for row in diagnosis_rows():
+            sinks["diagnoses"].write(row)
+        for row in medication_rows():
+            sinks["medications"].write(row)
+
+        providers = generate_providers(num_providers)
+        for provider in providers:
+            sinks["providers"].write(provider)
+        provider_ids = [p["provider_id"] for p in providers]
+        pick_provider = provider_popularity(num_providers, skew).draw
+        visits_per_provider = [0] * num_providers
+
+        num_visits = visits_spec.draw
+        num_diagnoses = diagnoses_spec.draw
+        visit_index = 0
+        for i in range(num_patients):
+            patient = gpd.generate_patient(gpd.generate_patient_id(i + 1), num_diagnoses())
+            patient_id = patient["patient_id"]
+            sinks["patients"].write(patient)
+            for edge in diagnosis_edges(patient):
+                sinks["patient_diagnoses"].write(edge)
+            for edge in medication_edges(patient):
+                sinks["patient_medications"].write(edge)
+
+            # Most visits go to the patient's regular provider
+            primary = pick_provider()
+            for _ in range(num_visits()):
+                p = primary if random.random() < loyalty else pick_provider()
+                visits_per_provider[p] += 1
+                visit_index += 1
+                visit = gdd.generate_dental_visit(
+                    patient_id, provider_ids[p], gdd.generate_visit_id(visit_index)
+                )
+                sinks["dental_visits"].write(visit)
+    finally:
+        for sink in sinks.values():
+            sink.close()
+
+    return {table: sink.count for table, sink in sinks.items()}, visits_per_provider
+
+
+def print_cardinalities(counts, visits_per_provider):
+    patients = counts["patients"]
+    visits = counts["dental_visits"]
+    busiest = sorted(visits_per_provider, reverse=True)
+    top_decile = busiest[: max(1, len(busiest) // 10)]
+    print("\nJoin cardinalities:")
+    print(f"  visits / patient           : {visits / max(patients, 1):.2f}")
+    print(f"  diagnoses / patient        : {counts['patient_diagnoses'] / max(patients, 1):.2f}")
+    print(f"  medications / patient      : {counts['patient_medications'] / max(patients, 1):.2f}")
+    print(
+        f"  visits / provider          : {visits / max(len(busiest), 1):.1f} (max {busiest[0]:,})"
+    )
+    print(f"  visits to top 10% providers: {sum(top_decile) / max(visits, 1):.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate linked patient/provider/visit tables")
+    parser.add_argument("--patients", type=int, default=1000, help="Size of the patient pool")
+    parser.add_argument("--providers", type=int, default=50, help="Size of the provider pool")
+    parser.add_argument(
+        "--visits-per-patient", default="poisson:2", help="Fan-out of visits (default poisson:2)"
+    )
+    parser.add_argument(
+        "--diagnoses-per-patient",
+        default="uniform:0-3",
+        help="Fan-out of diagnoses (default uniform:0-3, as generate_patient_data.py)",
+    )
+    parser.add_argument(
+        "--provider-skew",
+        type=float,
+        default=1.0,
+        help="Zipf exponent of provider popularity (0 = uniform)",
+    )
+    parser.add_argument(
+        "--provider-loyalty",
+        type=float,
+        default=0.8,
+        help="Probability a visit goes to the patient's regular provider",
+    )
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--output-dir", default=DATA_DIR)
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    args = parser.parse_args()
+
+    if args.patients < 1 or args.providers < 1:
+        parser.error("--patients and --providers must be at least 1")
+    try:
+        visits_spec = fanout_sampler(args.visits_per_patient)
+        diagnoses_spec = fanout_sampler(args.diagnoses_per_patient)
+    except ValueError as e:
+        parser.error(str(e))
+
+    random.seed(args.seed)
+    print(
+        f"Generating {args.patients} patients, {args.providers} providers "
+        f"and their visits into {args.output_dir}/..."
+    )
+    counts, visits_per_provider = generate_linked(
+        args.patients,
+        args.providers,
+        visits_spec,
+        diagnoses_spec,
+        args.provider_skew,
+        args.provider_loyalty,
+        args.format,
+        args.output_dir,
+    )
+    for table, count in counts.items():
+        print(f"✓ {count:>10,} {table}")
+    print_cardinalities(counts, visits_per_provider)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,24 +8,54 @@ Output:
   datasets/lithia/vehicles.json       — vehicle inventory records
   datasets/lithia/leads.json          — customer lead / CRM records
 
-Usage:
-    python generate_lithia_data.py [--records N] [--upload]
+  With --format jsonl the records are streamed to vehicles.jsonl / leads.jsonl
+  plus flattened vehicles.csv / leads.csv, one record at a time.
+  With --format parquet they go to zstd-compressed vehicles.parquet / leads.parquet
+  (nested compliance / vehicle_interest structs; requires pyarrow).
 
-    --records N   Number of vehicle records to generate (default: 200)
-    --upload      Upload to DynamoDB after generating
-                  (requires AWS profile 'uo-innovation' to be logged in)
+Usage:
+    python generate_lithia_data.py [--records N] [--format json|jsonl|parquet] [--upload]
+    python generate_lithia_data.py --records 10000000 --format jsonl --shards 64 --workers 16 --merge
+
+    --records N      Number of vehicle records to generate (default: 200)
+    --format jsonl   Stream JSON Lines + CSV in one pass (bounded memory, 10M+ rows)
+    --format parquet Stream compressed Parquet, one row group at a time
+    --seed S         Random seed (default: 42); root seed for sharded runs
+    --shards M       Split generation into M shards with seeds derived from --seed
+    --workers N      Generate shards across N processes (same output for any N)
+    --merge          Concatenate shard part files into single vehicles/leads files
+    --append         Continue from the last run's checkpoint and add only N new
+                     vehicles (and N/2 leads) instead of regenerating everything
+    --upload         Upload to DynamoDB after generating
+                     (requires AWS profile 'uo-innovation' to be logged in)
+    --threads N      Parallel BatchWriteItem threads for --upload (default: 16)
+    --target-wps W   Cap --upload at W writes per second (adaptive backoff below it)
+    --endpoint-url U Upload to a local DynamoDB stand-in, e.g. http://localhost:8000
 """
 
 import argparse
-import csv
 import json
 import os
 import random
 import uuid
 from datetime import datetime, timedelta
+from functools import partial
+
+from dynamo_loader import DEFAULT_THREADS, HAS_BOTO3, BulkLoader, ensure_table, make_client, positive_int
+from samplers import AliasTable
+from synth_io import (
+    FORMATS, iter_jsonl, iter_parquet, load_checkpoint, require_pyarrow, restore_rng_state,
+    rng_state, save_checkpoint, write_dataset,
+)
+from synth_shards import (
+    add_shard_arguments, merge_dataset, part_base, resolve_shard_arguments, run_shards,
+)
 
 random.seed(42)
 
+# Reference time for generated dates (pinned for sharded runs; None = now)
+AS_OF = None
+
 # ── Vehicle data ─────────────────────────────────────────────────────────────
 
 MAKES_MODELS = {
@@ -66,6 +96,17 @@ DEALERSHIPS  = [
 
 VIN_CHARS = "ABCDEFGHJKLMNPRSTUVWXYZ0123456789"
 
+# Weighted draws use alias tables built once, not per-record random.choices(weights=...)
+MAKES           = list(MAKES_MODELS)
+CONDITION_DRAW  = AliasTable(CONDITIONS,    [30, 50, 20]).draw
+TITLE_DRAW      = AliasTable(TITLE_STATUS,  [85, 5, 7, 3]).draw
+RECALL_DRAW     = AliasTable(RECALL_STATUS, [70, 15, 15]).draw
+
+
+def random_uuid():
+    # Drawn from `random` (not os.urandom) so seeded runs reproduce their ids
+    return str(uuid.UUID(int=random.getrandbits(128), version=4))
+
 
 def random_vin():
     return "".join(random.choices(VIN_CHARS, k=17))
@@ -73,20 +114,20 @@ def random_vin():
 
 def random_date(days_back=365):
     delta = timedelta(days=random.randint(0, days_back))
-    return (datetime.now() - delta).strftime("%Y-%m-%d")
+    return ((AS_OF or datetime.now()) - delta).strftime("%Y-%m-%d")
 
 
 def generate_vehicle():
-    make  = random.choice(list(MAKES_MODELS.keys()))
+    make  = random.choice(MAKES)
     model = random.choice(MAKES_MODELS[make])
     year  = random.randint(2015, 2026)
-    cond  = random.choices(CONDITIONS, weights=[30, 50, 20])[0]
+    cond  = CONDITION_DRAW()
     base  = round(random.uniform(18_000, 95_000), 2)
     msrp  = round(base * random.uniform(1.02, 1.15), 2)
     miles = 0 if cond == "New" else random.randint(5_000, 120_000)
 
     return {
-        "id":           str(uuid.uuid4()),
+        "id":           random_uuid(),
         "type":         "vehicle",
         "vin":          random_vin(),
         "year":         year,
@@ -105,10 +146,10 @@ def generate_vehicle():
         "dealership":   random.choice(DEALERSHIPS),
         "received_date":random_date(400),
         "compliance": {
-            "title_status":       random.choices(TITLE_STATUS, weights=[85, 5, 7, 3])[0],
+            "title_status":       TITLE_DRAW(),
             "emissions_compliant": random.random() > 0.05,
             "safety_certified":    random.random() > 0.03,
-            "recall_status":       random.choices(RECALL_STATUS, weights=[70, 15, 15])[0],
+            "recall_status":       RECALL_DRAW(),
         },
     }
 
@@ -118,6 +159,7 @@ def generate_vehicle():
 LEAD_SOURCES = ["Website", "Walk-in", "Phone", "Referral", "AutoTrader", "Cars.com", "CarGurus"]
 LEAD_STATUSES= ["new", "contacted", "appointment_set", "visited", "sold", "lost"]
 INTEREST     = ["purchase", "lease", "trade-in", "service"]
+LEAD_STATUS_DRAW = AliasTable(LEAD_STATUSES, [10, 25, 20, 20, 15, 10]).draw
 SALESPERSON_NAMES = [
     "Jordan Lee", "Taylor Kim", "Alex Martinez", "Sam Patel",
     "Casey Robinson", "Morgan Davis", "Riley Chen", "Drew Thompson",
@@ -129,10 +171,10 @@ def random_phone():
 
 
 def generate_lead():
-    status = random.choices(LEAD_STATUSES, weights=[10, 25, 20, 20, 15, 10])[0]
+    status = LEAD_STATUS_DRAW()
     created = random_date(90)
     return {
-        "id":           str(uuid.uuid4()),
+        "id":           random_uuid(),
         "type":         "lead",
         "source":       random.choice(LEAD_SOURCES),
         "status":       status,
@@ -142,7 +184,7 @@ def generate_lead():
         "created_date": created,
         "last_contact": random_date(30),
         "vehicle_interest": {
-            "make":      random.choice(list(MAKES_MODELS.keys())),
+            "make":      random.choice(MAKES),
             "condition": random.choice(CONDITIONS),
             "budget_min": round(random.uniform(15_000, 40_000), 2),
             "budget_max": round(random.uniform(40_001, 100_000), 2),
@@ -151,97 +193,328 @@ def generate_lead():
     }
 
 
+# ── Flattened CSV rows ────────────────────────────────────────────────────────
+
+VEHICLE_CSV_FIELDS = [
+    "id", "vin", "year", "make", "model", "style", "color", "condition", "mileage",
+    "transmission", "drivetrain", "cost", "msrp", "list_price", "days_on_lot",
+    "dealership", "received_date", "title_status", "emissions_compliant",
+    "safety_certified", "recall_status",
+]
+
+LEAD_CSV_FIELDS = [
+    "id", "source", "status", "interest", "dealership", "salesperson", "created_date",
+    "last_contact", "interest_make", "interest_condition", "budget_min", "budget_max",
+    "converted",
+]
+
+
+def flatten_vehicle(v):
+    row = {k: v[k] for k in VEHICLE_CSV_FIELDS if k in v}
+    row.update(v["compliance"])
+    return row
+
+
+def flatten_lead(lead):
+    row = {k: lead[k] for k in LEAD_CSV_FIELDS if k in lead}
+    vi = lead["vehicle_interest"]
+    row.update({
+        "interest_make":      vi["make"],
+        "interest_condition": vi["condition"],
+        "budget_min":         vi["budget_min"],
+        "budget_max":         vi["budget_max"],
+    })
+    return row
+
+
+# ── Parquet schemas ───────────────────────────────────────────────────────────
+
+def vehicle_schema():
+    pa = require_pyarrow()
+    return pa.schema([
+        ("id",            pa.string()),
+        ("type",          pa.string()),
+        ("vin",           pa.string()),
+        ("year",          pa.int16()),
+        ("make",          pa.string()),
+        ("model",         pa.string()),
+        ("style",         pa.string()),
+        ("color",         pa.string()),
+        ("condition",     pa.string()),
+        ("mileage",       pa.int32()),
+        ("transmission",  pa.string()),
+        ("drivetrain",    pa.string()),
+        ("cost",          pa.float64()),
+        ("msrp",          pa.float64()),
+        ("list_price",    pa.float64()),
+        ("days_on_lot",   pa.int16()),
+        ("dealership",    pa.string()),
+        ("received_date", pa.string()),
+        ("compliance", pa.struct([
+            ("title_status",        pa.string()),
+            ("emissions_compliant", pa.bool_()),
+            ("safety_certified",    pa.bool_()),
+            ("recall_status",       pa.string()),
+        ])),
+    ])
+
+
+def lead_schema():
+    pa = require_pyarrow()
+    return pa.schema([
+        ("id",           pa.string()),
+        ("type",         pa.string()),
+        ("source",       pa.string()),
+        ("status",       pa.string()),
+        ("interest",     pa.string()),
+        ("dealership",   pa.string()),
+        ("salesperson",  pa.string()),
+        ("created_date", pa.string()),
+        ("last_contact", pa.string()),
+        ("vehicle_interest", pa.struct([
+            ("make",       pa.string()),
+            ("condition",  pa.string()),
+            ("budget_min", pa.float64()),
+            ("budget_max", pa.float64()),
+        ])),
+        ("converted",    pa.bool_()),
+    ])
+
+
+def iter_vehicles(n):
+    for _ in range(n):
+        yield generate_vehicle()
+
+
+def iter_leads(n):
+    for _ in range(n):
+        yield generate_lead()
+
+
 # ── Main ──────────────────────────────────────────────────────────────────────
 
+DATA_DIR   = "datasets/lithia"
+V_BASE     = f"{DATA_DIR}/vehicles"
+L_BASE     = f"{DATA_DIR}/leads"
+CHECKPOINT = f"{DATA_DIR}/.generator_state.json"
+
+
+def write_records(records, base, fieldnames, flatten, schema, fmt, append=False):
+    """Write one dataset (json, jsonl + CSV, or parquet); returns (count, path)"""
+    # The json format keeps its original output: no CSV alongside
+    if fmt == "json":
+        fieldnames = None
+    return write_dataset(records, base, fmt, fieldnames, flatten, schema, append)
+
+
+def write_vehicles(records, base, fmt, append=False):
+    return write_records(records, base, VEHICLE_CSV_FIELDS, flatten_vehicle, vehicle_schema, fmt, append)
+
+
+def write_leads(records, base, fmt, append=False):
+    return write_records(records, base, LEAD_CSV_FIELDS, flatten_lead, lead_schema, fmt, append)
+
+
+def write_shard(index, seed, as_of, counts, fmt="jsonl"):
+    """Generate one shard's vehicles and leads into part files (runs in a worker process)"""
+    global AS_OF
+    AS_OF = as_of
+    n_vehicles, n_leads = counts
+    random.seed(seed)
+    n_vehicles, _ = write_vehicles(iter_vehicles(n_vehicles), part_base(V_BASE, index), fmt)
+    n_leads, _    = write_leads(iter_leads(n_leads), part_base(L_BASE, index), fmt)
+    return n_vehicles, n_leads
+
+
+def iter_saved(path, fmt, offset=0):
+    """Read a written dataset back lazily (json is loaded whole)
+
+    `offset` skips to a byte position in a jsonl file, e.g. the start of an append.
+    """
+    if fmt == "jsonl":
+        return iter_jsonl(path, offset)
+    if fmt == "parquet":
+        return iter_parquet(path)
+    with open(path) as f:
+        return json.load(f)
+
+
+# ── Incremental (append) runs ─────────────────────────────────────────────────
+#
+# After every jsonl / parquet run the RNG state and record counters are saved to
+# CHECKPOINT. An --append run restores them, so it continues the same random
+# sequence (no repeated ids) and only generates and writes the new records:
+#   jsonl   — new rows are appended to vehicles.jsonl/.csv and leads.jsonl/.csv
+#   parquet — new rows go to vehicles.append-00001.parquet, ...append-00002, ...
+
+def dataset_files(fmt):
+    """Files an append run adds to in place (parquet appends write new files)"""
+    if fmt != "jsonl":
+        return []
+    return [f"{base}.{ext}" for base in (V_BASE, L_BASE) for ext in ("jsonl", "csv")]
+
+
+def resume_checkpoint(fmt):
+    """Restore the RNG from CHECKPOINT; returns the checkpoint, or None to start fresh"""
+    state = load_checkpoint(CHECKPOINT)
+    if state is None:
+        return None
+    if state["format"] != fmt:
+        raise SystemExit(f"✗ {CHECKPOINT} is for --format {state['format']}, not {fmt}")
+    # Drop anything a crashed run wrote after the last checkpoint
+    for path, size in state["file_sizes"].items():
+        if not os.path.exists(path) or os.path.getsize(path) < size:
+            raise SystemExit(f"✗ {path} is missing or shorter than {CHECKPOINT} expects — "
+                             "regenerate without --append")
+        with open(path, "r+b") as f:
+            f.truncate(size)
+    restore_rng_state(state["rng_state"])
+    return state
+
+
+def clear_checkpoint():
+    """Forget the checkpoint when a run rewrites the dataset some other way"""
+    if os.path.exists(CHECKPOINT):
+        os.remove(CHECKPOINT)
+
+
+def write_checkpoint(fmt, seed, runs, n_vehicles, n_leads):
+    save_checkpoint(CHECKPOINT, {
+        "format":     fmt,
+        "seed":       seed,
+        "runs":       runs,
+        "vehicles":   n_vehicles,
+        "leads":      n_leads,
+        "file_sizes": {path: os.path.getsize(path) for path in dataset_files(fmt)},
+        "rng_state":  rng_state(),
+    })
+
+
 def main():
     parser = argparse.ArgumentParser(description="Generate Lithia Motors synthetic data")
     parser.add_argument("--records", type=int, default=200, help="Number of vehicle records")
     parser.add_argument("--team",    type=str, default="lithia", help="Team name prefix for DynamoDB tables (e.g. alpha)")
+    parser.add_argument("--format",  choices=FORMATS, default="json",
+                        help="json: pretty-printed arrays; jsonl: stream JSON Lines + CSV (bounded memory); "
+                             "parquet: compressed columnar files")
+    parser.add_argument("--seed",    type=int, default=42, help="Random (root) seed")
     parser.add_argument("--upload",  action="store_true", help="Upload to DynamoDB after generating")
+    parser.add_argument("--threads", type=positive_int, default=DEFAULT_THREADS,
+                        help="Parallel BatchWriteItem threads for --upload")
+    parser.add_argument("--target-wps", type=positive_int, default=None,
+                        help="Cap --upload at this many writes per second")
+    parser.add_argument("--endpoint-url", default=None,
+                        help="DynamoDB endpoint for --upload, e.g. DynamoDB Local or moto_server")
+    parser.add_argument("--append",  action="store_true",
+                        help="Continue from the saved checkpoint and write only the new records")
+    add_shard_arguments(parser)
     args = parser.parse_args()
+    sharded = resolve_shard_arguments(parser, args)
+    if args.append and sharded:
+        parser.error("--append continues a single RNG stream — it can't be combined with --shards")
+    if args.append and args.format == "json":
+        parser.error("--append needs --format jsonl or parquet (a JSON array can't be appended to)")
+
+    global AS_OF
+    AS_OF = args.as_of
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+
+    if sharded:
+        clear_checkpoint()
+        print(f"Generating in {args.shards} shard(s) across {args.workers} worker(s)...")
+        results = run_shards(partial(write_shard, fmt=args.format),
+                             (args.records, args.records // 2),
+                             args.shards, args.workers, args.seed, args.as_of)
+        n_vehicles = sum(r[0] for r in results)
+        n_leads    = sum(r[1] for r in results)
+        if args.merge:
+            v_path = merge_dataset(V_BASE, args.format, args.shards)
+            l_path = merge_dataset(L_BASE, args.format, args.shards)
+        else:
+            v_path, l_path = f"{V_BASE}.part-*", f"{L_BASE}.part-*"
+        print(f"✓ Generated {n_vehicles} vehicle records → {v_path}")
+        print(f"✓ Generated {n_leads} lead records → {l_path}")
+        if args.upload:
+            if not args.merge:
+                print("✗ --upload with --shards needs --merge; skipping upload")
+                return
+            upload_to_dynamodb(iter_saved(v_path, args.format), iter_saved(l_path, args.format),
+                               team=args.team, threads=args.threads,
+                               target_wps=args.target_wps, endpoint_url=args.endpoint_url)
+        return
 
-    os.makedirs("datasets/lithia", exist_ok=True)
+    state = resume_checkpoint(args.format) if args.append else None
+    if state:
+        print(f"Appending to {state['vehicles']} vehicles / {state['leads']} leads "
+              f"(run {state['runs'] + 1})...")
+        runs, total_vehicles, total_leads = state["runs"], state["vehicles"], state["leads"]
+    else:
+        if args.append:
+            print(f"No checkpoint at {CHECKPOINT} — starting a new dataset from --seed")
+        random.seed(args.seed)
+        runs, total_vehicles, total_leads = 0, 0, 0
+
+    append = state is not None and args.format == "jsonl"
+    v_base, l_base = V_BASE, L_BASE
+    if state is not None and args.format == "parquet":
+        v_base, l_base = f"{V_BASE}.append-{runs:05d}", f"{L_BASE}.append-{runs:05d}"
+    v_start = os.path.getsize(f"{V_BASE}.jsonl") if append else 0
+    l_start = os.path.getsize(f"{L_BASE}.jsonl") if append else 0
 
     # Vehicles
-    vehicles = [generate_vehicle() for _ in range(args.records)]
-    v_path = "datasets/lithia/vehicles.json"
-    with open(v_path, "w") as f:
-        json.dump(vehicles, f, indent=2)
-    print(f"✓ Generated {len(vehicles)} vehicle records → {v_path}")
+    n_vehicles, v_path = write_vehicles(iter_vehicles(args.records), v_base, args.format, append)
+    print(f"✓ Generated {n_vehicles} vehicle records → {v_path}")
 
     # Leads (half as many)
-    leads = [generate_lead() for _ in range(args.records // 2)]
-    l_path = "datasets/lithia/leads.json"
-    with open(l_path, "w") as f:
-        json.dump(leads, f, indent=2)
-    print(f"✓ Generated {len(leads)} lead records → {l_path}")
-
-    if args.upload:
-        upload_to_dynamodb(vehicles, leads, team=args.team)
+    n_leads, l_path = write_leads(iter_leads(args.records // 2), l_base, args.format, append)
+    print(f"✓ Generated {n_leads} lead records → {l_path}")
 
+    if args.format == "json":
+        clear_checkpoint()
+    else:
+        write_checkpoint(args.format, args.seed, runs + 1,
+                         total_vehicles + n_vehicles, total_leads + n_leads)
 
-def upload_to_dynamodb(vehicles, leads, team="lithia"):
-    try:
-        import boto3
-        from decimal import Decimal
-    except ImportError:
+    if args.upload:
+        # Re-read from disk so uploads stream too instead of holding every record;
+        # after an append only the new records are uploaded
+        upload_to_dynamodb(iter_saved(v_path, args.format, v_start),
+                           iter_saved(l_path, args.format, l_start), team=args.team,
+                           threads=args.threads, target_wps=args.target_wps,
+                           endpoint_url=args.endpoint_url)
+
+
+def upload_to_dynamodb(vehicles, leads, team="lithia", threads=DEFAULT_THREADS, target_wps=None,
+                       endpoint_url=None):
+    """Bulk-load vehicles and leads with parallel, throttled BatchWriteItem calls"""
+    if not HAS_BOTO3:
         print("✗ boto3 not installed. Run: pip install boto3")
         return
 
-    profile = os.environ.get("AWS_PROFILE", "uo-innovation")
+    profile = os.environ.get("AWS_PROFILE", None if endpoint_url else "uo-innovation")
     region  = os.environ.get("AWS_DEFAULT_REGION", "us-west-2")
 
     v_table_name = f"{team}-vehicles"
     l_table_name = f"{team}-leads"
 
-    print(f"\nUploading to DynamoDB (profile={profile}, region={region})...")
+    target = endpoint_url or f"profile={profile}, region={region}"
+    print(f"\nUploading to DynamoDB ({target}, {threads} threads)...")
     print(f"  Tables: {v_table_name}, {l_table_name}")
 
-    session = boto3.Session(profile_name=profile, region_name=region)
-    ddb     = session.resource("dynamodb")
-
-    def ensure_table(name, key="id"):
-        client = session.client("dynamodb")
-        existing = [t for t in client.list_tables()["TableNames"] if t == name]
-        if not existing:
-            print(f"  Creating table: {name}")
-            client.create_table(
-                TableName=name,
-                AttributeDefinitions=[{"AttributeName": key, "AttributeType": "S"}],
-                KeySchema=[{"AttributeName": key, "KeyType": "HASH"}],
-                BillingMode="PAY_PER_REQUEST",
-            )
-            waiter = client.get_waiter("table_exists")
-            waiter.wait(TableName=name)
-            print(f"  ✓ Table ready: {name}")
-        else:
-            print(f"  ✓ Table exists: {name}")
-        return ddb.Table(name)
-
-    def to_decimal(obj):
-        if isinstance(obj, list):  return [to_decimal(i) for i in obj]
-        if isinstance(obj, dict):  return {k: to_decimal(v) for k, v in obj.items()}
-        if isinstance(obj, float): return Decimal(str(obj))
-        if isinstance(obj, int):   return Decimal(obj)
-        return obj
-
-    def batch_write(table, records):
-        with table.batch_writer() as bw:
-            for rec in records:
-                bw.put_item(Item=to_decimal(rec))
+    client = make_client(profile, region, endpoint_url, threads)
 
-    v_table = ensure_table(v_table_name)
-    batch_write(v_table, vehicles)
-    print(f"  ✓ Uploaded {len(vehicles)} vehicles → {v_table_name}")
+    ensure_table(client, v_table_name)
+    stats = BulkLoader(client, v_table_name, threads, target_wps).load(vehicles)
+    print(f"  ✓ Uploaded vehicles → {v_table_name}: {stats.summary()}")
 
-    l_table = ensure_table(l_table_name)
-    batch_write(l_table, leads)
-    print(f"  ✓ Uploaded {len(leads)} leads → {l_table_name}")
+    ensure_table(client, l_table_name)
+    stats = BulkLoader(client, l_table_name, threads, target_wps).load(leads)
+    print(f"  ✓ Uploaded leads → {l_table_name}: {stats.summary()}")
 
     print("\n✓ DynamoDB upload complete.")
     print(f"  Tables: {v_table_name}, {l_table_name}")
     print(f"  Region: {region}")
 
-
 if __name__ == "__main__":
     main()
@@ -7,32 +7,73 @@ All data is completely fictional and does not represent real patients.
 Dependencies:
     - Python 3.7+
     - Standard library only (random, json, datetime, csv)
+    - NumPy (optional, only for --engine numpy)
+    - pyarrow (optional, only for --format parquet)
 
 Output Formats:
     - JSON: Full hierarchical patient records
-    - CSV: Flattened summary statistics
+    - JSONL: Same records, streamed one per line (--format jsonl)
+    - CSV: Flattened summary statistics (written alongside JSON/JSONL)
+    - Parquet: Nested records as zstd-compressed columns, with diagnoses,
+      lab_results etc. kept as list columns (--format parquet)
 
 Usage:
-    python generate_patient_data.py
+    python generate_patient_data.py [--records N] [--engine record|numpy]
+                                    [--format json|jsonl|parquet]
+
+    --records N      Number of patients to generate (default: 100)
+    --engine numpy   Draw each batch column-wise with a seeded NumPy Generator
+                     (much faster for 1M+ patients; same schema and correlations)
+    --format jsonl   Stream records to JSON Lines + CSV in one pass instead of
+                     building the whole list in memory (use for 10M+ rows)
+    --format parquet Stream records into a compressed Parquet file, one row
+                     group at a time
+    --seed S         Random seed (default: 42); root seed for sharded runs
+    --batch-size N   Patients per NumPy batch (default: 50000)
+    --shards M       Split generation into M shards, each with its own seed
+                     derived from --seed (requires --format jsonl or parquet)
+    --workers N      Generate shards across N processes; output is identical
+                     for any N
+    --merge          Concatenate the shard part files into one dataset
 
     Output files will be created in datasets/patient-health/:
-    - synthetic_patients.json
+    - synthetic_patients.json (or .jsonl / .parquet)
     - synthetic_patients.csv
 """
 
+import argparse
+import gc
 import random
-import json
 from datetime import datetime, timedelta
-import csv
-import os
+from functools import partial
+
+from synth_io import FORMATS, require_pyarrow, write_dataset
+from synth_shards import (
+    add_shard_arguments,
+    merge_dataset,
+    part_base,
+    resolve_shard_arguments,
+    run_shards,
+)
+
+try:
+    import numpy as np
+
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
 
 # Seed for reproducibility
 random.seed(42)
 
+# Reference time for generated dates (pinned for sharded runs; None = now)
+AS_OF = None
+
 # Configuration
 NUM_PATIENTS = 100
 MIN_AGE = 18
 MAX_AGE = 85
+DEFAULT_BATCH_SIZE = 50_000
 
 # Demographics data
 GENDERS = ["male", "female", "other", "unknown"]
@@ -126,6 +167,10 @@ LAB_TESTS = [
 ]
 
 
+def _now():
+    return AS_OF or datetime.now()
+
+
 def generate_patient_id(index):
     """Generate anonymous patient ID"""
     return f"P{index:08d}"
@@ -170,18 +215,20 @@ def generate_vital_signs(age, has_hypertension=False):
     }, bmi
 
 
-def generate_diagnoses():
-    """Generate random subset of diagnoses"""
-    num_diagnoses = random.randint(0, 3)
+def generate_diagnoses(num_diagnoses=None):
+    """Generate random subset of diagnoses (0-3 unless `num_diagnoses` is given)"""
+    if num_diagnoses is None:
+        num_diagnoses = random.randint(0, 3)
+    num_diagnoses = min(num_diagnoses, len(DIAGNOSES))
     if num_diagnoses == 0:
         return []
 
-    diagnoses = random.sample(DIAGNOSES, num_diagnoses)
+    diagnoses = [dict(d) for d in random.sample(DIAGNOSES, num_diagnoses)]
 
     # Add onset dates
     for diag in diagnoses:
         days_ago = random.randint(30, 365 * 5)
-        onset_date = (datetime.now() - timedelta(days=days_ago)).strftime("%Y-%m-%d")
+        onset_date = (_now() - timedelta(days=days_ago)).strftime("%Y-%m-%d")
         diag["onset_date"] = onset_date
 
     return diagnoses
@@ -229,7 +276,7 @@ def generate_lab_results():
                 "value": value,
                 "unit": test["unit"],
                 "reference_range": test["ref_range"],
-                "date": (datetime.now() - timedelta(days=random.randint(1, 90))).strftime(
+                "date": (_now() - timedelta(days=random.randint(1, 90))).strftime(
                     "%Y-%m-%dT%H:%M:%SZ"
                 ),
                 "abnormal_flag": abnormal,
@@ -239,12 +286,18 @@ def generate_lab_results():
     return results
 
 
-def generate_patient():
-    """Generate a complete synthetic patient record"""
-    patient_index = random.randint(1, 99999999)
-    patient_id = generate_patient_id(patient_index)
+def generate_patient(patient_id=None, num_diagnoses=None):
+    """Generate a complete synthetic patient record
+
+    `patient_id` and `num_diagnoses` let callers (e.g. generate_linked_data.py)
+    assign IDs from a pool and control the diagnosis fan-out.
+    """
+    patient_index = None
+    if patient_id is None:
+        patient_index = random.randint(1, 99999999)
+        patient_id = generate_patient_id(patient_index)
     demographics = generate_demographics(patient_index)
-    diagnoses = generate_diagnoses()
+    diagnoses = generate_diagnoses(num_diagnoses)
 
     # Check for hypertension
     has_hypertension = any(d["code"] == "I10" for d in diagnoses)
@@ -262,75 +315,457 @@ def generate_patient():
         "medications": medications,
         "allergies": allergies,
         "lab_results": lab_results,
-        "last_updated": datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "last_updated": _now().strftime("%Y-%m-%dT%H:%M:%SZ"),
     }
 
 
-def main():
-    """Generate synthetic patient dataset"""
-    print(f"Generating {NUM_PATIENTS} synthetic patient records...")
-
-    patients = []
-    for i in range(NUM_PATIENTS):
-        patient = generate_patient()
-        patients.append(patient)
-
-    # Create output directory if it doesn't exist
-    os.makedirs("datasets/patient-health", exist_ok=True)
-
-    # Save as JSON
-    json_file = "datasets/patient-health/synthetic_patients.json"
-    with open(json_file, "w") as f:
-        json.dump(patients, f, indent=2)
-    print(f"Saved JSON to {json_file}")
-
-    # Save as CSV (flattened version)
-    csv_file = "datasets/patient-health/synthetic_patients.csv"
-    with open(csv_file, "w", newline="") as f:
-        fieldnames = [
-            "patient_id",
-            "age",
-            "gender",
-            "race_ethnicity",
-            "zip_code",
-            "systolic_bp",
-            "diastolic_bp",
-            "heart_rate",
-            "temperature",
-            "weight",
-            "height",
-            "bmi",
-            "num_diagnoses",
-            "num_medications",
-            "has_allergies",
-            "num_lab_results",
+# ── Vectorized (NumPy) engine ─────────────────────────────────────────────────
+#
+# Draws every field for a whole batch of patients at once with a seeded NumPy
+# Generator, then assembles the same record dicts as generate_patient().
+
+# Indices of the diagnoses that drive vitals and medications
+_DIABETES = next(i for i, d in enumerate(DIAGNOSES) if d["code"] == "E11.9")
+_HYPERTENSION = next(i for i, d in enumerate(DIAGNOSES) if d["code"] == "I10")
+_HYPERLIPIDEMIA = next(i for i, d in enumerate(DIAGNOSES) if d["code"] == "E78.5")
+
+MAX_DIAGNOSES = 3
+MAX_ALLERGIES = 2
+MAX_LAB_TESTS = 4
+
+
+def _date_table(now, min_days, max_days, fmt):
+    """Precompute formatted dates for every offset in [min_days, max_days] days ago"""
+    return {d: (now - timedelta(days=d)).strftime(fmt) for d in range(min_days, max_days + 1)}
+
+
+class _gc_paused:
+    """Pause cyclic GC while building a batch of dicts (none of them form cycles)"""
+
+    def __enter__(self):
+        self.was_enabled = gc.isenabled()
+        gc.disable()
+
+    def __exit__(self, *exc):
+        if self.was_enabled:
+            gc.enable()
+
+
+def _random_subsets(rng, size, population, max_k):
+    """First max_k columns of an independent random permutation per row"""
+    return rng.random((size, population)).argsort(axis=1)[:, :max_k]
+
+
+def generate_patient_batch(rng, size, now=None):
+    """Generate `size` synthetic patients column-wise with a NumPy Generator"""
+    now = now or _now()
+    onset_dates = _date_table(now, 30, 365 * 5, "%Y-%m-%d")
+    lab_dates = _date_table(now, 1, 90, "%Y-%m-%dT%H:%M:%SZ")
+    last_updated = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    # Demographics
+    patient_index = rng.integers(1, 100_000_000, size=size)
+    ages = rng.integers(MIN_AGE, MAX_AGE + 1, size=size)
+    genders = rng.integers(0, len(GENDERS), size=size)
+    races = rng.integers(0, len(RACES), size=size)
+    zip_codes = rng.integers(10000, 100000, size=size)
+
+    # Diagnoses: 0-3 distinct codes per patient
+    num_diagnoses = rng.integers(0, MAX_DIAGNOSES + 1, size=size)
+    diagnosis_idx = _random_subsets(rng, size, len(DIAGNOSES), MAX_DIAGNOSES)
+    diagnosis_days = rng.integers(30, 365 * 5 + 1, size=(size, MAX_DIAGNOSES))
+    diagnosis_used = np.arange(MAX_DIAGNOSES) < num_diagnoses[:, None]
+
+    def has_diagnosis(idx):
+        return ((diagnosis_idx == idx) & diagnosis_used).any(axis=1)
+
+    has_diabetes = has_diagnosis(_DIABETES)
+    has_hypertension = has_diagnosis(_HYPERTENSION)
+    has_hyperlipidemia = has_diagnosis(_HYPERLIPIDEMIA)
+
+    # Vital signs - blood pressure higher if hypertensive
+    systolic = np.where(
+        has_hypertension, rng.integers(130, 161, size=size), rng.integers(110, 131, size=size)
+    )
+    diastolic = np.where(
+        has_hypertension, rng.integers(85, 101, size=size), rng.integers(70, 86, size=size)
+    )
+    heart_rate = rng.integers(60, 101, size=size)
+    temperature = np.round(rng.uniform(97.5, 99.5, size=size), 1)
+    weight = rng.integers(120, 251, size=size)
+    height = rng.integers(60, 76, size=size)
+    bmi = np.round(weight / height.astype(np.float64) ** 2 * 703, 1)
+
+    # Allergies: 30% have 1-2
+    num_allergies = np.where(
+        rng.random(size=size) < 0.3, rng.integers(1, MAX_ALLERGIES + 1, size=size), 0
+    )
+    allergy_idx = _random_subsets(rng, size, len(ALLERGENS), MAX_ALLERGIES)
+
+    # Lab results: 2-4 distinct tests, 20% flagged abnormal
+    num_labs = rng.integers(2, MAX_LAB_TESTS + 1, size=size)
+    lab_idx = _random_subsets(rng, size, len(LAB_TESTS), MAX_LAB_TESTS)
+    lab_means = np.array([t["normal_mean"] for t in LAB_TESTS], dtype=np.float64)
+    lab_stds = np.array([t["normal_std"] for t in LAB_TESTS], dtype=np.float64)
+    lab_values = np.round(rng.normal(lab_means[lab_idx], lab_stds[lab_idx]), 1)
+    lab_abnormal = rng.random(size=(size, MAX_LAB_TESTS)) < 0.2
+    lab_days = rng.integers(1, 91, size=(size, MAX_LAB_TESTS))
+
+    # Assemble records from plain Python lists (much faster than numpy scalars)
+    with _gc_paused():
+        columns = (
+            patient_index.tolist(),
+            ages.tolist(),
+            genders.tolist(),
+            races.tolist(),
+            zip_codes.tolist(),
+            num_diagnoses.tolist(),
+            diagnosis_idx.tolist(),
+            diagnosis_days.tolist(),
+            has_diabetes.tolist(),
+            has_hypertension.tolist(),
+            has_hyperlipidemia.tolist(),
+            systolic.tolist(),
+            diastolic.tolist(),
+            heart_rate.tolist(),
+            temperature.tolist(),
+            weight.tolist(),
+            height.tolist(),
+            bmi.tolist(),
+            num_allergies.tolist(),
+            allergy_idx.tolist(),
+            num_labs.tolist(),
+            lab_idx.tolist(),
+            lab_values.tolist(),
+            lab_abnormal.tolist(),
+            lab_days.tolist(),
+        )
+
+        patients = []
+        for (
+            pidx,
+            age,
+            gender,
+            race,
+            zip_code,
+            n_diag,
+            diag_row,
+            diag_days,
+            diabetes,
+            hypertension,
+            hyperlipidemia,
+            sys_bp,
+            dia_bp,
+            hr,
+            temp,
+            wt,
+            ht,
+            bmi_value,
+            n_allergies,
+            allergy_row,
+            n_labs,
+            lab_row,
+            value_row,
+            abnormal_row,
+            days_row,
+        ) in zip(*columns):
+            diagnoses = [
+                {**DIAGNOSES[diag_row[j]], "onset_date": onset_dates[diag_days[j]]}
+                for j in range(n_diag)
+            ]
+
+            medications = []
+            if diabetes:
+                medications.append({**MEDICATIONS[0], "start_date": "2023-01-15"})
+            if hypertension:
+                medications.append({**MEDICATIONS[1], "start_date": "2023-02-20"})
+            if hyperlipidemia:
+                medications.append({**MEDICATIONS[2], "start_date": "2023-03-10"})
+
+            lab_results = []
+            for j in range(n_labs):
+                test = LAB_TESTS[lab_row[j]]
+                lab_results.append(
+                    {
+                        "test_name": test["test_name"],
+                        "value": value_row[j],
+                        "unit": test["unit"],
+                        "reference_range": test["ref_range"],
+                        "date": lab_dates[days_row[j]],
+                        "abnormal_flag": abnormal_row[j],
+                    }
+                )
+
+            patients.append(
+                {
+                    "patient_id": generate_patient_id(pidx),
+                    "demographics": {
+                        "age": age,
+                        "gender": GENDERS[gender],
+                        "race_ethnicity": RACES[race],
+                        "zip_code": str(zip_code),
+                    },
+                    "health_metrics": {
+                        "vital_signs": {
+                            "systolic_bp": sys_bp,
+                            "diastolic_bp": dia_bp,
+                            "heart_rate": hr,
+                            "temperature": temp,
+                            "weight": wt,
+                            "height": ht,
+                        },
+                        "bmi": bmi_value,
+                    },
+                    "diagnoses": diagnoses,
+                    "medications": medications,
+                    "allergies": [ALLERGENS[allergy_row[j]] for j in range(n_allergies)],
+                    "lab_results": lab_results,
+                    "last_updated": last_updated,
+                }
+            )
+
+    return patients
+
+
+def iter_patients_vectorized(num_patients, seed=42, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield `num_patients` records generated in NumPy batches of `batch_size`"""
+    if not HAS_NUMPY:
+        raise ImportError("numpy is required for --engine numpy — run: pip install numpy")
+
+    rng = np.random.default_rng(seed)
+    now = _now()
+    remaining = num_patients
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        yield from generate_patient_batch(rng, size, now)
+        remaining -= size
+
+
+def iter_patients(num_patients):
+    """Yield `num_patients` records from the per-record generator"""
+    for _ in range(num_patients):
+        yield generate_patient()
+
+
+CSV_FIELDS = [
+    "patient_id",
+    "age",
+    "gender",
+    "race_ethnicity",
+    "zip_code",
+    "systolic_bp",
+    "diastolic_bp",
+    "heart_rate",
+    "temperature",
+    "weight",
+    "height",
+    "bmi",
+    "num_diagnoses",
+    "num_medications",
+    "has_allergies",
+    "num_lab_results",
+]
+
+
+def flatten_patient(patient):
+    """Flatten a patient record into a CSV summary row"""
+    demographics = patient["demographics"]
+    vital_signs = patient["health_metrics"]["vital_signs"]
+    return {
+        "patient_id": patient["patient_id"],
+        "age": demographics["age"],
+        "gender": demographics["gender"],
+        "race_ethnicity": demographics["race_ethnicity"],
+        "zip_code": demographics["zip_code"],
+        "systolic_bp": vital_signs["systolic_bp"],
+        "diastolic_bp": vital_signs["diastolic_bp"],
+        "heart_rate": vital_signs["heart_rate"],
+        "temperature": vital_signs["temperature"],
+        "weight": vital_signs["weight"],
+        "height": vital_signs["height"],
+        "bmi": patient["health_metrics"]["bmi"],
+        "num_diagnoses": len(patient["diagnoses"]),
+        "num_medications": len(patient["medications"]),
+        "has_allergies": len(patient["allergies"]) > 0,
+        "num_lab_results": len(patient["lab_results"]),
+    }
+
+
+def parquet_schema():
+    """Arrow schema for the nested patient record (list fields stay list columns)"""
+    pa = require_pyarrow()
+    return pa.schema(
+        [
+            ("patient_id", pa.string()),
+            (
+                "demographics",
+                pa.struct(
+                    [
+                        ("age", pa.int16()),
+                        ("gender", pa.string()),
+                        ("race_ethnicity", pa.string()),
+                        ("zip_code", pa.string()),
+                    ]
+                ),
+            ),
+            (
+                "health_metrics",
+                pa.struct(
+                    [
+                        (
+                            "vital_signs",
+                            pa.struct(
+                                [
+                                    ("systolic_bp", pa.int16()),
+                                    ("diastolic_bp", pa.int16()),
+                                    ("heart_rate", pa.int16()),
+                                    ("temperature", pa.float64()),
+                                    ("weight", pa.int16()),
+                                    ("height", pa.int16()),
+                                ]
+                            ),
+                        ),
+                        ("bmi", pa.float64()),
+                    ]
+                ),
+            ),
+            (
+                "diagnoses",
+                pa.list_(
+                    pa.struct(
+                        [
+                            ("code", pa.string()),
+                            ("description", pa.string()),
+                            ("status", pa.string()),
+                            ("onset_date", pa.string()),
+                        ]
+                    )
+                ),
+            ),
+            (
+                "medications",
+                pa.list_(
+                    pa.struct(
+                        [
+                            ("name", pa.string()),
+                            ("dosage", pa.string()),
+                            ("start_date", pa.string()),
+                        ]
+                    )
+                ),
+            ),
+            (
+                "allergies",
+                pa.list_(
+                    pa.struct(
+                        [
+                            ("allergen", pa.string()),
+                            ("severity", pa.string()),
+                            ("reaction", pa.string()),
+                        ]
+                    )
+                ),
+            ),
+            (
+                "lab_results",
+                pa.list_(
+                    pa.struct(
+                        [
+                            ("test_name", pa.string()),
+                            ("value", pa.float64()),
+                            ("unit", pa.string()),
+                            ("reference_range", pa.string()),
+                            ("date", pa.string()),
+                            ("abnormal_flag", pa.bool_()),
+                        ]
+                    )
+                ),
+            ),
+            ("last_updated", pa.string()),
         ]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for patient in patients:
-            row = {
-                "patient_id": patient["patient_id"],
-                "age": patient["demographics"]["age"],
-                "gender": patient["demographics"]["gender"],
-                "race_ethnicity": patient["demographics"]["race_ethnicity"],
-                "zip_code": patient["demographics"]["zip_code"],
-                "systolic_bp": patient["health_metrics"]["vital_signs"]["systolic_bp"],
-                "diastolic_bp": patient["health_metrics"]["vital_signs"]["diastolic_bp"],
-                "heart_rate": patient["health_metrics"]["vital_signs"]["heart_rate"],
-                "temperature": patient["health_metrics"]["vital_signs"]["temperature"],
-                "weight": patient["health_metrics"]["vital_signs"]["weight"],
-                "height": patient["health_metrics"]["vital_signs"]["height"],
-                "bmi": patient["health_metrics"]["bmi"],
-                "num_diagnoses": len(patient["diagnoses"]),
-                "num_medications": len(patient["medications"]),
-                "has_allergies": len(patient["allergies"]) > 0,
-                "num_lab_results": len(patient["lab_results"]),
-            }
-            writer.writerow(row)
-    print(f"Saved CSV to {csv_file}")
+    )
+
+
+BASE_PATH = "datasets/patient-health/synthetic_patients"
+
+
+def write_patients(patients, base, fmt):
+    """Write patients as json/jsonl (+ CSV) or parquet; returns (count, path)"""
+    return write_dataset(patients, base, fmt, CSV_FIELDS, flatten_patient, parquet_schema)
 
-    print(f"\nGeneration complete! Created {NUM_PATIENTS} synthetic patient records.")
+
+def write_shard(
+    index, seed, as_of, counts, fmt="jsonl", engine="record", batch_size=DEFAULT_BATCH_SIZE
+):
+    """Generate one shard into its own part files (runs in a worker process)"""
+    global AS_OF
+    AS_OF = as_of
+    (num_patients,) = counts
+    if engine == "numpy":
+        patients = iter_patients_vectorized(num_patients, seed, batch_size)
+    else:
+        random.seed(seed)
+        patients = iter_patients(num_patients)
+    count, _ = write_patients(patients, part_base(BASE_PATH, index), fmt)
+    return count
+
+
+def main():
+    """Generate synthetic patient dataset"""
+    parser = argparse.ArgumentParser(description="Generate synthetic patient health records")
+    parser.add_argument("--records", type=int, default=NUM_PATIENTS, help="Number of patients")
+    parser.add_argument(
+        "--engine",
+        choices=["record", "numpy"],
+        default="record",
+        help="Per-record stdlib generator or batched NumPy generator",
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="json",
+        help="json: pretty-printed array; jsonl: stream one record per line (bounded memory); "
+        "parquet: compressed columnar file with nested list columns",
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Random (root) seed")
+    parser.add_argument(
+        "--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Patients per NumPy batch"
+    )
+    add_shard_arguments(parser)
+    args = parser.parse_args()
+    sharded = resolve_shard_arguments(parser, args)
+
+    global AS_OF
+    AS_OF = args.as_of
+
+    print(f"Generating {args.records} synthetic patient records ({args.engine} engine)...")
+
+    if sharded:
+        print(f"  {args.shards} shard(s) across {args.workers} worker(s)")
+        shard_fn = partial(
+            write_shard, fmt=args.format, engine=args.engine, batch_size=args.batch_size
+        )
+        count = sum(
+            run_shards(shard_fn, (args.records,), args.shards, args.workers, args.seed, args.as_of)
+        )
+        if args.merge:
+            path = merge_dataset(BASE_PATH, args.format, args.shards)
+            print(f"Merged shards into {path}")
+        else:
+            print(f"Saved part files to {BASE_PATH}.part-*")
+    else:
+        if args.engine == "numpy":
+            patients = iter_patients_vectorized(args.records, args.seed, args.batch_size)
+        else:
+            random.seed(args.seed)
+            patients = iter_patients(args.records)
+
+        count, path = write_patients(patients, BASE_PATH, args.format)
+        print(f"Saved {args.format.upper()} to {path}")
+        if args.format != "parquet":
+            print(f"Saved CSV to {BASE_PATH}.csv")
+
+    print(f"\nGeneration complete! Created {count} synthetic patient records.")
     print("Note: All data is synthetic and for educational purposes only.")
 
 
@@ -0,0 +1,134 @@
+"""
+Precomputed samplers for weighted categorical draws
+
+`random.choices(values, weights=[...])[0]` rebuilds the cumulative weights on
+every call. The samplers here build their tables once per category and then
+draw in O(1) (AliasTable) or O(log n) (CategoricalSampler):
+
+    CONDITION = AliasTable(["New", "Used", "Certified Pre-Owned"], [30, 50, 20])
+    cond  = CONDITION.draw()           # one value
+    conds = CONDITION.sample(50_000)   # many values per call
+
+Both draw from the module-level `random` generator by default, so
+`random.seed()` keeps generation reproducible; pass `rng=random.Random(seed)`
+to use a private generator instead.
+"""
+
+import math
+import random
+from bisect import bisect
+from itertools import accumulate, repeat
+
+
+class AliasTable:
+    """Walker's alias method: O(1) weighted draws after an O(n) build
+
+    Each of the n slots holds a probability and an alias. A draw picks a slot
+    uniformly and keeps it with the slot's probability, otherwise takes its
+    alias. Slot and coin flip come from a single uniform number.
+    """
+
+    def __init__(self, values, weights=None, rng=random):
+        self.values = list(values)
+        n = len(self.values)
+        if not n:
+            raise ValueError("AliasTable needs at least one value")
+        weights = list(weights) if weights is not None else [1] * n
+        if len(weights) != n:
+            raise ValueError("values and weights must have the same length")
+        total = sum(weights)
+        if total <= 0:
+            raise ValueError("weights must sum to a positive number")
+
+        # Vose's construction: pair each under-full slot with an over-full one
+        scaled = [w * n / total for w in weights]
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, g = small.pop(), large.pop()
+            prob[s], alias[s] = scaled[s], g
+            scaled[g] -= 1.0 - scaled[s]
+            (small if scaled[g] < 1.0 else large).append(g)
+
+        self._n = n
+        self._prob = prob
+        self._keep = self.values
+        self._other = [self.values[a] for a in alias]
+        self._random = rng.random
+
+    def draw(self):
+        u = self._random() * self._n
+        i = int(u)
+        return self._keep[i] if u - i < self._prob[i] else self._other[i]
+
+    def sample(self, k):
+        """Draw `k` values in one call"""
+        n, prob, keep, other, r = self._n, self._prob, self._keep, self._other, self._random
+        out = []
+        append = out.append
+        for _ in repeat(None, k):
+            u = r() * n
+            i = int(u)
+            append(keep[i] if u - i < prob[i] else other[i])
+        return out
+
+
+class CategoricalSampler:
+    """Inverse-CDF sampling from cumulative weights computed once"""
+
+    def __init__(self, values, weights=None, rng=random):
+        self.values = list(values)
+        if not self.values:
+            raise ValueError("CategoricalSampler needs at least one value")
+        weights = list(weights) if weights is not None else [1] * len(self.values)
+        self.cum_weights = list(accumulate(weights))
+        self._total = self.cum_weights[-1]
+        self._hi = len(self.values) - 1
+        self._rng = rng
+
+    def draw(self):
+        return self.values[bisect(self.cum_weights, self._rng.random() * self._total, 0, self._hi)]
+
+    def sample(self, k):
+        """Draw `k` values in one call"""
+        return self._rng.choices(self.values, cum_weights=self.cum_weights, k=k)
+
+
+def _poisson_pmf(lam, k_max):
+    pmf = [math.exp(-lam)]
+    for k in range(1, k_max + 1):
+        pmf.append(pmf[-1] * lam / k)
+    return pmf
+
+
+def fanout_sampler(spec, rng=random):
+    """Alias table over child counts from a fan-out spec string
+
+    fixed:3          always 3
+    uniform:0-5      0..5, equally likely
+    poisson:2.5      Poisson with mean 2.5 (truncated at mean + 10 sd)
+    zipf:1.5         P(k) ~ k^-1.5 for k = 1..50 (heavy tail)
+    zipf:1.5:200     ... for k = 1..200
+    """
+    kind, _, args = spec.partition(":")
+    try:
+        if kind == "fixed":
+            return AliasTable([int(args)], rng=rng)
+        if kind == "uniform":
+            lo, hi = (int(x) for x in args.split("-"))
+            return AliasTable(range(lo, hi + 1), rng=rng)
+        if kind == "poisson":
+            lam = float(args)
+            k_max = int(lam + 10 * math.sqrt(lam) + 10)
+            return AliasTable(range(k_max + 1), _poisson_pmf(lam, k_max), rng=rng)
+        if kind == "zipf":
+            s, _, k_max = args.partition(":")
+            counts = range(1, int(k_max or 50) + 1)
+            return AliasTable(counts, [k ** -float(s) for k in counts], rng=rng)
+    except ValueError:
+        pass
+    raise ValueError(
+        f"Bad fan-out {spec!r} — use fixed:N, uniform:LO-HI, poisson:MEAN or zipf:S[:MAX]"
+    )
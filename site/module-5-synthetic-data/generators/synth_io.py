@@ -0,0 +1,273 @@
+"""
+Shared output writers for the synthetic data generators
+
+Three ways to write a dataset:
+
+- write_json_and_csv(): the original behaviour — a pretty-printed JSON array
+  plus a flattened CSV. Needs the full record list in memory.
+- write_jsonl_and_csv(): streaming — consumes any iterable of records and
+  writes one JSON object per line plus the flattened CSV row in a single pass.
+  Memory stays bounded by one record, so 10M+ row datasets are fine.
+- write_parquet(): streaming columnar output — records are buffered into row
+  groups and written to a compressed Parquet file with nested list/struct
+  columns (requires pyarrow). Memory is bounded by one row group.
+
+Each generator supplies its CSV `fieldnames`, a `flatten(record) -> dict`
+function describing the flattened CSV row, and a `parquet_schema()` function
+returning the Arrow schema of the nested record.
+"""
+
+import csv
+import json
+import os
+import random
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Records buffered by the OS before hitting disk (bytes)
+WRITE_BUFFER = 1 << 20
+
+# Parquet layout: rows per row group and column compression codec
+PARQUET_ROW_GROUP_SIZE = 100_000
+PARQUET_COMPRESSION = "zstd"
+
+FORMATS = ["json", "jsonl", "parquet"]
+
+
+def _ensure_parent(path):
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+
+class JsonlCsvSink:
+    """Incrementally write records as JSON Lines plus a flattened CSV"""
+
+    def __init__(self, jsonl_path, csv_path=None, fieldnames=None, flatten=None, append=False):
+        _ensure_parent(jsonl_path)
+        mode = "a" if append else "w"
+        self.count = 0
+        self._jsonl = open(jsonl_path, mode, encoding="utf-8", buffering=WRITE_BUFFER)
+        self._csv = None
+        self._writer = None
+        self._flatten = flatten
+        if csv_path:
+            _ensure_parent(csv_path)
+            new_file = not append or not os.path.exists(csv_path) or not os.path.getsize(csv_path)
+            self._csv = open(csv_path, mode, newline="", encoding="utf-8", buffering=WRITE_BUFFER)
+            self._writer = csv.DictWriter(self._csv, fieldnames=fieldnames)
+            if new_file:
+                self._writer.writeheader()
+
+    def write(self, record):
+        self._jsonl.write(json.dumps(record, separators=(",", ":")))
+        self._jsonl.write("\n")
+        if self._writer:
+            self._writer.writerow(self._flatten(record))
+        self.count += 1
+
+    def close(self):
+        self._jsonl.close()
+        if self._csv:
+            self._csv.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_jsonl_and_csv(
+    records, jsonl_path, csv_path=None, fieldnames=None, flatten=None, append=False
+):
+    """Stream `records` to JSONL (and CSV) in one pass; returns the record count
+
+    With `append`, records are added to the end of existing files and the CSV
+    header is only written when the CSV is new.
+    """
+    with JsonlCsvSink(jsonl_path, csv_path, fieldnames, flatten, append) as sink:
+        for record in records:
+            sink.write(record)
+    return sink.count
+
+
+def write_json_and_csv(records, json_path, csv_path=None, fieldnames=None, flatten=None):
+    """Write a pretty-printed JSON array (and CSV); returns the record count"""
+    records = list(records)
+    _ensure_parent(json_path)
+    with open(json_path, "w") as f:
+        json.dump(records, f, indent=2)
+    if csv_path:
+        _ensure_parent(csv_path)
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for record in records:
+                writer.writerow(flatten(record))
+    return len(records)
+
+
+def require_pyarrow():
+    """Return the pyarrow module, or raise a helpful ImportError"""
+    if not HAS_PYARROW:
+        raise ImportError("pyarrow is required for --format parquet — run: pip install pyarrow")
+    return pa
+
+
+class ParquetSink:
+    """Incrementally write records to a Parquet file, one row group at a time"""
+
+    def __init__(
+        self,
+        path,
+        schema,
+        row_group_size=PARQUET_ROW_GROUP_SIZE,
+        compression=PARQUET_COMPRESSION,
+    ):
+        require_pyarrow()
+        _ensure_parent(path)
+        self.count = 0
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self._buffer = []
+        self._writer = pq.ParquetWriter(path, schema, compression=compression)
+
+    def write(self, record):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            table = pa.Table.from_pylist(self._buffer, schema=self.schema)
+            self._writer.write_table(table, row_group_size=self.row_group_size)
+            self.count += len(self._buffer)
+            self._buffer = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_parquet(records, path, schema, row_group_size=PARQUET_ROW_GROUP_SIZE):
+    """Stream `records` into a Parquet file; returns the record count"""
+    with ParquetSink(path, schema, row_group_size) as sink:
+        for record in records:
+            sink.write(record)
+    return sink.count
+
+
+def merge_parquet(paths, out_path, compression=PARQUET_COMPRESSION):
+    """Copy the row groups of several Parquet files (same schema) into one file"""
+    require_pyarrow()
+    writer = None
+    try:
+        for path in paths:
+            part = pq.ParquetFile(path)
+            if writer is None:
+                writer = pq.ParquetWriter(out_path, part.schema_arrow, compression=compression)
+            for i in range(part.num_row_groups):
+                writer.write_table(part.read_row_group(i))
+    finally:
+        if writer is not None:
+            writer.close()
+    return out_path
+
+
+def write_dataset(records, base, fmt, fieldnames=None, flatten=None, schema=None, append=False):
+    """Write `records` to `base` + the extension for `fmt`; returns (count, path)
+
+    json and jsonl also write `base.csv` when `fieldnames` is given. `schema`
+    is a zero-argument function returning the Arrow schema (only called for
+    parquet, so pyarrow stays optional). `append` adds to existing jsonl/CSV
+    files; Parquet files can't be appended to, so callers write a new file.
+    """
+    csv_path = f"{base}.csv" if fieldnames else None
+    if append and fmt != "jsonl":
+        raise ValueError(f"Appending is only supported for jsonl, not {fmt!r}")
+    if fmt == "parquet":
+        path = f"{base}.parquet"
+        count = write_parquet(records, path, schema())
+    elif fmt == "jsonl":
+        path = f"{base}.jsonl"
+        count = write_jsonl_and_csv(records, path, csv_path, fieldnames, flatten, append)
+    else:
+        path = f"{base}.json"
+        count = write_json_and_csv(records, path, csv_path, fieldnames, flatten)
+    return count, path
+
+
+def open_sink(base, fmt, fieldnames=None, flatten=None, schema=None):
+    """Open a streaming sink for `base` in jsonl or parquet; returns (sink, path)
+
+    For generators that write several related tables in one pass.
+    """
+    if fmt == "parquet":
+        path = f"{base}.parquet"
+        return ParquetSink(path, schema()), path
+    if fmt == "jsonl":
+        path = f"{base}.jsonl"
+        csv_path = f"{base}.csv" if fieldnames else None
+        return JsonlCsvSink(path, csv_path, fieldnames, flatten), path
+    raise ValueError(f"Streaming sinks support jsonl and parquet, not {fmt!r}")
+
+
+def iter_jsonl(path, offset=0):
+    """Yield records from a JSON Lines file one at a time, from byte `offset` on"""
+    with open(path, encoding="utf-8") as f:
+        f.seek(offset)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_parquet(path):
+    """Yield records from a Parquet file one row group at a time"""
+    require_pyarrow()
+    parquet = pq.ParquetFile(path)
+    for i in range(parquet.num_row_groups):
+        yield from parquet.read_row_group(i).to_pylist()
+
+
+# ── Generator checkpoints ─────────────────────────────────────────────────────
+
+
+def rng_state(rng=random):
+    """JSON-serialisable state of a `random` generator"""
+    version, internal, gauss_next = rng.getstate()
+    return [version, list(internal), gauss_next]
+
+
+def restore_rng_state(state, rng=random):
+    version, internal, gauss_next = state
+    rng.setstate((version, tuple(internal), gauss_next))
+
+
+def load_checkpoint(path):
+    """Return a saved generator checkpoint, or None if there is none"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    """Write a generator checkpoint atomically (write a temp file, then rename)"""
+    _ensure_parent(path)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
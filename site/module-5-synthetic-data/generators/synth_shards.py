@@ -0,0 +1,132 @@
+"""
+Sharded, multi-process generation for the synthetic data generators
+
+A dataset of N records is split into M shards. Shard i is generated from its
+own seed, derived from the root seed, and written to its own part files:
+
+    datasets/lithia/vehicles.part-00000.jsonl
+    datasets/lithia/vehicles.part-00000.csv
+    ...
+
+Shards are distributed over a process pool of `--workers` processes. Because a
+shard's content depends only on (root seed, shard index, shard size, reference
+time), the part files — and the merged output — are byte-identical no matter
+how many workers run them. Pass --as-of to pin the reference time across runs.
+
+Each generator provides a module-level `write_shard(index, seed, as_of, counts)`
+function (picklable, so it can run in a worker process) that seeds its RNG,
+pins its reference time to `as_of` and writes the part files for one shard.
+"""
+
+import hashlib
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from synth_io import merge_parquet
+
+
+def add_shard_arguments(parser):
+    """Register --shards/--workers/--merge/--as-of on a generator's argument parser"""
+    parser.add_argument(
+        "--shards", type=int, default=None, help="Split generation into M shards (part files)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Processes used to generate shards"
+    )
+    parser.add_argument(
+        "--merge", action="store_true", help="Concatenate shard part files into one dataset"
+    )
+    parser.add_argument(
+        "--as-of",
+        type=datetime.fromisoformat,
+        default=None,
+        help="Reference time for generated dates, e.g. 2025-01-31T12:00:00 (default: now)",
+    )
+
+
+def resolve_shard_arguments(parser, args):
+    """Fill in --shards/--workers defaults; returns True when sharding is requested"""
+    if args.shards is None and args.workers is None:
+        if args.merge:
+            parser.error("--merge requires --shards or --workers")
+        return False
+    if args.shards is None:
+        args.shards = args.workers
+    if args.workers is None:
+        args.workers = min(args.shards, os.cpu_count() or 1)
+    if args.shards < 1 or args.workers < 1:
+        parser.error("--shards and --workers must be at least 1")
+    if args.format == "json":
+        parser.error("sharded generation writes part files — use --format jsonl or parquet")
+    return True
+
+
+def derive_seed(root_seed, shard_index):
+    """Stable 64-bit seed for one shard, independent of worker count"""
+    digest = hashlib.sha256(f"{root_seed}:{shard_index}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def split_records(total, shards):
+    """Split `total` records into `shards` near-equal counts"""
+    base, extra = divmod(total, shards)
+    return [base + (1 if i < extra else 0) for i in range(shards)]
+
+
+def part_base(base, index):
+    return f"{base}.part-{index:05d}"
+
+
+def part_path(base, index, ext):
+    return f"{part_base(base, index)}.{ext}"
+
+
+def run_shards(write_shard, totals, shards, workers, root_seed, as_of=None):
+    """Run write_shard(index, seed, as_of, counts) for every shard
+
+    `totals` is a tuple of record counts (one per dataset the generator
+    writes); each is split across the shards. Returns the per-shard results
+    in shard order.
+    """
+    as_of = as_of or datetime.now()
+    per_dataset = [split_records(total, shards) for total in totals]
+    tasks = [
+        (i, derive_seed(root_seed, i), as_of, tuple(sizes[i] for sizes in per_dataset))
+        for i in range(shards)
+    ]
+
+    if workers <= 1:
+        return [write_shard(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(write_shard, *zip(*tasks)))
+
+
+def merge_parts(base, ext, shards, has_header=False):
+    """Concatenate part files in shard order into `base.ext` and remove the parts"""
+    out_path = f"{base}.{ext}"
+    if ext == "parquet":
+        paths = [part_path(base, i, ext) for i in range(shards)]
+        merge_parquet(paths, out_path)
+        for path in paths:
+            os.remove(path)
+        return out_path
+
+    with open(out_path, "wb") as out:
+        for i in range(shards):
+            path = part_path(base, i, ext)
+            with open(path, "rb") as part:
+                if has_header and i > 0:
+                    part.readline()
+                shutil.copyfileobj(part, out, 1 << 20)
+            os.remove(path)
+    return out_path
+
+
+def merge_dataset(base, fmt, shards):
+    """Merge every part file a dataset has in `fmt`; returns the main output path"""
+    if fmt == "parquet":
+        return merge_parts(base, "parquet", shards)
+    merge_parts(base, "csv", shards, has_header=True)
+    return merge_parts(base, "jsonl", shards)
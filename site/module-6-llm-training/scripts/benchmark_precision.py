@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark: LoRA training step time and peak memory per precision mode
+
+Runs a few LoRA training steps (forward, backward, AdamW step) on a fixed
+random batch for each mode of cpu_quant.py, each in its own subprocess so
+peak RSS is measured from a clean start:
+
+    fp32 : the original float32 setup
+    bf16 : frozen base weights and activations in bfloat16
+    int8 : frozen base Linear weights int8 (weight-only)
+
+The loss of the first step is printed too: it should stay close to fp32.
+
+Usage:
+    python scripts/benchmark_precision.py [--modes fp32 bf16 int8] \
+        [--steps 5] [--batch-size 1] [--seq-len 512]
+
+Output: one row per mode with the parameter/buffer size ("weights"), the
+process peak RSS, the median step time, tokens/s and the first-step loss.
+The weights column is roughly 4.2 GB / 2.1 GB / 1.3 GB for TinyLlama 1.1B
+(the int8 mode keeps embeddings and lm_head in the activation dtype).
+
+Without native bf16 (no AMX / AVX512_BF16) the bf16 modes still save memory
+but can be slower than fp32, which is why precision "auto" picks fp32 there.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+MODES = ["fp32", "bf16", "int8"]
+
+
+def run_mode(args) -> dict:
+    """Child process: time `args.steps` training steps in one precision mode"""
+    import torch
+    from cpu_quant import apply_precision, weight_bytes
+    from train import load_config, setup_lora, setup_model_and_tokenizer
+    from train_metrics import peak_rss_mb
+
+    config = load_config(args.config)
+    torch.manual_seed(0)
+    model, tokenizer = setup_model_and_tokenizer(config, args.mode)
+    model = setup_lora(model, config)
+    apply_precision(model, args.mode)
+    model.enable_input_require_grads()
+    model.train()
+
+    input_ids = torch.randint(100, tokenizer.vocab_size, (args.batch_size, args.seq_len),
+                              generator=torch.Generator().manual_seed(0))
+    optimizer = torch.optim.AdamW([p for p in model.parameters() if p.requires_grad], lr=1e-5)
+
+    times, first_loss = [], None
+    for step in range(args.warmup + args.steps):
+        start = time.perf_counter()
+        loss = model(input_ids=input_ids, labels=input_ids).loss
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+        if first_loss is None:
+            first_loss = loss.item()
+        if step >= args.warmup:
+            times.append(time.perf_counter() - start)
+
+    step_time = statistics.median(times)
+    return {
+        "mode": args.mode,
+        "weights_mb": weight_bytes(model) / 2**20,
+        "peak_rss_mb": peak_rss_mb(),
+        "step_s": step_time,
+        "tokens_per_s": args.batch_size * args.seq_len / step_time,
+        "loss": first_loss,
+    }
+
+
+def spawn(mode: str, args) -> dict:
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--child", mode,
+           "--config", args.config, "--steps", str(args.steps), "--warmup", str(args.warmup),
+           "--batch-size", str(args.batch_size), "--seq-len", str(args.seq_len)]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        return {"mode": mode, "error": f"exit code {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare LoRA step time and peak RSS per precision")
+    parser.add_argument("--config", default="./configs/lora_config.yaml")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--steps", type=int, default=5, help="Timed steps per mode")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed steps first")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--seq-len", type=int, default=512)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.mode = args.child
+        print(json.dumps(run_mode(args)))
+        return
+
+    from cpu_quant import cpu_features
+    f = cpu_features()
+    print(f"CPU: {f['capability']}, avx512_bf16={f['avx512_bf16']}, amx_bf16={f['amx_bf16']}")
+
+    results = [spawn(mode, args) for mode in args.modes]
+    print(f"{'mode':8} {'weights':>9} {'peak RSS':>10} {'step (median)':>15} {'tokens/s':>10}   loss")
+    for r in results:
+        if "error" in r:
+            print(f"{r['mode']:8} failed ({r['error']})")
+            continue
+        print(f"{r['mode']:8} {r['weights_mb']:>6,.0f} MB {r['peak_rss_mb']:>7,.0f} MB "
+              f"{r['step_s']:>12.2f} s {r['tokens_per_s']:>10,.0f}   {r['loss']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
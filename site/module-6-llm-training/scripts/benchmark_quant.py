@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark: quantized CPU inference vs fp32
+
+Answers a fixed prompt set with the adapter-merged model in each mode of
+inference.py --quantize, each in its own subprocess so peak RSS is measured
+from a clean start:
+
+    none : merged fp32 weights (the reference)
+    int8 : dynamic int8 Linear layers
+    int4 : weight-only int4 Linear layers, groups of 64
+
+and compares every mode's greedy answers with the fp32 ones.
+
+Usage:
+    python scripts/benchmark_quant.py --model models/healthcare-lora \\
+        [--modes none int8 int4] [--questions-file data/processed/eval.jsonl --limit 50] \\
+        [--max-tokens 150] [--batch-size 1]
+
+    Without --questions-file the prompts are inference.DEFAULT_QUESTIONS.
+
+Output: one row per mode with load time, peak RSS, answer tokens/s, the share
+of answers identical to fp32 and the mean word-level similarity to them
+(difflib ratio, 1.0 = same words in the same order).
+The merged weights are cached by the first run (see inference.py --merged),
+so run once beforehand if cold-start time should not count.
+"""
+
+import argparse
+import difflib
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+MODES = ["none", "int8", "int4"]
+
+
+def run_mode(args) -> dict:
+    """Child process: answer the prompt set in one mode"""
+    from inference import DEFAULT_QUESTIONS, build_prompt_parts, generate_batch, load_model, load_questions
+    from train_metrics import peak_rss_mb
+
+    if args.questions_file:
+        _, prompts = load_questions(args.questions_file)
+        prompts = prompts[:args.limit] if args.limit else prompts
+    else:
+        prompts = [build_prompt_parts(q) for q in DEFAULT_QUESTIONS]
+
+    start = time.perf_counter()
+    model, tok, device = load_model(args.model, merged=True, quantize=args.mode)
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    answers = generate_batch(model, tok, device, prompts, args.max_tokens, args.batch_size)
+    elapsed = time.perf_counter() - start
+    tokens = sum(len(tok(a, add_special_tokens=False)["input_ids"]) for a in answers)
+    return {
+        "mode": args.mode,
+        "load_s": load_s,
+        "peak_rss_mb": peak_rss_mb(),
+        "tokens_per_s": tokens / elapsed,
+        "answers": answers,
+    }
+
+
+def spawn(mode: str, args) -> dict:
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--child", mode, "--model", args.model,
+           "--max-tokens", str(args.max_tokens), "--batch-size", str(args.batch_size)]
+    if args.questions_file:
+        cmd += ["--questions-file", args.questions_file, "--limit", str(args.limit)]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        return {"mode": mode, "error": f"exit code {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def agreement(answers: list[str], reference: list[str]) -> tuple[float, float]:
+    """(share of identical answers, mean word-level similarity)"""
+    same = sum(a == r for a, r in zip(answers, reference))
+    ratio = sum(difflib.SequenceMatcher(None, a.split(), r.split()).ratio()
+                for a, r in zip(answers, reference))
+    return same / max(len(reference), 1), ratio / max(len(reference), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare quantized CPU inference with fp32")
+    parser.add_argument("--model", default="./models/healthcare-lora", help="Path to LoRA adapter directory")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--questions-file", default=None, help="JSONL prompt set (see inference.py)")
+    parser.add_argument("--limit", type=int, default=50, help="Prompts used from --questions-file (0 = all)")
+    parser.add_argument("--max-tokens", type=int, default=150)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--output", default=None, help="Write all answers and numbers as JSON here")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.mode = args.child
+        print(json.dumps(run_mode(args)))
+        return
+
+    modes = ["none"] + [m for m in args.modes if m != "none"]  # fp32 is the reference
+    results = [spawn(mode, args) for mode in modes]
+    reference = results[0].get("answers")
+
+    print(f"\n{'mode':6} {'load':>8} {'peak RSS':>10} {'tokens/s':>9} {'identical':>10} {'similarity':>11}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['mode']:6} failed ({r['error']})")
+            continue
+        same, sim = agreement(r["answers"], reference) if reference else (float("nan"),) * 2
+        r["identical"], r["similarity"] = same, sim
+        print(f"{r['mode']:6} {r['load_s']:>7.1f}s {r['peak_rss_mb']:>7,.0f} MB {r['tokens_per_s']:>9.2f} "
+              f"{same:>10.0%} {sim:>11.3f}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2, ensure_ascii=False))
+        print(f"\nAnswers and numbers written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
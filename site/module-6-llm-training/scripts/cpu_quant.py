@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+CPU precision modes for LoRA training
+
+The LoRA adapters are the only trainable weights, so the frozen base model
+can be stored in a smaller format while the adapters stay float32:
+
+    fp32   everything float32 (the original behaviour)
+    bf16   base weights and activations in bfloat16 — half the weight memory;
+           fast on CPUs with native bf16 math (AMX or AVX512_BF16)
+    int8   base Linear weights int8 with one float scale per output channel
+           (weight-only quantization, about a third of the fp32 memory);
+           activations in bf16 when the CPU supports it, float32 otherwise
+    auto   bf16 on CPUs with native bf16 support, fp32 elsewhere
+
+Embeddings, norms and lm_head are never quantized. The int8 layers
+dequantize inside a custom autograd function, so backward (needed for the
+LoRA layers below them) does not keep a dequantized copy of every weight.
+
+For inference (after the adapter is merged), quantize_for_inference() offers
+
+    int8   torch dynamic quantization: int8 weights, activations quantized
+           on the fly, fbgemm/onednn int8 matmuls
+    int4   weight-only int4, one scale per group of 64 input features,
+           dequantized per layer in forward — smallest, but not faster
+
+Usage (from train.py):
+    from cpu_quant import apply_precision, resolve_precision
+    mode = resolve_precision("auto")
+    compute_dtype = apply_precision(model, mode)   # after setup_lora()
+
+Usage (from inference.py):
+    model = quantize_for_inference(merged_model, "int8")
+
+    python scripts/cpu_quant.py      # print the detected CPU features
+"""
+
+import platform
+from typing import Dict, Iterable
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+PRECISIONS = ["auto", "fp32", "bf16", "int8"]
+
+# Kept in the compute dtype: quantizing the output head costs the most accuracy
+SKIP_MODULES = ("lm_head",)
+
+
+# ── CPU feature detection ─────────────────────────────────────────────────────
+
+def _cpu_flags() -> set:
+    """Feature flags from /proc/cpuinfo (Linux); empty elsewhere"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def cpu_features() -> Dict[str, object]:
+    flags = _cpu_flags()
+    capability = torch.backends.cpu.get_cpu_capability() \
+        if hasattr(torch.backends, "cpu") and hasattr(torch.backends.cpu, "get_cpu_capability") \
+        else "unknown"
+    return {
+        "machine": platform.machine(),
+        "capability": capability,          # ATen kernel level: DEFAULT / AVX2 / AVX512 ...
+        "avx512": "avx512f" in flags or capability.startswith("AVX512"),
+        "avx512_bf16": "avx512_bf16" in flags,
+        "amx_bf16": "amx_bf16" in flags,
+        "amx_int8": "amx_int8" in flags,
+    }
+
+
+def native_bf16(features: Dict[str, object] = None) -> bool:
+    """True if bf16 matmuls run in hardware (AMX or AVX512_BF16) rather than emulated"""
+    features = features or cpu_features()
+    return bool(features["amx_bf16"] or features["avx512_bf16"])
+
+
+def resolve_precision(mode: str, device: str = "cpu") -> str:
+    """Turn "auto" into a concrete mode for this machine"""
+    if mode not in PRECISIONS:
+        raise ValueError(f"Unknown precision {mode!r}; choose from {', '.join(PRECISIONS)}")
+    if mode != "auto":
+        return mode
+    if device != "cpu":
+        return "fp32"
+    return "bf16" if native_bf16() else "fp32"
+
+
+# ── int8 weight-only Linear ───────────────────────────────────────────────────
+
+_INT8_MM = getattr(torch, "_weight_int8pack_mm", None)
+
+
+def _int8_matmul(x: torch.Tensor, qweight: torch.Tensor, scale: torch.Tensor) -> torch.Tensor:
+    """x @ (qweight * scale[:, None]).T"""
+    if _INT8_MM is not None and x.dtype in (torch.float32, torch.bfloat16):
+        flat = x.reshape(-1, x.shape[-1]).contiguous()
+        out = _INT8_MM(flat, qweight, scale.to(x.dtype))
+        return out.reshape(*x.shape[:-1], qweight.shape[0])
+    return F.linear(x, qweight.to(x.dtype) * scale.to(x.dtype)[:, None])
+
+
+class _Int8LinearFunction(torch.autograd.Function):
+    @staticmethod
+    def forward(ctx, x, qweight, scale):
+        ctx.save_for_backward(qweight, scale)
+        return _int8_matmul(x, qweight, scale)
+
+    @staticmethod
+    def backward(ctx, grad_out):
+        qweight, scale = ctx.saved_tensors
+        # d(x W^T)/dx = grad W, with W dequantized for this one product only
+        grad_in = (grad_out * scale.to(grad_out.dtype)) @ qweight.to(grad_out.dtype)
+        return grad_in, None, None
+
+
+class Int8Linear(nn.Module):
+    """Frozen Linear with int8 weights and per-output-channel float scales"""
+
+    def __init__(self, linear: nn.Linear, compute_dtype: torch.dtype):
+        super().__init__()
+        self.in_features = linear.in_features
+        self.out_features = linear.out_features
+        w = linear.weight.detach().float()
+        scale = (w.abs().amax(dim=1) / 127.0).clamp(min=1e-8)
+        self.register_buffer("qweight", torch.round(w / scale[:, None]).clamp(-127, 127).to(torch.int8))
+        self.register_buffer("scale", scale)
+        self.register_buffer("bias", None if linear.bias is None
+                             else linear.bias.detach().to(compute_dtype))
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        out = _Int8LinearFunction.apply(x, self.qweight, self.scale)
+        return out + self.bias if self.bias is not None else out
+
+    def extra_repr(self) -> str:
+        return f"in_features={self.in_features}, out_features={self.out_features}, int8"
+
+
+def _linears(model: nn.Module, skip: Iterable[str], frozen_only: bool = False):
+    """(parent, attribute name, full name, module) of every nn.Linear outside `skip`"""
+    for name, module in model.named_modules():
+        for child_name, child in module.named_children():
+            full = f"{name}.{child_name}" if name else child_name
+            if isinstance(child, nn.Linear) and not any(s in full for s in skip) \
+                    and not (frozen_only and child.weight.requires_grad):
+                yield module, child_name, full, child
+
+
+def quantize_frozen_linears(model: nn.Module, compute_dtype: torch.dtype,
+                            skip: Iterable[str] = SKIP_MODULES) -> int:
+    """Replace frozen Linear layers (incl. LoRA base layers) with Int8Linear; returns the count"""
+    targets = list(_linears(model, skip, frozen_only=True))
+    for parent, name, _, linear in targets:
+        setattr(parent, name, Int8Linear(linear, compute_dtype))
+    return len(targets)
+
+
+# ── int4 weight-only Linear (inference) ──────────────────────────────────────
+
+INT4_GROUP_SIZE = 64
+
+
+class Int4Linear(nn.Module):
+    """Linear with int4 weights (two per byte) and one scale per group of inputs"""
+
+    def __init__(self, linear: nn.Linear, group_size: int = INT4_GROUP_SIZE):
+        super().__init__()
+        self.in_features = linear.in_features
+        self.out_features = linear.out_features
+        self.group_size = group_size
+        w = linear.weight.detach().float().reshape(self.out_features, -1, group_size)
+        scale = (w.abs().amax(dim=-1, keepdim=True) / 7.0).clamp(min=1e-8)
+        q = (torch.round(w / scale).clamp(-8, 7) + 8).to(torch.uint8).reshape(self.out_features, -1)
+        self.register_buffer("packed", q[:, 0::2] | (q[:, 1::2] << 4))
+        self.register_buffer("scale", scale.squeeze(-1).half())
+        self.register_buffer("bias", None if linear.bias is None else linear.bias.detach().clone())
+
+    def dequantize(self, dtype: torch.dtype) -> torch.Tensor:
+        q = torch.stack([self.packed & 0xF, self.packed >> 4], dim=-1).reshape(self.out_features, -1, self.group_size)
+        w = (q.to(dtype) - 8) * self.scale.to(dtype)[..., None]
+        return w.reshape(self.out_features, self.in_features)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        bias = self.bias.to(x.dtype) if self.bias is not None else None
+        return F.linear(x, self.dequantize(x.dtype), bias)
+
+    def extra_repr(self) -> str:
+        return (f"in_features={self.in_features}, out_features={self.out_features}, "
+                f"int4, group_size={self.group_size}")
+
+
+QUANT_MODES = ["none", "int8", "int4"]
+
+
+def quantize_for_inference(model: nn.Module, mode: str, skip: Iterable[str] = SKIP_MODULES,
+                           group_size: int = INT4_GROUP_SIZE) -> nn.Module:
+    """Quantize the Linear layers of a merged (plain, non-LoRA) model for CPU inference"""
+    if mode == "none":
+        return model
+    targets = list(_linears(model, skip))
+    if mode == "int8":
+        from torch.ao.quantization import default_dynamic_qconfig, quantize_dynamic
+        return quantize_dynamic(model, {full: default_dynamic_qconfig for _, _, full, _ in targets},
+                                dtype=torch.qint8, inplace=True)
+    if mode == "int4":
+        for parent, name, _, linear in targets:
+            if linear.in_features % group_size == 0:
+                setattr(parent, name, Int4Linear(linear, group_size))
+        return model
+    raise ValueError(f"Unknown quantization {mode!r}; choose from {', '.join(QUANT_MODES)}")
+
+
+# ── Applying a mode ───────────────────────────────────────────────────────────
+
+def apply_precision(model: nn.Module, mode: str) -> torch.dtype:
+    """Convert a LoRA-wrapped model in place; returns the activation dtype
+
+    Trainable (LoRA) parameters always stay float32.
+    """
+    if mode == "fp32":
+        return torch.float32
+    compute_dtype = torch.bfloat16 if mode == "bf16" or native_bf16() else torch.float32
+    if mode == "int8":
+        quantize_frozen_linears(model, compute_dtype)
+    # buffers (rotary inv_freq, int8 scales) keep their dtype
+    for param in model.parameters():
+        param.data = param.data.float() if param.requires_grad else param.data.to(compute_dtype)
+    return compute_dtype
+
+
+def weight_bytes(model: nn.Module) -> int:
+    """Bytes held by parameters and buffers (packed dynamic-int8 weights not included)"""
+    tensors = list(model.parameters()) + [b for b in model.buffers() if b is not None]
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+if __name__ == "__main__":
+    features = cpu_features()
+    for key, value in features.items():
+        print(f"{key:12}: {value}")
+    print(f"{'auto mode':12}: {resolve_precision('auto')}")
@@ -11,14 +11,50 @@ Usage (with DynamoDB context):
 
 Usage (no DynamoDB):
   python3 scripts/inference.py --model models/healthcare-lora --prompt "What is LoRA?"
+
+Bulk evaluation (one generate() call per --batch-size questions):
+  python3 scripts/inference.py --model models/healthcare-lora \\
+    --questions-file data/processed/eval.jsonl --output answers.jsonl
+
+  Each JSONL line is {"question": ..., "context": ... (optional)}, a raw
+  {"prompt": ...}, or a prepare_data.py record {"text": ...} whose prompt is
+  everything up to <|assistant|> and whose answer is kept as "reference".
+  Output lines are the input records plus "answer".
+
+Prefix caching (on by default, --no-prefix-cache to disable):
+  The <|system|> block and the DynamoDB context are the same for every
+  question of a run. Their key/values are computed once, kept in an LRU
+  cache keyed by a hash of the prefix tokens, and reused for each question,
+  so time to first token depends on the question length, not the context.
+
+Merged weights (--merged):
+  The first start merges the adapter into the base weights and saves the
+  result as safetensors under <adapter>/.merged/<hash of base model + adapter>/.
+  Later starts memory-map that file into an empty model instead of loading the
+  base and applying the adapter, and every forward pass skips the LoRA branch.
+  Retraining the adapter changes the hash, so a stale merge is never used.
+
+Quantized inference (--quantize int8|int4, CPU, implies --merged):
+  The merged Linear layers (not lm_head) become dynamic int8 or group-wise
+  int4 weight-only layers (see cpu_quant.py). benchmark_quant.py compares
+  tokens/s, peak RSS and answer agreement with fp32.
 """
 import argparse
+import hashlib
 import json
+import os
+import shutil
+import time
+from collections import OrderedDict
+from itertools import groupby
 import torch
 from pathlib import Path
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer, DynamicCache
 from peft import PeftModel, PeftConfig
 
+MERGED_DIR = ".merged"
+ADAPTER_FILES = ("adapter_config.json", "adapter_model.safetensors", "adapter_model.bin")
+
 SYSTEM = (
     "You are a helpful automotive data assistant for Lithia Motors. "
     "When given database records, answer questions using only that data. "
@@ -26,9 +62,23 @@ SYSTEM = (
 )
 
 
+def build_prompt_parts(question: str, context: str = "") -> tuple[str, str]:
+    """(prefix shared by every question with this context, question-specific suffix)"""
+    head = f"<|system|>\n{SYSTEM}</s>\n<|user|>\n"
+    tail = "</s>\n<|assistant|>\n"
+    if not context:
+        return head, f"{question}{tail}"
+    return f"{head}{context.lstrip()}\n\n", f"{question.rstrip()}{tail}"
+
+
 def build_prompt(question: str, context: str = "") -> str:
-    user_content = f"{context}\n\n{question}".strip() if context else question
-    return f"<|system|>\n{SYSTEM}</s>\n<|user|>\n{user_content}</s>\n<|assistant|>\n"
+    return "".join(build_prompt_parts(question, context))
+
+
+def split_prompt(prompt: str) -> tuple[str, str]:
+    """build_prompt_parts() for a raw chat prompt: the shared prefix ends at the last <|user|>"""
+    head, sep, rest = prompt.rpartition("<|user|>\n")
+    return (head + sep, rest) if sep else ("", prompt)
 
 
 def fetch_dynamo_context(tables: list[str], region: str, max_rows: int = 10) -> str:
@@ -55,7 +105,81 @@ def fetch_dynamo_context(tables: list[str], region: str, max_rows: int = 10) ->
     return "\n\n".join(blocks)
 
 
-def load_model(adapter_path: str):
+# ── Merged-weight cache ──────────────────────────────────────────────────────
+
+def merged_key(base: str, adapter_path: str) -> str:
+    """Hash of the base model (name + hub revision) and the adapter files"""
+    h = hashlib.blake2b(digest_size=8)
+    revision = getattr(AutoConfig.from_pretrained(base), "_commit_hash", None) or ""
+    h.update(f"{base}@{revision}".encode())
+    for name in ADAPTER_FILES:
+        path = Path(adapter_path) / name
+        if path.exists():
+            h.update(name.encode())
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+    return h.hexdigest()
+
+
+def save_merged(model, merged_dir: Path, prune: bool = False):
+    """Write config + model.safetensors atomically; prune: drop the other merges in its directory"""
+    from safetensors.torch import save_file
+
+    tmp = merged_dir.with_name(f"{merged_dir.name}.tmp-{os.getpid()}")
+    tmp.mkdir(parents=True, exist_ok=True)
+    model.config.save_pretrained(tmp)
+    state = model.state_dict()
+    if getattr(model.config, "tie_word_embeddings", False):
+        state.pop("lm_head.weight", None)  # safetensors refuses shared tensors; re-tied on load
+    save_file({k: v.contiguous() for k, v in state.items()}, str(tmp / "model.safetensors"),
+              metadata={"format": "pt"})
+    if prune:  # merges of earlier versions of this adapter
+        for old in merged_dir.parent.iterdir():
+            if old != tmp and not old.name.startswith(f"{merged_dir.name}."):
+                shutil.rmtree(old, ignore_errors=True)
+    try:
+        os.replace(tmp, merged_dir)
+    except OSError:  # another process finished the same merge first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load_merged(merged_dir: Path):
+    """Build the model on the meta device and assign the memory-mapped weights to it"""
+    from accelerate import init_empty_weights
+    from safetensors.torch import load_file
+
+    config = AutoConfig.from_pretrained(merged_dir)
+    with init_empty_weights(include_buffers=False):  # rotary buffers stay real
+        model = AutoModelForCausalLM.from_config(config)
+    state = load_file(str(merged_dir / "model.safetensors"))
+    missing, unexpected = model.load_state_dict(state, strict=False, assign=True)
+    if getattr(config, "tie_word_embeddings", False):
+        model.tie_weights()
+        missing = [k for k in missing if k != "lm_head.weight"]
+    if missing or unexpected:
+        raise RuntimeError(f"{merged_dir} does not match the model (missing {missing[:3]}, "
+                           f"unexpected {unexpected[:3]}); delete it to merge again")
+    return model
+
+
+def merged_model(base: str, adapter_path: str, cache_root: str = None):
+    """The base model with the adapter merged in, from the cache when possible"""
+    root = Path(cache_root) if cache_root else Path(adapter_path) / MERGED_DIR
+    merged_dir = root / merged_key(base, adapter_path)
+    if (merged_dir / "model.safetensors").exists():
+        print(f"Weights    : merged, memory-mapped from {merged_dir}")
+        return load_merged(merged_dir)
+    print("Weights    : merging adapter into the base model (first start only)")
+    model = AutoModelForCausalLM.from_pretrained(base, dtype=torch.float32, low_cpu_mem_usage=True)
+    model = PeftModel.from_pretrained(model, adapter_path).merge_and_unload()
+    save_merged(model, merged_dir, prune=cache_root is None)
+    print(f"             cached at {merged_dir}")
+    return model
+
+
+def load_model(adapter_path: str, merged: bool = False, merged_cache: str = None,
+               quantize: str = "none"):
     cfg = PeftConfig.from_pretrained(adapter_path)
     base = cfg.base_model_name_or_path
     if torch.cuda.is_available():
@@ -70,17 +194,109 @@ def load_model(adapter_path: str):
     print(f"Device     : {device}")
 
     tok = AutoTokenizer.from_pretrained(adapter_path)
-    model = AutoModelForCausalLM.from_pretrained(
-        base, dtype=torch.float32, low_cpu_mem_usage=True
-    )
-    model = PeftModel.from_pretrained(model, adapter_path)
+    if quantize != "none" and device != "cpu":
+        raise ValueError(f"--quantize {quantize} runs on the CPU only (device is {device})")
+    if merged or quantize != "none":  # quantize the merged weights, not base + adapter
+        model = merged_model(base, adapter_path, merged_cache)
+    else:
+        model = AutoModelForCausalLM.from_pretrained(
+            base, dtype=torch.float32, low_cpu_mem_usage=True
+        )
+        model = PeftModel.from_pretrained(model, adapter_path)
+    if quantize != "none":
+        from cpu_quant import quantize_for_inference
+        model = quantize_for_inference(model, quantize)
+        print(f"Quantized  : {quantize} (Linear layers, lm_head kept float32)")
     model.eval()
     if device != "cpu":
         model = model.to(device)
     return model, tok, device
 
 
-def ask(model, tok, device: str, question: str, context: str = "", max_new_tokens: int = 150) -> str:
+# ── Prefix KV cache ──────────────────────────────────────────────────────────
+
+def cache_to_tensors(cache) -> list:
+    """[(keys, values)] per layer, each [batch, heads, seq, head_dim]"""
+    if hasattr(cache, "layers"):  # transformers >= 4.56
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    if hasattr(cache, "key_cache"):
+        return list(zip(cache.key_cache, cache.value_cache))
+    return [tuple(kv) for kv in cache]  # legacy tuples
+
+
+def tensors_to_cache(kv: list) -> DynamicCache:
+    cache = DynamicCache()
+    for i, (k, v) in enumerate(kv):
+        cache.update(k, v, i)
+    return cache
+
+
+class PrefixCache:
+    """Key/values of prompt prefixes, LRU-evicted, keyed by a hash of the prefix token IDs"""
+
+    def __init__(self, model, device: str, max_entries: int = 4):
+        self.model = model
+        self.device = device
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, list] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, ids: list[int]) -> list:
+        """[(keys, values)] per layer for `ids`, computed on a miss"""
+        key = hashlib.blake2b(str(ids).encode(), digest_size=16).hexdigest()
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        with torch.no_grad():
+            out = self.model(input_ids=torch.tensor([ids], device=self.device), use_cache=True)
+        self.entries[key] = cache_to_tensors(out.past_key_values)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return self.entries[key]
+
+
+def _common_len(a: list[int], b: list[int]) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+def _prefixed_inputs(tok, prefix: str, texts: list[str], prefix_cache: PrefixCache, pad_id: int):
+    """Inputs for generate() that reuse the cached prefix: [prefix][padding][suffix] per row.
+
+    The cache covers the tokens every row shares with the tokenized prefix
+    (a token merged across the prefix/suffix boundary is recomputed). Padding
+    sits between prefix and suffix, masked out, and position IDs follow the
+    attention mask, so each row sees exactly its own prompt. Returns None if
+    nothing can be reused.
+    """
+    full = [tok(t)["input_ids"] for t in texts]
+    prefix_ids = tok(prefix)["input_ids"]
+    n = min(min(_common_len(prefix_ids, f), len(f) - 1) for f in full)
+    if n < 1:
+        return None
+    kv = prefix_cache.get(prefix_ids)
+    suffixes = [f[n:] for f in full]
+    width = max(len(x) for x in suffixes)
+    ids = torch.tensor([prefix_ids[:n] + [pad_id] * (width - len(x)) + x for x in suffixes])
+    mask = torch.tensor([[1] * n + [0] * (width - len(x)) + [1] * len(x) for x in suffixes])
+    rows = len(texts)
+    past = tensors_to_cache([(k[:, :, :n].expand(rows, -1, -1, -1).contiguous(),
+                              v[:, :, :n].expand(rows, -1, -1, -1).contiguous()) for k, v in kv])
+    return {"input_ids": ids, "attention_mask": mask, "past_key_values": past}
+
+
+def ask(model, tok, device: str, question: str, context: str = "", max_new_tokens: int = 150,
+        prefix_cache: PrefixCache = None) -> str:
+    if prefix_cache is not None:
+        return generate_batch(model, tok, device, [build_prompt_parts(question, context)],
+                              max_new_tokens, 1, prefix_cache)[0]
     p = build_prompt(question, context)
     inp = tok(p, return_tensors="pt")
     if device != "cpu":
@@ -95,6 +311,85 @@ def ask(model, tok, device: str, question: str, context: str = "", max_new_token
     return tok.decode(out[0][inp["input_ids"].shape[1]:], skip_special_tokens=True).strip()
 
 
+def generate_batch(model, tok, device: str, prompts: list, max_new_tokens: int = 150,
+                   batch_size: int = 8, prefix_cache: PrefixCache = None) -> list[str]:
+    """Answer many prompts, batch_size per generate() call; answers in input order.
+
+    A prompt is a string or a (prefix, suffix) pair from build_prompt_parts().
+    Prompts are left-padded (so every row's answer starts at the same column)
+    and batched in length order to keep padding low; with a prefix_cache,
+    batches hold prompts of one prefix, whose key/values come from the cache.
+    Greedy answers can differ from ask() in the last bits of the logits,
+    rarely in the text.
+    """
+    parts = [split_prompt(p) if isinstance(p, str) else p for p in prompts]
+    shared = (lambda i: parts[i][0]) if prefix_cache is not None else (lambda i: "")
+    order = sorted(range(len(parts)), key=lambda i: (shared(i), len(parts[i][0]) + len(parts[i][1])))
+    batches = []
+    for _, group in groupby(order, key=shared):
+        group = list(group)
+        batches += [group[s:s + batch_size] for s in range(0, len(group), batch_size)]
+
+    answers: list[str] = [""] * len(parts)
+    padding_side = tok.padding_side
+    tok.padding_side = "left"
+    pad_id = tok.pad_token_id if tok.pad_token_id is not None else tok.eos_token_id
+    try:
+        for idx in batches:
+            texts = ["".join(parts[i]) for i in idx]
+            inp = None
+            if prefix_cache is not None and parts[idx[0]][0]:
+                inp = _prefixed_inputs(tok, parts[idx[0]][0], texts, prefix_cache, pad_id)
+            if inp is None:
+                inp = tok(texts, return_tensors="pt", padding=True)
+            if device != "cpu":
+                inp = {k: v if k == "past_key_values" else v.to(device) for k, v in inp.items()}
+            with torch.no_grad():
+                out = model.generate(
+                    **inp,
+                    max_new_tokens=max_new_tokens,
+                    do_sample=False,
+                    repetition_penalty=1.1,
+                    pad_token_id=pad_id,
+                )
+            width = inp["input_ids"].shape[1]
+            for i, row in zip(idx, out):
+                answers[i] = tok.decode(row[width:], skip_special_tokens=True).strip()
+    finally:
+        tok.padding_side = padding_side
+    return answers
+
+
+def ask_batch(model, tok, device: str, questions: list[str], context: str = "",
+              max_new_tokens: int = 150, batch_size: int = 8,
+              prefix_cache: PrefixCache = None) -> list[str]:
+    return generate_batch(model, tok, device, [build_prompt_parts(q, context) for q in questions],
+                          max_new_tokens, batch_size, prefix_cache)
+
+
+def load_questions(path: str, context: str = "") -> tuple[list[dict], list[tuple[str, str]]]:
+    """Records and prompts from a questions JSONL file (see module docstring)"""
+    records, prompts = [], []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            if "question" in rec:
+                prompt = build_prompt_parts(rec["question"], rec.get("context", context))
+            elif "prompt" in rec:
+                prompt = split_prompt(rec["prompt"])
+            elif "text" in rec and "<|assistant|>\n" in rec["text"]:
+                prompt, reference = rec["text"].split("<|assistant|>\n", 1)
+                prompt = split_prompt(prompt + "<|assistant|>\n")
+                rec = {**rec, "reference": reference.removesuffix("</s>").strip()}
+            else:
+                raise ValueError(f"{path}:{n}: expected a question, prompt or text field")
+            records.append(rec)
+            prompts.append(prompt)
+    return records, prompts
+
+
 DEFAULT_QUESTIONS = [
     "How many records are in this dataset and what do they represent?",
     "What patterns or trends do you notice in the data?",
@@ -111,6 +406,17 @@ def main():
     parser.add_argument("--region", default="us-west-2", help="AWS region for DynamoDB")
     parser.add_argument("--max-rows", type=int, default=10, help="Max rows to fetch per table for context")
     parser.add_argument("--max-tokens", type=int, default=150, help="Max tokens to generate")
+    parser.add_argument("--questions-file", default=None, help="JSONL of questions to answer in batches")
+    parser.add_argument("--output", default=None, help="Write answers as JSONL here (with --questions-file)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Questions per generate() call")
+    parser.add_argument("--no-prefix-cache", action="store_true",
+                        help="Re-encode the system prompt and context for every question")
+    parser.add_argument("--prefix-cache-size", type=int, default=4, help="Prefixes kept in the KV cache")
+    parser.add_argument("--merged", action="store_true",
+                        help="Use adapter-merged weights, cached as safetensors after the first start")
+    parser.add_argument("--merged-cache", default=None, help="Merged-weight cache directory (default: <model>/.merged)")
+    parser.add_argument("--quantize", choices=["none", "int8", "int4"], default="none",
+                        help="CPU weight quantization after merging the adapter")
     args = parser.parse_args()
 
     if not Path(args.model).exists():
@@ -125,13 +431,38 @@ def main():
         if context:
             print(f"Context loaded ({len(context)} chars)\n")
 
-    model, tok, device = load_model(args.model)
+    model, tok, device = load_model(args.model, args.merged, args.merged_cache, args.quantize)
+    prefix_cache = None if args.no_prefix_cache else PrefixCache(model, device, args.prefix_cache_size)
+
+    if args.questions_file:
+        records, prompts = load_questions(args.questions_file, context)
+        print(f"\nAnswering {len(prompts)} questions from {args.questions_file} "
+              f"(batch size {args.batch_size})...")
+        start = time.perf_counter()
+        answers = generate_batch(model, tok, device, prompts, args.max_tokens, args.batch_size,
+                                 prefix_cache)
+        elapsed = time.perf_counter() - start
+        print(f"Done in {elapsed:.1f}s ({len(prompts) / max(elapsed, 1e-9):.2f} questions/s)")
+        if args.output:
+            Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+            with open(args.output, "w", encoding="utf-8") as f:
+                for rec, answer in zip(records, answers):
+                    f.write(json.dumps({**rec, "answer": answer}, ensure_ascii=False) + "\n")
+            print(f"Answers written to {args.output}")
+        else:
+            for prompt, answer in zip(prompts, answers):
+                print(f"\nQ: {prompt[1].split('</s>')[0].strip()}")
+                print(f"A: {answer}")
+        return
+
     questions = [args.prompt] if args.prompt else DEFAULT_QUESTIONS
+    answers = ask_batch(model, tok, device, questions, context, args.max_tokens, args.batch_size,
+                        prefix_cache)
 
     print("=" * 60)
-    for q in questions:
+    for q, a in zip(questions, answers):
         print(f"\nQ: {q}")
-        print(f"A: {ask(model, tok, device, q, context, args.max_tokens)}")
+        print(f"A: {a}")
         print("-" * 40)
 
 
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Exact and near-duplicate filtering of instruction pairs for prepare_data.py
+
+Templated generators produce many identical or almost identical pairs (the
+same question about every 2023 Ford F-150 on the lot, generic records that
+differ only in an ID). Training on them costs CPU time without teaching the
+model anything new. PairDeduplicator drops a pair when
+
+  - exact: its normalized text (lower-cased, whitespace collapsed) was seen
+    before, or
+  - near:  it shares a MinHash LSH band with an earlier kept pair, i.e. its word
+    3-gram Jaccard similarity to one is likely above ~(1/bands)^(1/rows)
+    (0.77 with the default 64 permutations in 8 bands of 8 rows).
+
+Memory is fixed up front: "seen" sets are Bloom filters sized for `capacity`
+pairs. The default of 1M pairs takes about 3.5 MB (exact) plus 18 MB (near,
+8 bands); raise it with --dedup-capacity for bigger runs (10M pairs: about
+217 MB). The price is a small false-positive rate — a unique pair is dropped
+with probability about `fp_rate` (exact) or bands x `near_fp_rate` (near).
+Going past `capacity` raises that rate; the stats report when it happened.
+
+numpy is used for batched MinHash signatures and Bloom lookups when it is
+installed; the pure-Python fallback computes the same keys, only slower.
+"""
+
+import hashlib
+import math
+import re
+import zlib
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+MASK32 = (1 << 32) - 1
+MASK64 = (1 << 64) - 1
+MERSENNE_PRIME = (1 << 61) - 1
+
+NUM_PERM = 64
+DEFAULT_BANDS = 8
+SHINGLE_WORDS = 3
+DEFAULT_CAPACITY = 1_000_000
+DEFAULT_FP_RATE = 1e-6
+DEFAULT_NEAR_FP_RATE = 1e-4
+
+# Pairs hashed per numpy batch
+BATCH_SIZE = 4096
+
+_WS = re.compile(r'\s+')
+
+
+def normalize(text: str) -> str:
+    return _WS.sub(' ', text.lower()).strip()
+
+
+def text_key(text: str) -> int:
+    """64-bit key of a normalized text"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def shingles(text: str) -> List[int]:
+    """crc32 hashes of the distinct word 3-grams of a normalized text"""
+    words = text.split(' ')
+    if len(words) <= SHINGLE_WORDS:
+        grams = {text}
+    else:
+        grams = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return [zlib.crc32(g.encode('utf-8')) for g in grams]
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 64-bit keys
+
+    `contains(keys)` reports, for each key, whether it was (probably) added
+    before; `add(keys)` adds them. `check_and_add(keys)` does both, counting
+    a repeat earlier in the same call as seen.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float):
+        self.capacity = capacity
+        self.num_bits = max(64, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8) if HAS_NUMPY \
+            else bytearray((self.num_bits + 7) // 8)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+    def _positions(self, key: int) -> Iterator[Tuple[int, int]]:
+        h1, h2 = key & MASK32, (key >> 32) | 1
+        for i in range(self.num_hashes):
+            pos = (h1 + i * h2) % self.num_bits
+            yield pos >> 3, 1 << (pos & 7)
+
+    def _positions_numpy(self, keys: List[int]):
+        arr = np.array(keys, dtype=np.uint64)
+        h1 = arr & np.uint64(MASK32)
+        h2 = (arr >> np.uint64(32)) | np.uint64(1)
+        i = np.arange(self.num_hashes, dtype=np.uint64)
+        pos = (h1[:, None] + i[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+        byte = (pos >> np.uint64(3)).astype(np.int64)
+        bit = np.left_shift(np.uint8(1), (pos & np.uint64(7)).astype(np.uint8))
+        return byte, bit
+
+    def contains(self, keys: List[int]) -> List[bool]:
+        if not keys:
+            return []
+        if HAS_NUMPY:
+            byte, bit = self._positions_numpy(keys)
+            return ((self.bits[byte] & bit) != 0).all(axis=1).tolist()
+        bits = self.bits
+        return [all(bits[byte] & bit for byte, bit in self._positions(key)) for key in keys]
+
+    def add(self, keys: List[int]):
+        self.count += len(keys)
+        if not keys:
+            return
+        if HAS_NUMPY:
+            byte, bit = self._positions_numpy(keys)
+            np.bitwise_or.at(self.bits, byte.ravel(), bit.ravel())
+            return
+        bits = self.bits
+        for key in keys:
+            for byte, bit in self._positions(key):
+                bits[byte] |= bit
+
+    def check_and_add(self, keys: List[int]) -> List[bool]:
+        seen = self.contains(keys)
+        batch = set()
+        for i, key in enumerate(keys):
+            if key in batch:
+                seen[i] = True
+            batch.add(key)
+        self.add(keys)
+        return seen
+
+
+class MinHasher:
+    """MinHash signatures of word 3-gram sets, cut into LSH band keys"""
+
+    def __init__(self, num_perm: int = NUM_PERM, bands: int = DEFAULT_BANDS, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        state = seed
+        self.a, self.b = [], []
+        for _ in range(num_perm):  # small LCG so the permutations don't depend on numpy
+            state = (state * 6364136223846793005 + 1442695040888963407) & MASK64
+            self.a.append((state >> 3) % (MERSENNE_PRIME - 1) + 1)
+            state = (state * 6364136223846793005 + 1442695040888963407) & MASK64
+            self.b.append((state >> 3) % MERSENNE_PRIME)
+
+    @property
+    def threshold(self) -> float:
+        """Jaccard similarity at which a pair becomes a candidate with probability ~0.5"""
+        return (1 / self.bands) ** (1 / self.rows)
+
+    def band_keys(self, texts: List[str]) -> List[List[int]]:
+        """One 64-bit key per band for every (normalized) text"""
+        hashed = [shingles(t) for t in texts]
+        if HAS_NUMPY:
+            return self._band_keys_numpy(hashed)
+        keys = []
+        for hs in hashed:
+            sig = [min((((a * h + b) & MASK64) % MERSENNE_PRIME) & MASK32 for h in hs)
+                   for a, b in zip(self.a, self.b)]
+            keys.append([self._fold(band, sig[band * self.rows:(band + 1) * self.rows])
+                         for band in range(self.bands)])
+        return keys
+
+    def _band_keys_numpy(self, hashed: List[List[int]]) -> List[List[int]]:
+        lengths = np.array([len(hs) for hs in hashed])
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        h = np.fromiter((x for hs in hashed for x in hs), dtype=np.uint64, count=int(lengths.sum()))
+        a = np.array(self.a, dtype=np.uint64)
+        b = np.array(self.b, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            perm = ((h[:, None] * a[None, :] + b[None, :]) % np.uint64(MERSENNE_PRIME)) \
+                & np.uint64(MASK32)
+            sig = np.minimum.reduceat(perm, offsets, axis=0)
+            bands = sig.reshape(len(hashed), self.bands, self.rows)
+            key = np.broadcast_to(np.arange(self.bands, dtype=np.uint64), bands.shape[:2]).copy()
+            for r in range(self.rows):
+                key = (key ^ bands[:, :, r]) * np.uint64(0x100000001B3)
+        return key.tolist()
+
+    def _fold(self, band: int, rows: List[int]) -> int:
+        """FNV-style fold of one band's rows (same arithmetic as the numpy path)"""
+        key = band
+        for value in rows:
+            key = ((key ^ value) * 0x100000001B3) & MASK64
+        return key
+
+
+class PairDeduplicator:
+    """Streaming exact (and optionally near-) duplicate filter"""
+
+    def __init__(self, near: bool = False, capacity: int = DEFAULT_CAPACITY,
+                 fp_rate: float = DEFAULT_FP_RATE, near_fp_rate: float = DEFAULT_NEAR_FP_RATE,
+                 bands: int = DEFAULT_BANDS):
+        self.exact = BloomFilter(capacity, fp_rate)
+        self.minhash = MinHasher(bands=bands) if near else None
+        self.near = BloomFilter(capacity * bands, near_fp_rate) if near else None
+        self.stats = Counter()
+
+    @property
+    def nbytes(self) -> int:
+        return self.exact.nbytes + (self.near.nbytes if self.near else 0)
+
+    def _dropped(self, texts: List[str]) -> List[str]:
+        """'exact', 'near' or '' for each text of a batch"""
+        texts = [normalize(t) for t in texts]
+        exact = self.exact.check_and_add([text_key(t) for t in texts])
+        near = [False] * len(texts)
+        if self.minhash is not None:
+            keys = self.minhash.band_keys(texts)
+            hits = self.near.contains([k for ks in keys for k in ks])
+            bands = self.minhash.bands
+            # only kept pairs go into the filter: a pair near a dropped one but
+            # not near any kept one is kept, so clusters don't chain
+            kept_keys = set()
+            for i, ks in enumerate(keys):
+                if exact[i]:
+                    continue
+                near[i] = any(hits[i * bands:(i + 1) * bands]) or any(k in kept_keys for k in ks)
+                if not near[i]:
+                    kept_keys.update(ks)
+            self.near.add(list(kept_keys))
+        return ['exact' if e else 'near' if n else '' for e, n in zip(exact, near)]
+
+    def filter(self, items: Iterable[Tuple[str, Dict]], text_of: Callable[[Dict], str],
+               batch_size: int = BATCH_SIZE) -> Iterator[Tuple[str, Dict]]:
+        """Yield the (key, pair) items whose text is not a duplicate, in input order"""
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield from self._filter_batch(batch, text_of)
+                batch = []
+        if batch:
+            yield from self._filter_batch(batch, text_of)
+
+    def _filter_batch(self, batch: List[Tuple[str, Dict]], text_of: Callable[[Dict], str]):
+        for item, reason in zip(batch, self._dropped([text_of(pair) for _, pair in batch])):
+            self.stats['seen'] += 1
+            if reason:
+                self.stats[reason] += 1
+            else:
+                self.stats['kept'] += 1
+                yield item
+
+    def report(self) -> str:
+        s = self.stats
+        lines = [f"\nDeduplication ({self.nbytes / 2**20:.1f} MB of filters):",
+                 f"  Pairs in        : {s['seen']}",
+                 f"  Exact duplicates: {s['exact']} removed"]
+        if self.minhash is not None:
+            lines.append(f"  Near duplicates : {s['near']} removed "
+                         f"(Jaccard >~ {self.minhash.threshold:.2f})")
+        lines.append(f"  Kept            : {s['kept']}")
+        if s['seen'] > self.exact.capacity:
+            lines.append(f"  [warn] {s['seen']} pairs exceed --dedup-capacity "
+                         f"{self.exact.capacity}; false positives are above the target rate")
+        return "\n".join(lines)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Pair manifest for incremental prepare_data.py refreshes
+
+A small SQLite database stored next to train.jsonl / eval.jsonl that records,
+for every source record, the hash of its content and the IDs of the
+instruction pairs it produced. A pair ID is the hash of the
+exact JSONL line written, so the dataset files can be patched by content: drop
+the lines of changed/deleted records, append the lines of new/changed ones.
+
+Tables:
+    records (record_key, table_name, record_hash)
+    pairs   (record_key, pair_id, n)          -- n: copies of that line
+    meta    (key, value)                      -- train ratio, key schemas, watermarks
+
+A record's split is not stored: it is a pure function of its key and the
+train ratio (see prepare_data.split_fraction).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MANIFEST_NAME = ".pair_manifest.sqlite"
+
+
+def line_id(line: str) -> str:
+    """Content address of one JSONL line"""
+    return hashlib.blake2b(line.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def record_hash(item: Dict) -> str:
+    """Content hash of a source record (key order independent)"""
+    blob = json.dumps(item, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.blake2b(blob.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def discard(output_dir: str):
+    """Delete the manifest of a dataset that is being rebuilt without one"""
+    path = Path(output_dir) / MANIFEST_NAME
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(f"{path}{suffix}"):
+            os.remove(f"{path}{suffix}")
+
+
+class PairManifest:
+    def __init__(self, output_dir: str):
+        self.path = Path(output_dir) / MANIFEST_NAME
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS records (
+                record_key  TEXT PRIMARY KEY,
+                table_name  TEXT NOT NULL,
+                record_hash TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS records_by_table ON records (table_name);
+            CREATE TABLE IF NOT EXISTS pairs (
+                record_key TEXT NOT NULL,
+                pair_id    TEXT NOT NULL,
+                n          INTEGER NOT NULL,
+                PRIMARY KEY (record_key, pair_id)
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    def close(self):
+        self.db.close()
+
+    def commit(self):
+        self.db.commit()
+
+    # ── whole-dataset operations ─────────────────────────────────────────────
+
+    def reset(self):
+        """Forget everything (before a full rebuild)"""
+        self.db.executescript("DELETE FROM records; DELETE FROM pairs; DELETE FROM meta;")
+
+    @property
+    def has_baseline(self) -> bool:
+        return self.get_meta('baseline') == '1'
+
+    def mark_baseline(self):
+        self.set_meta('baseline', '1')
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def get_json(self, key: str, default=None):
+        value = self.get_meta(key)
+        return json.loads(value) if value is not None else default
+
+    def set_json(self, key: str, value):
+        self.set_meta(key, json.dumps(value))
+
+    # ── per-record operations ────────────────────────────────────────────────
+
+    def lookup(self, record_key: str) -> Optional[str]:
+        """Content hash of a known record, or None"""
+        row = self.db.execute(
+            "SELECT record_hash FROM records WHERE record_key = ?", (record_key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def pair_ids(self, record_key: str) -> Counter:
+        rows = self.db.execute("SELECT pair_id, n FROM pairs WHERE record_key = ?", (record_key,))
+        return Counter(dict(rows))
+
+    def put(self, record_key: str, table_name: str, rec_hash: str, lines: Iterable[str]):
+        """Record (or replace) a record and the pair lines it produced"""
+        ids = Counter(line_id(line) for line in lines)
+        self.db.execute(
+            "INSERT OR REPLACE INTO records VALUES (?, ?, ?)",
+            (record_key, table_name, rec_hash),
+        )
+        self.db.execute("DELETE FROM pairs WHERE record_key = ?", (record_key,))
+        self.db.executemany(
+            "INSERT INTO pairs VALUES (?, ?, ?)",
+            ((record_key, pid, n) for pid, n in ids.items()),
+        )
+
+    def delete(self, record_key: str):
+        self.db.execute("DELETE FROM records WHERE record_key = ?", (record_key,))
+        self.db.execute("DELETE FROM pairs WHERE record_key = ?", (record_key,))
+
+    # ── deletion detection for full-scan refreshes ───────────────────────────
+
+    def begin_seen(self):
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS seen (record_key TEXT PRIMARY KEY)")
+        self.db.execute("DELETE FROM seen")
+
+    def mark_seen(self, record_keys: List[str]):
+        self.db.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((k,) for k in record_keys))
+
+    def unseen(self, tables: List[str]) -> List[Tuple[str, str]]:
+        """(record_key, table_name) of known records of `tables` that were not
+        seen in this scan, i.e. were deleted"""
+        marks = ",".join("?" * len(tables))
+        return self.db.execute(
+            f"SELECT record_key, table_name FROM records WHERE table_name IN ({marks}) "
+            "AND record_key NOT IN (SELECT record_key FROM seen)",
+            tables,
+        ).fetchall()
@@ -11,17 +11,77 @@ Usage:
         --profile uo-innovation \
         --tables lithia-vehicles lithia-financing lithia-insurance \
         --output-dir data/processed
+
+    DynamoDB tables are read with a parallel segment scan: every table is
+    split into --segments Scan segments (default 8) and all tables are
+    scanned at once on --scan-workers threads (default 32).
+
+    The pipeline streams source -> pair generator -> split -> writer, so
+    memory stays flat for any table size:
+      - train/eval membership is a hash of each record's key (table + primary
+        key), so it is deterministic and all pairs of a record stay together;
+      - each split is shuffled externally: chunks of --shuffle-buffer lines are
+        shuffled in memory and spilled to temp files, then merged at random.
+
+    --workers N spreads pair generation (and, for DynamoDB, deserializing
+    the scanned items) over N processes (0 = one per core). Records go out in
+    chunks of --chunk-size and come back in order, so the output is the same
+    as a single-process run.
+
+    Scanned items arrive in whatever order the segment threads finish, but
+    each shuffle chunk is sorted before the seeded shuffle. A DynamoDB build
+    is therefore byte-identical between runs as long as each split fits in one
+    --shuffle-buffer. Beyond that, the lines are the same but their order can
+    differ. With --dedup near, which pair of a near-duplicate group is kept
+    also follows arrival order.
+
+    --dedup exact drops pairs whose normalized text was already emitted;
+    --dedup near also drops MinHash/LSH near-duplicates (see pair_dedup.py).
+    Both run before the split, so no pair appears in both train and eval.
+
+    --tokenizer TinyLlama/TinyLlama-1.1B-Chat-v1.0 also writes each split
+    pre-tokenized (train.tokens.bin + .idx.npy + .json, grouped into length
+    buckets; see token_dataset.py). Point train.py --data at
+    train.tokens.bin to train without re-tokenizing.
+
+Incremental refresh (DynamoDB only):
+    python scripts/prepare_data.py --source dynamodb --tables lithia-vehicles \
+        --output-dir data/processed --incremental [--since-attribute last_updated]
+        [--changes-file stream_records.jsonl]
+
+    A full DynamoDB build also writes data/processed/.pair_manifest.sqlite:
+    record key -> content hash -> IDs of the pair lines it produced. With
+    --incremental only new, changed and deleted records are turned into pairs
+    and train.jsonl / eval.jsonl are patched in place (stale lines dropped, new
+    lines appended). Changes are found by, in order of cost:
+      --changes-file       DynamoDB Streams records (one per line, or the
+                           {"Records": [...]} output of get-records) — no scan;
+      --since-attribute    only items whose attribute is >= the last run's
+                           maximum (deletes are not seen this way);
+      (default)            a full scan, diffed against the manifest hashes.
+    Without a usable manifest (or with a different --train-ratio) a full build
+    runs instead.
 """
 
 import os
 import json
 import argparse
+import hashlib
+import itertools
+import multiprocessing
+import queue
 import random
+import tempfile
+import threading
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 try:
     import boto3
+    from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+    from botocore.config import Config
     HAS_BOTO3 = True
 except ImportError:
     HAS_BOTO3 = False
@@ -32,6 +92,9 @@ try:
 except ImportError:
     HAS_TQDM = False
 
+from pair_dedup import DEFAULT_BANDS, DEFAULT_CAPACITY, PairDeduplicator
+from pair_manifest import PairManifest, discard as discard_manifest, line_id, record_hash
+
 def _progress(iterable, **kwargs):
     if HAS_TQDM:
         return tqdm(iterable, **kwargs)
@@ -41,6 +104,17 @@ def _progress(iterable, **kwargs):
 # TinyLlama chat template
 SYSTEM_PROMPT = "You are a knowledgeable Lithia Motors automotive assistant. Help customers and staff with vehicle inventory, financing, insurance, and service information."
 
+# Parallel scan: segments per table, scan threads, and items buffered between them
+DEFAULT_SEGMENTS = 8
+DEFAULT_SCAN_WORKERS = 32
+SCAN_QUEUE_SIZE = 10_000
+
+# Records per task when pair generation is spread over worker processes
+DEFAULT_CHUNK_SIZE = 1_000
+
+# Lines per split held in memory before a shuffled chunk is spilled to disk
+DEFAULT_SHUFFLE_BUFFER = 200_000
+
 INST_TEMPLATE = f"<|system|>\n{SYSTEM_PROMPT}</s>\n<|user|>\n{{instruction}}</s>\n<|assistant|>\n{{output}}</s>"
 
 
@@ -48,6 +122,11 @@ def fmt(instruction: str, output: str) -> Dict[str, str]:
     return {"text": INST_TEMPLATE.format(instruction=instruction.strip(), output=output.strip())}
 
 
+def dedup_text(pair: Dict[str, str]) -> str:
+    """The part of a pair that differs between examples (everything after the system prompt)"""
+    return pair["text"].split("<|user|>\n", 1)[-1]
+
+
 # ── Per-table Q&A generators ──────────────────────────────────────────────────
 
 def pairs_from_vehicles(items: List[Dict]) -> List[Dict]:
@@ -213,78 +292,315 @@ TABLE_GENERATORS = {
 }
 
 
-def scan_table(dynamo, table_name: str) -> List[Dict]:
-    tbl = dynamo.Table(table_name)
-    resp = tbl.scan()
-    items = resp.get('Items', [])
-    while 'LastEvaluatedKey' in resp:
-        resp = tbl.scan(ExclusiveStartKey=resp['LastEvaluatedKey'])
-        items.extend(resp.get('Items', []))
-    return items
+def generator_for(table_name: str) -> Callable[[Iterable[Dict]], List[Dict]]:
+    """Pick the pair generator for a table by its name without the 'lithia-' prefix"""
+    suffix = table_name.replace('lithia-', '')
+    generator = TABLE_GENERATORS.get(suffix)
+    if generator is None or generator is pairs_from_generic:
+        return lambda items: pairs_from_generic(table_name, items)
+    return generator
+
+
+# ── Parallel DynamoDB scan ────────────────────────────────────────────────────
+#
+# Every table is split into `segments` parallel Scan segments (Segment /
+# TotalSegments) and all segments of all tables run on one thread pool. Items
+# flow back through a bounded queue as (table_name, item) pairs, so memory is
+# bounded by the queue size rather than the table size.
 
+_DONE = object()
 
-def load_from_dynamodb(profile: str, region: str, tables: List[str]) -> List[Dict]:
+
+def make_dynamodb_client(profile: Optional[str], region: str, endpoint_url: Optional[str] = None,
+                         max_connections: int = DEFAULT_SCAN_WORKERS):
+    """Low-level DynamoDB client; unlike boto3 resources it is safe to share across threads"""
     if not HAS_BOTO3:
         raise ImportError("boto3 is required — run: pip install boto3")
-
-    print(f"Connecting to DynamoDB (profile={profile}, region={region})...")
     session = boto3.Session(profile_name=profile, region_name=region)
-    dynamo = session.resource('dynamodb')
+    config = Config(max_pool_connections=max_connections, retries={'mode': 'adaptive'})
+    return session.client('dynamodb', config=config, endpoint_url=endpoint_url)
+
 
-    all_data = []
+def _scan_segment(client, table_name: str, segment: int, total_segments: int,
+                  out: queue.Queue, stop: threading.Event, scan_kwargs: Optional[Dict] = None,
+                  raw: bool = False):
+    deserialize = TypeDeserializer().deserialize
+    kwargs = {'TableName': table_name, 'Segment': segment, 'TotalSegments': total_segments,
+              **(scan_kwargs or {})}
+    try:
+        while not stop.is_set():
+            resp = client.scan(**kwargs)
+            for item in resp.get('Items', []):
+                if not raw:
+                    item = {k: deserialize(v) for k, v in item.items()}
+                while not stop.is_set():
+                    try:
+                        out.put((table_name, item), timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+            if 'LastEvaluatedKey' not in resp:
+                break
+            kwargs['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+    except Exception as e:  # surfaced to the consumer, which re-raises
+        out.put((table_name, e))
+    finally:
+        out.put((table_name, _DONE))
+
+
+def stream_tables(client, tables: List[str], segments: int = DEFAULT_SEGMENTS,
+                  max_workers: int = DEFAULT_SCAN_WORKERS,
+                  queue_size: int = SCAN_QUEUE_SIZE,
+                  scan_kwargs: Optional[Dict[str, Dict]] = None,
+                  raw: bool = False) -> Iterator[Tuple[str, Dict]]:
+    """Scan several tables concurrently, yielding (table_name, item) as items arrive
+
+    `scan_kwargs` maps a table to extra Scan parameters (e.g. a FilterExpression).
+    With `raw`, items are left in DynamoDB's AttributeValue format.
+    """
+    scan_kwargs = scan_kwargs or {}
+    out = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    pending = len(tables) * segments
+    workers = max(1, min(max_workers, pending))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan') as pool:
+        try:
+            for table_name in tables:
+                for segment in range(segments):
+                    pool.submit(_scan_segment, client, table_name, segment, segments, out, stop,
+                                scan_kwargs.get(table_name), raw)
+            while pending:
+                table_name, item = out.get()
+                if item is _DONE:
+                    pending -= 1
+                elif isinstance(item, Exception):
+                    raise RuntimeError(f"Scan of {table_name} failed: {item}") from item
+                else:
+                    yield table_name, item
+        finally:
+            stop.set()
+            while pending:  # unblock workers still waiting to hand over an item
+                try:
+                    if out.get(timeout=0.5)[1] is _DONE:
+                        pending -= 1
+                except queue.Empty:
+                    pass
+
+
+def scan_table(client, table_name: str, segments: int = DEFAULT_SEGMENTS) -> Iterator[Dict]:
+    """Stream the items of one table using a parallel segment scan"""
+    for _, item in stream_tables(client, [table_name], segments):
+        yield item
+
+
+def table_keys(client, tables: List[str]) -> Dict[str, List[str]]:
+    """Key attribute names of each table that exists; missing tables are skipped"""
+    keys = {}
     for table_name in tables:
-        print(f"  Scanning {table_name}...")
         try:
-            items = scan_table(dynamo, table_name)
+            desc = client.describe_table(TableName=table_name)['Table']
+            keys[table_name] = [k['AttributeName'] for k in desc['KeySchema']]
         except Exception as e:
             print(f"  [warn] Could not scan {table_name}: {e}")
-            continue
+    return keys
 
-        print(f"    Found {len(items)} records")
 
-        # Match table name to a generator by suffix
-        suffix = table_name.replace('lithia-', '')
-        generator = TABLE_GENERATORS.get(suffix)
-        if generator:
-            pairs = generator(items) if suffix != 'member-rentals' else generator(table_name, items)
-        else:
-            pairs = pairs_from_generic(table_name, items)
+# ── Worker pool ───────────────────────────────────────────────────────────────
+#
+# Pair generation is pure Python string formatting, so it is spread over
+# processes rather than threads. Sources cut their input into chunks, each
+# chunk is one task, and results come back in submission order — the output
+# is identical to a single-process run. Only a few chunks per worker are in
+# flight at a time, so memory stays bounded for any input size.
+
+def resolve_workers(workers: int) -> int:
+    """Number of worker processes; 0 means one per CPU core"""
+    return workers if workers > 0 else (os.cpu_count() or 1)
 
-        print(f"    Generated {len(pairs)} instruction pairs")
-        all_data.extend(pairs)
 
-    print(f"\n  Total: {len(all_data)} instruction pairs from {len(tables)} table(s)")
-    return all_data
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
 
 
-def load_from_csv(file_path: str) -> List[Dict]:
+def imap_ordered(fn: Callable, tasks: Iterable, workers: int,
+                 in_flight_per_worker: int = 4) -> Iterator:
+    """Map `fn` over `tasks` on a process pool, yielding results in task order"""
+    # spawn (not fork): the DynamoDB scan threads may already be running
+    context = multiprocessing.get_context('spawn')
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        try:
+            for task in tasks:
+                if len(pending) >= workers * in_flight_per_worker:
+                    yield pending.popleft().result()
+                pending.append(pool.submit(fn, task))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+# ── Sources ───────────────────────────────────────────────────────────────────
+#
+# Every source yields (record_key, pair). The record key identifies the source
+# record a pair came from; it decides the train/eval split, so all pairs of one
+# record land on the same side.
+
+Pairs = Iterator[Tuple[str, Dict[str, str]]]
+
+
+def pair_line(pair: Dict[str, str]) -> str:
+    """The exact JSONL line written for a pair (its hash is the pair ID in the manifest)"""
+    return json.dumps(pair) + "\n"
+
+
+def record_key(table_name: str, item: Dict, key_attrs: List[str]) -> str:
+    return table_name + ":" + "|".join(str(item.get(k, '')) for k in key_attrs)
+
+
+def iter_dynamodb_records(client, keys: Dict[str, List[str]], segments: int = DEFAULT_SEGMENTS,
+                          max_workers: int = DEFAULT_SCAN_WORKERS,
+                          scan_kwargs: Optional[Dict[str, Dict]] = None
+                          ) -> Iterator[Tuple[str, str, Dict]]:
+    """Yield (table_name, record_key, item) for every item of the tables in `keys`"""
+    for table_name, item in _progress(stream_tables(client, list(keys), segments, max_workers,
+                                                    scan_kwargs=scan_kwargs),
+                                      desc="  Scanning", unit=" items"):
+        yield table_name, record_key(table_name, item, keys[table_name]), item
+
+
+def _table_chunks(stream: Iterator[Tuple[str, Dict]], keys: Dict[str, List[str]],
+                  chunk_size: int, with_hash: bool) -> Iterator[Tuple]:
+    """Group a mixed-table item stream into per-table worker tasks"""
+    buffers: Dict[str, List[Dict]] = {t: [] for t in keys}
+    for table_name, item in stream:
+        buffer = buffers[table_name]
+        buffer.append(item)
+        if len(buffer) >= chunk_size:
+            yield table_name, keys[table_name], buffer, with_hash
+            buffers[table_name] = []
+    for table_name, buffer in buffers.items():
+        if buffer:
+            yield table_name, keys[table_name], buffer, with_hash
+
+
+def _dynamodb_chunk_pairs(task: Tuple) -> Tuple[str, List[Tuple[str, Optional[str], List[Dict]]]]:
+    """Worker: deserialize a chunk of raw items of one table and build their pairs;
+    returns (table_name, [(record_key, record_hash or None, pairs) per item])"""
+    table_name, key_attrs, raw_items, with_hash = task
+    deserialize = TypeDeserializer().deserialize
+    generate = generator_for(table_name)
+    results = []
+    for raw in raw_items:
+        item = {k: deserialize(v) for k, v in raw.items()}
+        results.append((record_key(table_name, item, key_attrs),
+                        record_hash(item) if with_hash else None,
+                        generate((item,))))
+    return table_name, results
+
+
+def _dynamodb_results(client, keys: Dict[str, List[str]], segments: int, max_workers: int,
+                      with_hash: bool, workers: int, chunk_size: int
+                      ) -> Iterator[Tuple[str, str, Optional[str], List[Dict]]]:
+    """(table_name, record_key, record_hash, pairs) per scanned item, in-process or pooled"""
+    workers = resolve_workers(workers)
+    if workers == 1:
+        generators = {t: generator_for(t) for t in keys}
+        for table_name, key, item in iter_dynamodb_records(client, keys, segments, max_workers):
+            yield (table_name, key, record_hash(item) if with_hash else None,
+                   generators[table_name]((item,)))
+        return
+
+    print(f"  Generating pairs on {workers} worker processes...")
+    stream = _progress(stream_tables(client, list(keys), segments, max_workers, raw=True),
+                       desc="  Scanning", unit=" items")
+    tasks = _table_chunks(stream, keys, chunk_size, with_hash)
+    for table_name, results in imap_ordered(_dynamodb_chunk_pairs, tasks, workers):
+        for key, rec_hash, generated in results:
+            yield table_name, key, rec_hash, generated
+
+
+def iter_pairs_from_dynamodb(profile: str, region: str, tables: List[str],
+                             segments: int = DEFAULT_SEGMENTS,
+                             max_workers: int = DEFAULT_SCAN_WORKERS,
+                             endpoint_url: Optional[str] = None,
+                             manifest: Optional[PairManifest] = None,
+                             workers: int = 1,
+                             chunk_size: int = DEFAULT_CHUNK_SIZE) -> Pairs:
+    """Scan `tables` into pairs; with a manifest, also record what each item produced
+
+    With `workers` > 1, raw items are deserialized and turned into pairs by a
+    process pool, in chunks of `chunk_size` items of one table.
+    """
+    print(f"Connecting to DynamoDB (profile={profile}, region={region})...")
+    client = make_dynamodb_client(profile, region, endpoint_url, max_workers)
+
+    keys = table_keys(client, tables)
+    tables = list(keys)
+    print(f"  Scanning {len(tables)} table(s), {segments} segment(s) each...")
+    if manifest is not None:
+        manifest.set_json('keys', keys)
+
+    records = dict.fromkeys(tables, 0)
+    pairs = dict.fromkeys(tables, 0)
+    for table_name, key, rec_hash, generated in _dynamodb_results(
+            client, keys, segments, max_workers, manifest is not None, workers, chunk_size):
+        records[table_name] += 1
+        if manifest is not None:
+            manifest.put(key, table_name, rec_hash, map(pair_line, generated))
+        for pair in generated:
+            pairs[table_name] += 1
+            yield key, pair
+
+    for table_name in tables:
+        print(f"    {table_name}: {records[table_name]} records -> "
+              f"{pairs[table_name]} instruction pairs")
+
+
+def iter_pairs_from_csv(file_path: str) -> Pairs:
     import csv
     print(f"Loading from CSV: {file_path}")
-    data = []
     with open(file_path, newline='', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         for row in reader:
-            instruction = row.get("instruction", "").strip()
-            output = row.get("output", "").strip()
+            instruction = (row.get("instruction") or "").strip()
+            output = (row.get("output") or "").strip()
             if instruction and output:
-                data.append(fmt(instruction, output))
-    print(f"  Loaded {len(data)} examples from CSV")
-    return data
+                yield instruction, fmt(instruction, output)
 
 
-def load_from_jsonl(file_path: str) -> List[Dict]:
+def _jsonl_pairs(lines: List[str]) -> List[Tuple[str, Dict[str, str]]]:
+    """Pairs from a chunk of JSONL lines (also the worker task for --workers)"""
+    pairs = []
+    for line in lines:
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if item.get("instruction") and item.get("output"):
+            pairs.append((item["instruction"], fmt(item["instruction"], item["output"])))
+    return pairs
+
+
+def iter_pairs_from_jsonl(file_path: str, workers: int = 1,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE) -> Pairs:
     print(f"Loading from JSONL: {file_path}")
-    data = []
+    workers = resolve_workers(workers)
     with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            item = json.loads(line)
-            if item.get("instruction") and item.get("output"):
-                data.append(fmt(item["instruction"], item["output"]))
-    print(f"  Loaded {len(data)} examples from JSONL")
-    return data
+        if workers == 1:
+            for line in f:
+                yield from _jsonl_pairs((line,))
+            return
+        for pairs in imap_ordered(_jsonl_pairs, chunked(f, chunk_size), workers):
+            yield from pairs
 
 
-def create_example_data() -> List[Dict]:
+def iter_example_pairs() -> Pairs:
     examples = [
         ("What year is the Ford F-150 in inventory?", "The Ford F-150 in inventory is a 2023 model."),
         ("What is the MSRP of the Toyota Camry?", "The 2024 Toyota Camry has an MSRP of $28,400."),
@@ -292,31 +608,367 @@ def create_example_data() -> List[Dict]:
         ("What coverage does the premium insurance plan offer?", "The premium plan offers comprehensive and collision coverage with a $500 deductible."),
         ("How many reward points does a Gold member earn per purchase?", "Gold tier members earn 2x reward points on every vehicle purchase and service visit."),
     ]
-    return [fmt(q, a) for q, a in examples]
+    for q, a in examples:
+        yield q, fmt(q, a)
+
+
+# ── Split + external shuffle ──────────────────────────────────────────────────
+
+def split_fraction(key: str) -> float:
+    """Deterministic position of a record key in [0, 1); < train_ratio means train"""
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / 2**64
+
+
+class ExternalShuffle:
+    """Shuffle any number of text lines with bounded memory
+
+    Lines are collected in a buffer of `buffer_size`; each full buffer is
+    shuffled and spilled to a temp file. Reading back interleaves the chunks,
+    picking the next line from a chunk with probability proportional to the
+    lines it has left — which gives a uniformly random permutation of all lines.
+    A buffer is sorted before it is shuffled, so the result depends on which
+    lines each chunk holds but not on the order they arrived in.
+    """
+
+    def __init__(self, buffer_size: int, rng: random.Random, tmp_dir: Optional[str] = None):
+        self.buffer_size = buffer_size
+        self.rng = rng
+        self.tmp_dir = tmp_dir
+        self.count = 0
+        self._buffer: List[str] = []
+        self._chunks: List[Tuple[str, int]] = []
+
+    def add(self, line: str):
+        self._buffer.append(line)
+        self.count += 1
+        if len(self._buffer) >= self.buffer_size:
+            self._spill()
+
+    def _shuffle_buffer(self):
+        self._buffer.sort()
+        self.rng.shuffle(self._buffer)
+
+    def _spill(self):
+        self._shuffle_buffer()
+        fd, path = tempfile.mkstemp(prefix='shuffle-', suffix='.jsonl', dir=self.tmp_dir)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.writelines(self._buffer)
+        self._chunks.append((path, len(self._buffer)))
+        self._buffer = []
 
+    @property
+    def spilled_chunks(self) -> int:
+        return len(self._chunks)
 
-def save_dataset(data: List[Dict], output_dir: str, train_ratio: float = 0.9):
+    def __iter__(self) -> Iterator[str]:
+        if not self._chunks:
+            self._shuffle_buffer()
+            yield from self._buffer
+            return
+        if self._buffer:
+            self._spill()
+        files = [open(path, encoding='utf-8') for path, _ in self._chunks]
+        remaining = [n for _, n in self._chunks]
+        total = sum(remaining)
+        try:
+            while total:
+                pick = self.rng.randrange(total)
+                i = 0
+                while pick >= remaining[i]:
+                    pick -= remaining[i]
+                    i += 1
+                yield files[i].readline()
+                remaining[i] -= 1
+                total -= 1
+        finally:
+            for f in files:
+                f.close()
+            self.close()
+
+    def close(self):
+        for path, _ in self._chunks:
+            if os.path.exists(path):
+                os.remove(path)
+        self._chunks = []
+
+
+def _write_lines(lines: Iterable[str], path: Path):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+
+
+def save_dataset(pairs: Pairs, output_dir: str, train_ratio: float = 0.9,
+                 shuffle_buffer: int = DEFAULT_SHUFFLE_BUFFER, seed: int = 42,
+                 tmp_dir: Optional[str] = None) -> Tuple[int, int]:
+    """Split (record_key, pair) items by key hash, shuffle each split externally and write
+    train.jsonl / eval.jsonl; returns (train count, eval count)"""
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
-    random.shuffle(data)
-    split_idx = int(len(data) * train_ratio)
-    train_data = data[:split_idx]
-    eval_data  = data[split_idx:]
+    rng = random.Random(seed)
+    train = ExternalShuffle(shuffle_buffer, rng, tmp_dir)
+    evals = ExternalShuffle(shuffle_buffer, rng, tmp_dir)
+    try:
+        for key, pair in pairs:
+            line = pair_line(pair)
+            (train if split_fraction(key) < train_ratio else evals).add(line)
 
-    train_path = output_path / "train.jsonl"
-    with open(train_path, 'w', encoding='utf-8') as f:
-        for item in train_data:
-            f.write(json.dumps(item) + "\n")
-
-    eval_path = output_path / "eval.jsonl"
-    with open(eval_path, 'w', encoding='utf-8') as f:
-        for item in eval_data:
-            f.write(json.dumps(item) + "\n")
+        train_path = output_path / "train.jsonl"
+        eval_path = output_path / "eval.jsonl"
+        spilled = train.spilled_chunks + evals.spilled_chunks
+        _write_lines(train, train_path)
+        if evals.count:
+            _write_lines(evals, eval_path)
+        elif eval_path.exists():
+            eval_path.unlink()  # don't leave a stale eval set from an earlier run
+    finally:
+        train.close()
+        evals.close()
 
     print(f"\nDataset saved:")
-    print(f"  Training  : {len(train_data)} examples -> {train_path}")
-    print(f"  Evaluation: {len(eval_data)} examples  -> {eval_path}")
+    print(f"  Training  : {train.count} examples -> {train_path}")
+    print(f"  Evaluation: {evals.count} examples  -> {eval_path if evals.count else '(none)'}")
+    if spilled:
+        print(f"  Shuffled through {spilled} spill chunk(s) of up to {shuffle_buffer:,} lines")
+    return train.count, evals.count
+
+
+# ── Incremental refresh ───────────────────────────────────────────────────────
+#
+# Change sources yield (record_key, table_name, item) with item=None for a
+# deleted record. apply_changes() compares each item's hash with the manifest,
+# regenerates pairs for new/changed records only and collects, per split, the
+# pair IDs to drop and the lines to add; patch_split() then rewrites the file.
+
+Change = Tuple[str, str, Optional[Dict]]
+
+
+def _max_value(current, value):
+    """Larger of two watermark values, ignoring values of a different type"""
+    if current is None:
+        return value
+    try:
+        return value if value > current else current
+    except TypeError:
+        return current
+
+
+def scan_changes(client, manifest: PairManifest, keys: Dict[str, List[str]],
+                 segments: int = DEFAULT_SEGMENTS, max_workers: int = DEFAULT_SCAN_WORKERS,
+                 since_attribute: Optional[str] = None) -> Iterator[Change]:
+    """Changes found by scanning: every item (filtered server-side by
+    `since_attribute` if given), then the deletions a full scan reveals"""
+    serialize = TypeSerializer().serialize
+    deserialize = TypeDeserializer().deserialize
+    scan_kwargs = {}
+    watermarks = {}
+    if since_attribute:
+        for table_name in keys:
+            saved = manifest.get_json(f'watermark:{table_name}:{since_attribute}')
+            if saved is None:
+                print(f"  {table_name}: no {since_attribute} watermark yet — scanning in full")
+                continue
+            watermarks[table_name] = deserialize(saved)
+            # >= rather than >: items written in the same tick as the last
+            # maximum are re-read, and then skipped because their hash matches
+            scan_kwargs[table_name] = {
+                'FilterExpression': '#since >= :since',
+                'ExpressionAttributeNames': {'#since': since_attribute},
+                'ExpressionAttributeValues': {':since': saved},
+            }
+            print(f"  {table_name}: {since_attribute} >= {watermarks[table_name]}")
+    else:
+        manifest.begin_seen()
+
+    seen = []
+    for table_name, key, item in iter_dynamodb_records(client, keys, segments, max_workers,
+                                                       scan_kwargs):
+        if since_attribute:
+            if since_attribute in item:
+                watermarks[table_name] = _max_value(watermarks.get(table_name),
+                                                    item[since_attribute])
+        else:
+            seen.append(key)
+            if len(seen) >= 1000:
+                manifest.mark_seen(seen)
+                seen = []
+        yield key, table_name, item
+
+    if since_attribute:
+        for table_name, value in watermarks.items():
+            manifest.set_json(f'watermark:{table_name}:{since_attribute}', serialize(value))
+        return
+    manifest.mark_seen(seen)
+    for key, table_name in manifest.unseen(list(keys)):
+        yield key, table_name, None
+
+
+def _stream_record_table(record: Dict) -> str:
+    if record.get('tableName'):
+        return record['tableName']
+    # arn:aws:dynamodb:<region>:<account>:table/<name>/stream/<label>
+    return record['eventSourceARN'].split(':table/', 1)[1].split('/', 1)[0]
+
+
+def file_changes(path: str, keys: Dict[str, List[str]]) -> Iterator[Change]:
+    """Changes from a file of DynamoDB Streams records (NEW_IMAGE or
+    NEW_AND_OLD_IMAGES view), oldest first; only a key's last event counts"""
+    deserialize = TypeDeserializer().deserialize
+    latest: Dict[str, Tuple[str, Optional[Dict]]] = {}
+    skipped = Counter()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            doc = json.loads(line)
+            for record in doc.get('Records', [doc]):
+                table_name = _stream_record_table(record)
+                if table_name not in keys:
+                    skipped[table_name] += 1
+                    continue
+                image = record['dynamodb']
+                item_keys = {k: deserialize(v) for k, v in image['Keys'].items()}
+                key = record_key(table_name, item_keys, keys[table_name])
+                if record['eventName'] == 'REMOVE':
+                    latest[key] = (table_name, None)
+                elif 'NewImage' in image:
+                    latest[key] = (table_name, {k: deserialize(v)
+                                                for k, v in image['NewImage'].items()})
+                else:
+                    raise ValueError(f"{path}: {record['eventName']} record without NewImage — "
+                                     "the stream needs the NEW_IMAGE or NEW_AND_OLD_IMAGES view")
+    for table_name, n in skipped.items():
+        print(f"  [warn] Skipped {n} record(s) of {table_name} (not in the manifest)")
+    for key, (table_name, item) in latest.items():
+        yield key, table_name, item
+
+
+def patch_split(path: Path, removals: Counter, additions: List[str]) -> int:
+    """Drop the lines in `removals` (by pair ID, counting duplicates) and append
+    `additions`; returns how many removals were not found in the file"""
+    if not sum(removals.values()):
+        if additions:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.writelines(additions)
+        return 0
+    removals = removals.copy()
+    tmp = path.with_name(path.name + '.tmp')
+    with open(path, encoding='utf-8') as src, open(tmp, 'w', encoding='utf-8') as dst:
+        for line in src:
+            pair_id = line_id(line)
+            if removals[pair_id] > 0:
+                removals[pair_id] -= 1
+                continue
+            dst.write(line)
+        dst.writelines(additions)
+    os.replace(tmp, path)
+    return sum(removals.values())
+
+
+def apply_changes(changes: Iterable[Change], manifest: PairManifest, output_dir: str,
+                  train_ratio: float, seed: int = 42) -> Counter:
+    """Regenerate pairs for changed records and patch train.jsonl / eval.jsonl"""
+    output_path = Path(output_dir)
+    removals = {'train': Counter(), 'eval': Counter()}
+    additions: Dict[str, List[str]] = {'train': [], 'eval': []}
+    generators = {}
+    stats = Counter()
+    for key, table_name, item in changes:
+        new_hash = record_hash(item) if item is not None else None
+        old_hash = manifest.lookup(key)
+        if new_hash == old_hash:
+            stats['unchanged'] += 1
+            continue
+        split = 'train' if split_fraction(key) < train_ratio else 'eval'
+        if old_hash is not None:
+            removals[split].update(manifest.pair_ids(key))
+        if item is None:
+            manifest.delete(key)
+            stats['deleted'] += 1
+            continue
+        if table_name not in generators:
+            generators[table_name] = generator_for(table_name)
+        lines = [pair_line(pair) for pair in generators[table_name]((item,))]
+        additions[split].extend(lines)
+        manifest.put(key, table_name, new_hash, lines)
+        stats['modified' if old_hash is not None else 'inserted'] += 1
+
+    rng = random.Random(seed)
+    for split, path in (('train', output_path / "train.jsonl"),
+                        ('eval', output_path / "eval.jsonl")):
+        additions[split].sort()  # scan order varies between runs
+        rng.shuffle(additions[split])
+        missing = patch_split(path, removals[split], additions[split])
+        if missing:
+            print(f"  [warn] {missing} stale line(s) not found in {path} — "
+                  "it was edited outside prepare_data.py; consider a full rebuild")
+        if path.exists() and not path.stat().st_size:
+            path.unlink()
+        stats[f'{split}_added'] = len(additions[split])
+        stats[f'{split}_removed'] = sum(removals[split].values()) - missing
+    manifest.commit()  # only once the files match it
+    return stats
+
+
+def refresh_dataset(args) -> bool:
+    """Incrementally update the dataset in args.output_dir; False if a full build is needed"""
+    manifest = PairManifest(args.output_dir)
+    try:
+        keys = manifest.get_json('keys', {})
+        if not manifest.has_baseline or not (Path(args.output_dir) / "train.jsonl").exists():
+            print("No pair manifest from an earlier full build — building in full.")
+            return False
+        if manifest.get_json('train_ratio') != args.train_ratio:
+            print(f"--train-ratio differs from the last full build "
+                  f"({manifest.get_json('train_ratio')}) — building in full.")
+            return False
+
+        if args.changes_file:
+            print(f"Applying change records from {args.changes_file}...")
+            changes = file_changes(args.changes_file, keys)
+        else:
+            print(f"Connecting to DynamoDB (profile={args.profile}, region={args.region})...")
+            client = make_dynamodb_client(args.profile, args.region, args.endpoint_url,
+                                          args.scan_workers)
+            scanned = table_keys(client, args.tables)
+            keys.update(scanned)
+            manifest.set_json('keys', keys)
+            changes = scan_changes(client, manifest, scanned, args.segments, args.scan_workers,
+                                   args.since_attribute)
+
+        stats = apply_changes(changes, manifest, args.output_dir, args.train_ratio, args.seed)
+    finally:
+        manifest.close()
+
+    print(f"\nIncremental refresh:")
+    print(f"  Records   : {stats['inserted']} new, {stats['modified']} changed, "
+          f"{stats['deleted']} deleted, {stats['unchanged']} unchanged")
+    print(f"  Training  : +{stats['train_added']} / -{stats['train_removed']} examples")
+    print(f"  Evaluation: +{stats['eval_added']} / -{stats['eval_removed']} examples")
+    return True
+
+
+# ── Pre-tokenized output ──────────────────────────────────────────────────────
+
+def tokenize_splits(output_dir: str, tokenizer_name: str, max_length: int,
+                    tmp_dir: Optional[str] = None):
+    """Write train/eval .tokens files next to the JSONL splits"""
+    from token_dataset import load_tokenizer, padding_report, token_paths, write_token_dataset
+
+    print(f"\nTokenizing with {tokenizer_name} (max_length={max_length})...")
+    tokenizer = load_tokenizer(tokenizer_name)
+    for split in ('train', 'eval'):
+        jsonl_path = Path(output_dir) / f"{split}.jsonl"
+        prefix = str(Path(output_dir) / f"{split}.tokens")
+        if not jsonl_path.exists():
+            for path in token_paths(prefix).values():
+                path.unlink(missing_ok=True)  # no stale eval tokens without eval.jsonl
+            continue
+        meta = write_token_dataset(str(jsonl_path), prefix, tokenizer, tokenizer_name,
+                                   max_length, tmp_dir)
+        print(f"  {split:5}: {padding_report(meta)}")
+        print(f"         -> {prefix}.bin")
 
 
 def main():
@@ -332,31 +984,109 @@ def main():
     parser.add_argument("--tables", type=str, nargs='+',
                         default=["lithia-vehicles"],
                         help="DynamoDB table names to pull data from")
+    parser.add_argument("--segments", type=int, default=DEFAULT_SEGMENTS,
+                        help="Parallel scan segments per DynamoDB table")
+    parser.add_argument("--scan-workers", type=int, default=DEFAULT_SCAN_WORKERS,
+                        help="Threads scanning segments (shared by all tables)")
+    parser.add_argument("--endpoint-url", type=str, default=None,
+                        help="DynamoDB endpoint, e.g. DynamoDB Local at http://localhost:8000")
     parser.add_argument("--output-dir", type=str, default="./data/processed")
     parser.add_argument("--train-ratio", type=float, default=0.9)
+    parser.add_argument("--shuffle-buffer", type=int, default=DEFAULT_SHUFFLE_BUFFER,
+                        help="Lines per split held in memory before spilling a shuffled chunk")
+    parser.add_argument("--seed", type=int, default=42, help="Shuffle seed")
+    parser.add_argument("--tmp-dir", type=str, default=None,
+                        help="Directory for shuffle spill files (default: system temp)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes generating pairs for --source dynamodb/jsonl (0 = all cores)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Records per worker task")
+    parser.add_argument("--dedup", choices=["none", "exact", "near"], default="none",
+                        help="Drop exact duplicate pairs, or exact and near-duplicate pairs")
+    parser.add_argument("--dedup-capacity", type=int, default=DEFAULT_CAPACITY,
+                        help="Pairs the dedup filters are sized for (memory is fixed by this; "
+                             "raise it above 1M pairs)")
+    parser.add_argument("--near-dup-bands", type=int, default=DEFAULT_BANDS,
+                        help="LSH bands of the 64-permutation MinHash; more bands = lower "
+                             "similarity threshold")
+    parser.add_argument("--tokenizer", type=str, default=None,
+                        help="Also write pre-tokenized splits with this Hugging Face tokenizer "
+                             "(e.g. TinyLlama/TinyLlama-1.1B-Chat-v1.0)")
+    parser.add_argument("--max-length", type=int, default=512,
+                        help="Truncation length for --tokenizer (match max_seq_length)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Patch the existing dataset with only new/changed/deleted records "
+                             "(--source dynamodb)")
+    parser.add_argument("--since-attribute", type=str, default=None,
+                        help="With --incremental: only scan items whose attribute (e.g. "
+                             "last_updated) is >= the last run's maximum")
+    parser.add_argument("--changes-file", type=str, default=None,
+                        help="With --incremental: JSONL of DynamoDB Streams records to apply "
+                             "instead of scanning")
     args = parser.parse_args()
 
+    if (args.incremental or args.since_attribute or args.changes_file) and args.source != "dynamodb":
+        parser.error("--incremental, --since-attribute and --changes-file need --source dynamodb")
+    if (args.since_attribute or args.changes_file) and not args.incremental:
+        parser.error("--since-attribute and --changes-file only apply with --incremental")
+    if args.incremental and args.dedup != "none":
+        parser.error("--dedup can't be combined with --incremental (refreshes patch pairs "
+                     "per record, which dedup would break)")
+
+    manifest = None
     if args.source == "dynamodb":
-        data = load_from_dynamodb(args.profile, args.region, args.tables)
+        if args.incremental and refresh_dataset(args):
+            if args.tokenizer:
+                tokenize_splits(args.output_dir, args.tokenizer, args.max_length, args.tmp_dir)
+            return
+        if args.dedup == "none":
+            manifest = PairManifest(args.output_dir)
+            manifest.reset()
+        pairs = iter_pairs_from_dynamodb(args.profile, args.region, args.tables,
+                                         args.segments, args.scan_workers, args.endpoint_url,
+                                         manifest, args.workers, args.chunk_size)
     elif args.source == "csv":
         if not args.file:
             raise ValueError("--file is required for --source csv")
-        data = load_from_csv(args.file)
+        pairs = iter_pairs_from_csv(args.file)
     elif args.source == "jsonl":
         if not args.file:
             raise ValueError("--file is required for --source jsonl")
-        data = load_from_jsonl(args.file)
+        pairs = iter_pairs_from_jsonl(args.file, args.workers, args.chunk_size)
     else:
         print("Using built-in example data (no AWS required)...")
-        data = create_example_data()
+        pairs = iter_example_pairs()
+
+    if manifest is None:
+        discard_manifest(args.output_dir)  # the dataset is no longer derived from it
+    dedup = None
+    if args.dedup != "none":
+        dedup = PairDeduplicator(near=args.dedup == "near", capacity=args.dedup_capacity,
+                                 bands=args.near_dup_bands)
+        pairs = dedup.filter(pairs, dedup_text)
 
-    if not data:
+    first = next(pairs, None)
+    if first is None:
         print("No data loaded — check your source and try again.")
+        if manifest is not None:
+            manifest.close()
         return
 
-    save_dataset(data, args.output_dir, args.train_ratio)
+    save_dataset(itertools.chain([first], pairs), args.output_dir, args.train_ratio,
+                 args.shuffle_buffer, args.seed, args.tmp_dir)
+    if dedup is not None:
+        print(dedup.report())
+    if manifest is not None:
+        manifest.set_json('train_ratio', args.train_ratio)
+        manifest.mark_baseline()
+        manifest.commit()
+        manifest.close()
+        print(f"  Pair manifest: {manifest.path} (use --incremental to refresh)")
+    if args.tokenizer:
+        tokenize_splits(args.output_dir, args.tokenizer, args.max_length, args.tmp_dir)
+    data_file = "train.tokens.bin" if args.tokenizer else "train.jsonl"
     print("\nDone! Next step:")
-    print("  python scripts/train.py --config configs/lora_config.yaml --data data/processed/train.jsonl --output models/lithia-lora")
+    print(f"  python scripts/train.py --config configs/lora_config.yaml --data data/processed/{data_file} --output models/lithia-lora")
 
 
 if __name__ == "__main__":
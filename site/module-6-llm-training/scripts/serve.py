@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Local HTTP inference server for TinyLlama + LoRA with continuous batching.
+
+The model is loaded once (inference.load_model) and questions are answered
+by one scheduler thread that decodes all in-flight requests together, one
+token per step. New requests join the running batch between steps and
+finished ones leave it, so a short answer never waits for a long one and the
+batch stays full under load (continuous batching). Decoding matches
+inference.ask(): greedy, repetition penalty 1.1.
+
+Usage:
+  python3 scripts/serve.py --model models/healthcare-lora --port 8000 \\
+    [--tables lithia-vehicles lithia-customers --region us-west-2]
+
+  curl -s localhost:8000/v1/generate -d '{"question": "Which vehicles have been on the lot the longest?"}'
+  curl -s localhost:8000/metrics
+
+Endpoints:
+  POST /v1/generate  {"question": ..., "context": ... (default: the --tables
+                     context), "max_new_tokens": 150} or {"prompt": raw chat
+                     prompt}; returns the answer, token counts and timings
+  GET  /metrics      requests, queue depth, batch size, tokens/s and latency /
+                     time-to-first-token / queue-wait percentiles (JSON)
+  GET  /health
+
+A full queue (--max-queue) answers 503; a request not done within
+--request-timeout seconds answers 504 and is dropped from the batch.
+"""
+import argparse
+import inspect
+import json
+import queue
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import torch
+from transformers import DynamicCache
+
+from inference import build_prompt, cache_to_tensors, fetch_dynamo_context, load_model, tensors_to_cache
+from train_metrics import percentile
+
+REPETITION_PENALTY = 1.1
+
+
+@dataclass
+class Request:
+    prompt_ids: list[int]
+    max_new_tokens: int
+    submitted: float = field(default_factory=time.perf_counter)
+    started: float = 0.0        # prefill began
+    first_token: float = 0.0
+    finished: float = 0.0
+    tokens: list[int] = field(default_factory=list)
+    answer: str = ""
+    error: str = ""
+    cancelled: bool = False
+    done: threading.Event = field(default_factory=threading.Event)
+
+
+# ── KV cache helpers ─────────────────────────────────────────────────────────
+
+def left_pad(kv: list, mask: torch.Tensor, length: int):
+    """Pad a batch's cache and attention mask on the left to `length` positions"""
+    extra = length - mask.shape[1]
+    if extra <= 0:
+        return kv, mask
+    pad = lambda t: torch.cat([t.new_zeros(*t.shape[:2], extra, t.shape[3]), t], dim=2)
+    return [(pad(k), pad(v)) for k, v in kv], torch.cat([mask.new_zeros(mask.shape[0], extra), mask], dim=1)
+
+
+# ── Metrics ──────────────────────────────────────────────────────────────────
+
+class ServerMetrics:
+    def __init__(self, window: int = 1000, rate_window_s: float = 60.0):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.latency = deque(maxlen=window)
+        self.ttft = deque(maxlen=window)
+        self.queue_wait = deque(maxlen=window)
+        self.steps = deque()        # (time, batch size, tokens) of recent decode steps
+        self.rate_window_s = rate_window_s
+        self.started = time.time()
+
+    def count(self, key: str, n: int = 1):
+        with self.lock:
+            self.counts[key] += n
+
+    def step(self, batch_size: int, tokens: int):
+        now = time.perf_counter()
+        with self.lock:
+            self.steps.append((now, batch_size, tokens))
+            while self.steps and now - self.steps[0][0] > self.rate_window_s:
+                self.steps.popleft()
+
+    def finish(self, req: Request):
+        with self.lock:
+            self.counts["completed"] += 1
+            self.counts["prompt_tokens"] += len(req.prompt_ids)
+            self.counts["completion_tokens"] += len(req.tokens)
+            self.latency.append(req.finished - req.submitted)
+            self.ttft.append(req.first_token - req.submitted)
+            self.queue_wait.append(req.started - req.submitted)
+
+    def snapshot(self, queued: int, active: int) -> dict:
+        now = time.perf_counter()
+        with self.lock:
+            steps = [s for s in self.steps if now - s[0] <= self.rate_window_s]
+            span = (now - steps[0][0]) if len(steps) > 1 else 0.0
+            pct = lambda values: {f"p{q}": round(percentile(list(values), q), 4) for q in (50, 90, 99)}
+            return {
+                "uptime_s": round(time.time() - self.started, 1),
+                "requests": dict(self.counts),
+                "queue_depth": queued,
+                "active": active,
+                f"tokens_per_s_{self.rate_window_s:.0f}s": round(sum(s[2] for s in steps) / span, 2) if span else 0.0,
+                "mean_batch_size": round(sum(s[1] for s in steps) / len(steps), 2) if steps else 0.0,
+                "latency_s": pct(self.latency),
+                "ttft_s": pct(self.ttft),
+                "queue_wait_s": pct(self.queue_wait),
+            }
+
+
+# ── Scheduler ────────────────────────────────────────────────────────────────
+
+class Scheduler:
+    """Owns the model; decodes every in-flight request one token per step"""
+
+    def __init__(self, model, tok, device: str, max_batch_size: int = 8, max_queue: int = 256):
+        self.model = model
+        self.tok = tok
+        # fast tokenizers are not thread-safe ("Already borrowed"): HTTP threads
+        # encode while the scheduler thread decodes
+        self.tok_lock = threading.Lock()
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.metrics = ServerMetrics()
+        self.pad_id = tok.pad_token_id if tok.pad_token_id is not None else tok.eos_token_id
+        self.eos_id = tok.eos_token_id
+        self.max_positions = getattr(model.config, "max_position_embeddings", 2048)
+        base = model.get_base_model() if hasattr(model, "get_base_model") else model
+        params = inspect.signature(base.forward).parameters
+        # prefill only needs the last position's logits
+        self.logits_kw = next((k for k in ("logits_to_keep", "num_logits_to_keep") if k in params), None)
+        # running batch: left-padded cache (on the model's device) + per-row state on CPU
+        self.rows: list[Request] = []
+        self.kv = None
+        self.mask = None
+        self.positions = None
+        self.last = None
+        self.seen: list[set] = []
+
+    # called from HTTP threads
+    def encode(self, text: str) -> list[int]:
+        with self.tok_lock:
+            return self.tok(text)["input_ids"]
+
+    def submit(self, req: Request):
+        self.metrics.count("received")
+        try:
+            self.queue.put_nowait(req)
+        except queue.Full:
+            self.metrics.count("rejected")
+            raise
+
+    def start(self):
+        threading.Thread(target=self._loop, name="scheduler", daemon=True).start()
+
+    def _loop(self):
+        while True:
+            try:
+                self._admit()
+                if self.rows:
+                    self._decode_step()
+            except Exception as e:  # keep serving; fail only the requests in flight
+                print(f"[error] batch failed: {e}", file=sys.stderr)
+                self.metrics.count("failed", len(self.rows))
+                for req in self.rows:
+                    req.error = str(e)
+                    req.done.set()
+                self.rows, self.seen, self.kv = [], [], None
+
+    def _admit(self):
+        """Move waiting requests into the batch (blocks while idle)"""
+        free = self.max_batch_size - len(self.rows)
+        new = []
+        if not self.rows:
+            new.append(self.queue.get())
+            free -= 1
+        while free > 0:
+            try:
+                new.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+            free -= 1
+        new = [r for r in new if not r.cancelled]
+        if not new:
+            return
+        try:
+            self._prefill(new)
+        except Exception as e:
+            self.metrics.count("failed", len(new))
+            for req in new:
+                req.error = str(e)
+                req.done.set()
+            raise
+
+    def _forward(self, input_ids, mask, positions, kv, **kwargs):
+        with torch.no_grad():
+            out = self.model(
+                input_ids=input_ids.to(self.device),
+                attention_mask=mask.to(self.device),
+                position_ids=positions.to(self.device),
+                past_key_values=tensors_to_cache(kv) if kv else DynamicCache(),
+                use_cache=True,
+                **kwargs,
+            )
+        return out.logits[:, -1, :].float().cpu(), cache_to_tensors(out.past_key_values)
+
+    def _prefill(self, new: list[Request]):
+        now = time.perf_counter()
+        length = max(len(r.prompt_ids) for r in new)
+        ids = torch.full((len(new), length), self.pad_id, dtype=torch.long)
+        mask = torch.zeros((len(new), length), dtype=torch.long)
+        for i, r in enumerate(new):
+            r.started = now
+            ids[i, length - len(r.prompt_ids):] = torch.tensor(r.prompt_ids)
+            mask[i, length - len(r.prompt_ids):] = 1
+        positions = (mask.cumsum(-1) - 1).clamp(min=0)
+        extra = {self.logits_kw: 1} if self.logits_kw else {}
+        logits, kv = self._forward(ids, mask, positions, None, **extra)
+        seen = [set(r.prompt_ids) for r in new]
+        tokens = self._pick(logits, seen)
+        now = time.perf_counter()
+        for r, t in zip(new, tokens):
+            r.first_token = now
+
+        if self.rows:  # join the running batch
+            width = max(self.mask.shape[1], mask.shape[1])
+            self.kv, self.mask = left_pad(self.kv, self.mask, width)
+            kv, mask = left_pad(kv, mask, width)
+            self.kv = [(torch.cat([k1, k2]), torch.cat([v1, v2])) for (k1, v1), (k2, v2) in zip(self.kv, kv)]
+            self.mask = torch.cat([self.mask, mask])
+            self.positions = torch.cat([self.positions, torch.tensor([len(r.prompt_ids) for r in new])])
+            self.last = torch.cat([self.last, tokens])
+        else:
+            self.kv, self.mask = kv, mask
+            self.positions = torch.tensor([len(r.prompt_ids) for r in new])
+            self.last = tokens
+        self.rows.extend(new)
+        self.seen.extend(seen)
+        self._record(tokens, len(self.rows) - len(new))
+        self.metrics.step(len(new), len(new))
+
+    def _decode_step(self):
+        mask = torch.cat([self.mask, self.mask.new_ones(len(self.rows), 1)], dim=1)
+        logits, self.kv = self._forward(self.last[:, None], mask, self.positions[:, None], self.kv)
+        self.mask = mask
+        self.positions = self.positions + 1
+        self.last = self._pick(logits, self.seen)
+        self.metrics.step(len(self.rows), len(self.rows))
+        self._record(self.last, 0)
+
+    def _pick(self, logits: torch.Tensor, seen: list[set]) -> torch.Tensor:
+        """Greedy token per row after the repetition penalty (as in generate())"""
+        for i, ids in enumerate(seen):
+            idx = torch.tensor(sorted(ids), dtype=torch.long)
+            score = logits[i, idx]
+            logits[i, idx] = torch.where(score < 0, score * REPETITION_PENALTY, score / REPETITION_PENALTY)
+        return logits.argmax(dim=-1)
+
+    def _record(self, tokens: torch.Tensor, first_row: int):
+        """Append each row's new token, then drop finished and cancelled rows"""
+        keep = []
+        for i, req in enumerate(self.rows):
+            if i >= first_row:
+                t = int(tokens[i - first_row])
+                req.tokens.append(t)
+                self.seen[i].add(t)
+            finished = (req.tokens and req.tokens[-1] == self.eos_id) \
+                or len(req.tokens) >= req.max_new_tokens \
+                or int(self.positions[i]) + 1 >= self.max_positions
+            if req.cancelled:
+                continue
+            if finished:
+                req.finished = time.perf_counter()
+                with self.tok_lock:
+                    req.answer = self.tok.decode(req.tokens, skip_special_tokens=True).strip()
+                self.metrics.finish(req)
+                req.done.set()
+            else:
+                keep.append(i)
+        if len(keep) == len(self.rows):
+            return
+        self.rows = [self.rows[i] for i in keep]
+        self.seen = [self.seen[i] for i in keep]
+        if not keep:
+            self.kv = None
+            return
+        index = torch.tensor(keep)
+        self.kv = [(k[index.to(k.device)], v[index.to(v.device)]) for k, v in self.kv]
+        self.mask = self.mask[index]
+        self.positions = self.positions[index]
+        self.last = self.last[index]
+        # drop leading columns that are padding in every remaining row
+        start = int((self.mask.sum(dim=0) > 0).nonzero()[0])
+        if start:
+            self.kv = [(k[:, :, start:], v[:, :, start:]) for k, v in self.kv]
+            self.mask = self.mask[:, start:]
+
+
+# ── HTTP ─────────────────────────────────────────────────────────────────────
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "lithia-serve/1.0"
+
+    def _json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        sched = self.server.scheduler
+        if self.path == "/health":
+            self._json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            self._json(200, sched.metrics.snapshot(sched.queue.qsize(), len(sched.rows)))
+        else:
+            self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/v1/generate":
+            self._json(404, {"error": "not found"})
+            return
+        sched = self.server.scheduler
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("expected a JSON object")
+            for key in ("prompt", "question", "context"):
+                if key in body and not isinstance(body[key], str):
+                    raise ValueError(f'"{key}" must be a string')
+            if "prompt" in body:
+                prompt = body["prompt"]
+            elif "question" in body:
+                prompt = build_prompt(body["question"], body.get("context", self.server.context))
+            else:
+                raise ValueError('expected "question" or "prompt"')
+            max_new_tokens = int(body.get("max_new_tokens", self.server.max_new_tokens))
+            if max_new_tokens < 1:
+                raise ValueError("max_new_tokens must be at least 1")
+        except (ValueError, TypeError) as e:
+            self._json(400, {"error": str(e)})
+            return
+
+        prompt_ids = sched.encode(prompt)
+        if len(prompt_ids) + max_new_tokens > sched.max_positions:
+            self._json(400, {"error": f"prompt of {len(prompt_ids)} tokens + max_new_tokens "
+                                      f"exceeds the model's {sched.max_positions} positions"})
+            return
+        req = Request(prompt_ids, max_new_tokens)
+        try:
+            sched.submit(req)
+        except queue.Full:
+            self._json(503, {"error": "queue full, retry later"})
+            return
+        if not req.done.wait(self.server.request_timeout):
+            req.cancelled = True
+            sched.metrics.count("timed_out")
+            self._json(504, {"error": "timed out"})
+            return
+        if req.error:
+            self._json(500, {"error": req.error})
+            return
+        self._json(200, {
+            "answer": req.answer,
+            "prompt_tokens": len(req.prompt_ids),
+            "completion_tokens": len(req.tokens),
+            "queue_s": round(req.started - req.submitted, 4),
+            "ttft_s": round(req.first_token - req.submitted, 4),
+            "latency_s": round(req.finished - req.submitted, 4),
+        })
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP inference server with continuous batching")
+    parser.add_argument("--model", default="./models/healthcare-lora", help="Path to LoRA adapter directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--tables", nargs="*", default=[], help="DynamoDB tables fetched once as default context")
+    parser.add_argument("--region", default="us-west-2", help="AWS region for DynamoDB")
+    parser.add_argument("--max-rows", type=int, default=10, help="Max rows to fetch per table for context")
+    parser.add_argument("--max-tokens", type=int, default=150, help="Default max tokens to generate")
+    parser.add_argument("--max-batch-size", type=int, default=8, help="Requests decoded together")
+    parser.add_argument("--max-queue", type=int, default=256, help="Waiting requests before 503")
+    parser.add_argument("--request-timeout", type=float, default=300.0, help="Seconds before 504")
+    parser.add_argument("--merged", action="store_true",
+                        help="Use adapter-merged weights, cached as safetensors after the first start")
+    parser.add_argument("--merged-cache", default=None, help="Merged-weight cache directory (default: <model>/.merged)")
+    parser.add_argument("--quantize", choices=["none", "int8", "int4"], default="none",
+                        help="CPU weight quantization after merging the adapter")
+    parser.add_argument("--verbose", action="store_true", help="Log every HTTP request")
+    args = parser.parse_args()
+
+    if not Path(args.model).exists():
+        print(f"Adapter not found: {args.model}. Run training first.")
+        return
+
+    context = ""
+    if args.tables:
+        print(f"\nFetching context from DynamoDB tables: {', '.join(args.tables)}")
+        context = fetch_dynamo_context(args.tables, args.region, args.max_rows)
+
+    model, tok, device = load_model(args.model, args.merged, args.merged_cache, args.quantize)
+    scheduler = Scheduler(model, tok, device, args.max_batch_size, args.max_queue)
+    scheduler.start()
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    server.scheduler = scheduler
+    server.context = context
+    server.max_new_tokens = args.max_tokens
+    server.request_timeout = args.request_timeout
+    server.verbose = args.verbose
+    print(f"Serving on http://{args.host}:{args.port} (POST /v1/generate, GET /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Pre-tokenized, length-bucketed training data
+
+prepare_data.py --tokenizer writes each split once as token IDs so that
+train.py never tokenizes again:
+
+    train.tokens.bin       all examples' token IDs back to back (uint16, or
+                           uint32 for vocabularies over 65,536 tokens)
+    train.tokens.idx.npy   int64 [num_examples, 2] array of (offset, length)
+    train.tokens.json      tokenizer, dtype, max_length and the buckets
+
+Examples are grouped by length into buckets (powers of two up to max_length)
+and stored bucket after bucket, keeping the shuffled order within a bucket.
+Batches drawn from one bucket need little padding.
+
+TokenizedDataset memory-maps the .bin and .idx files: opening a split costs
+nothing, and an example is a view into the mapped file until the collator
+copies it into the batch tensor. numpy is the only dependency here;
+tokenizing needs transformers.
+
+PackedDataset packs a split into full max_length windows with first-fit
+decreasing: each item is several examples back to back, with position IDs
+that restart at 0 for every example and the example lengths, from which the
+training collator builds a block-diagonal causal attention mask (so examples
+in one window never attend to each other).
+
+LengthGroupedSampler batches any dataset by length given only the example
+lengths (train.py uses it for JSONL data): similar lengths share a batch,
+and with a curriculum the first epochs run from short to long batches.
+"""
+
+import bisect
+import json
+import os
+import random
+import shutil
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MIN_BUCKET = 32
+
+# Texts per tokenizer call (fast tokenizers batch in native threads)
+TOKENIZE_BATCH = 1_000
+
+
+def token_paths(prefix: str) -> Dict[str, Path]:
+    """Files of a tokenized split; `prefix` is e.g. data/processed/train.tokens"""
+    return {'bin': Path(f"{prefix}.bin"), 'idx': Path(f"{prefix}.idx.npy"),
+            'meta': Path(f"{prefix}.json")}
+
+
+def tokens_prefix(path: str) -> Optional[str]:
+    """The split prefix if `path` names a tokenized split (.bin, .json or the prefix itself)"""
+    for suffix in ('.bin', '.json', '.idx.npy'):
+        if path.endswith(suffix):
+            path = path[:-len(suffix)]
+            break
+    return path if token_paths(path)['meta'].exists() else None
+
+
+def bucket_bounds(max_length: int) -> List[int]:
+    """Upper length of each bucket: 32, 64, 128, ... up to max_length"""
+    bounds = []
+    bound = MIN_BUCKET
+    while bound < max_length:
+        bounds.append(bound)
+        bound *= 2
+    bounds.append(max_length)
+    return bounds
+
+
+def load_tokenizer(name: str, cache_dir: Optional[str] = None):
+    try:
+        from transformers import AutoTokenizer
+    except ImportError:
+        raise ImportError("transformers is required for --tokenizer — run: pip install transformers")
+    return AutoTokenizer.from_pretrained(name, cache_dir=cache_dir, trust_remote_code=True)
+
+
+def write_token_dataset(jsonl_path: str, prefix: str, tokenizer, tokenizer_name: str,
+                        max_length: int = 512, tmp_dir: Optional[str] = None) -> Dict:
+    """Tokenize the `text` of every line of `jsonl_path` into `prefix`.bin/.idx.npy/.json
+
+    Streams: each bucket is written to its own temp file and the files are
+    concatenated at the end, so memory holds only the example lengths.
+    Returns the metadata written to the .json file.
+    """
+    paths = token_paths(prefix)
+    bounds = bucket_bounds(max_length)
+    dtype = np.uint16 if len(tokenizer) <= 1 << 16 else np.uint32
+    lengths = [array('I') for _ in bounds]
+    parts = [tempfile.NamedTemporaryFile(prefix='tokens-', suffix='.bin', dir=tmp_dir, delete=False)
+             for _ in bounds]
+    try:
+        def flush(texts):
+            encoded = tokenizer(texts, truncation=True, max_length=max_length)['input_ids']
+            for ids in encoded:
+                b = bisect.bisect_left(bounds, len(ids))
+                parts[b].write(np.asarray(ids, dtype=dtype).tobytes())
+                lengths[b].append(len(ids))
+
+        texts = []
+        with open(jsonl_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    texts.append(json.loads(line)['text'])
+                if len(texts) >= TOKENIZE_BATCH:
+                    flush(texts)
+                    texts = []
+        if texts:
+            flush(texts)
+
+        paths['meta'].unlink(missing_ok=True)  # the .json marks a complete split
+        buckets = []
+        start = 0
+        with open(paths['bin'], 'wb') as out:
+            for bound, part, lens in zip(bounds, parts, lengths):
+                part.close()
+                with open(part.name, 'rb') as src:
+                    shutil.copyfileobj(src, out, 1 << 20)
+                buckets.append({'max_length': bound, 'start': start, 'count': len(lens)})
+                start += len(lens)
+    finally:
+        for part in parts:
+            part.close()
+            os.remove(part.name)
+
+    all_lengths = np.concatenate([np.frombuffer(lens, dtype=np.uint32) for lens in lengths]
+                                 ).astype(np.int64)
+    index = np.empty((len(all_lengths), 2), dtype=np.int64)
+    index[:, 1] = all_lengths
+    index[:, 0] = np.cumsum(all_lengths) - all_lengths
+    np.save(paths['idx'], index)
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'tokenizer': tokenizer_name,
+        'vocab_size': len(tokenizer),
+        'dtype': np.dtype(dtype).name,
+        'max_length': max_length,
+        'num_examples': int(len(index)),
+        'num_tokens': int(all_lengths.sum()),
+        'pad_token_id': tokenizer.pad_token_id if tokenizer.pad_token_id is not None
+        else tokenizer.eos_token_id,
+        'buckets': [b for b in buckets if b['count']],
+    }
+    with open(paths['meta'], 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def ensure_tokenized(jsonl_path: str, tokenizer, tokenizer_name: str, max_length: int,
+                     tmp_dir: Optional[str] = None) -> str:
+    """Prefix of an up-to-date tokenized copy of `jsonl_path`, writing it if needed"""
+    prefix = str(Path(jsonl_path).with_suffix('')) + '.tokens'
+    meta_path = token_paths(prefix)['meta']
+    if meta_path.exists() and meta_path.stat().st_mtime >= Path(jsonl_path).stat().st_mtime:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta['tokenizer'] == tokenizer_name and meta['max_length'] == max_length:
+            return prefix
+    print(f"Tokenizing {jsonl_path} -> {prefix}.bin (reused on later runs)")
+    write_token_dataset(jsonl_path, prefix, tokenizer, tokenizer_name, max_length, tmp_dir)
+    return prefix
+
+
+def padding_report(meta: Dict) -> str:
+    """Share of padding when every example is padded to max_length vs to its bucket bound"""
+    tokens = meta['num_tokens']
+    n = meta['num_examples']
+    to_max = n * meta['max_length']
+    to_bucket = sum(b['max_length'] * b['count'] for b in meta['buckets'])
+    return (f"{n} examples, {tokens:,} tokens (mean {tokens / max(n, 1):.0f}); "
+            f"padding {1 - tokens / max(to_max, 1):.0%} at max_length vs "
+            f"at most {1 - tokens / max(to_bucket, 1):.0%} within buckets")
+
+
+class TokenizedDataset:
+    """Memory-mapped tokenized split; items are {'input_ids': read-only numpy view}"""
+
+    def __init__(self, prefix: str):
+        paths = token_paths(prefix)
+        with open(paths['meta']) as f:
+            self.meta = json.load(f)
+        if self.meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"{paths['meta']}: unsupported format version "
+                             f"{self.meta.get('format_version')} — re-run prepare_data.py")
+        self.prefix = prefix
+        self.index = np.load(paths['idx'], mmap_mode='r')
+        self.tokens = np.memmap(paths['bin'], dtype=self.meta['dtype'], mode='r') \
+            if self.meta['num_tokens'] else np.empty(0, dtype=self.meta['dtype'])
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, i: int) -> Dict[str, np.ndarray]:
+        offset, length = self.index[i]
+        return {'input_ids': self.tokens[offset:offset + length]}
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return self.index[:, 1]
+
+    @property
+    def buckets(self) -> List[Dict]:
+        return self.meta['buckets']
+
+
+class BucketSampler:
+    """Index sampler whose runs of `batch_size` indices come from one length bucket
+
+    Each epoch shuffles the examples within each bucket, lays the buckets end
+    to end and cuts that sequence into batches, then shuffles the batch order
+    (the one short batch stays last). Only the few batches that straddle two
+    neighbouring buckets mix lengths. Pass it as a DataLoader `sampler`
+    together with the same `batch_size`.
+    """
+
+    def __init__(self, buckets: List[Dict], batch_size: int, seed: int = 42):
+        self.buckets = buckets
+        self.batch_size = batch_size
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __len__(self) -> int:
+        return sum(b['count'] for b in self.buckets)
+
+    def __iter__(self) -> Iterator[int]:
+        rng = random.Random(self.seed + self.epoch)
+        self.epoch += 1
+        order = []
+        for b in self.buckets:
+            bucket = list(range(b['start'], b['start'] + b['count']))
+            rng.shuffle(bucket)
+            order.extend(bucket)
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        last = batches.pop() if batches and len(batches[-1]) < self.batch_size else None
+        rng.shuffle(batches)
+        if last:
+            batches.append(last)
+        for batch in batches:
+            yield from batch
+
+
+BATCH_ORDERS = ["random", "length", "curriculum"]
+
+
+class LengthGroupedSampler:
+    """Index sampler whose runs of `batch_size` indices have similar lengths
+
+    Each epoch sorts the examples by length (ties broken at random), cuts that
+    sequence into batches and shuffles the batch order (the one short batch
+    stays last). During the first `curriculum_epochs` epochs the batches are
+    not shuffled, so training goes from the shortest batches to the longest.
+    Pass it as a DataLoader `sampler` together with the same `batch_size`.
+    """
+
+    def __init__(self, lengths, batch_size: int, seed: int = 42, curriculum_epochs: int = 0):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.seed = seed
+        self.curriculum_epochs = curriculum_epochs
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def __iter__(self) -> Iterator[int]:
+        epoch, self.epoch = self.epoch, self.epoch + 1
+        rng = np.random.default_rng(self.seed + epoch)
+        order = np.lexsort((rng.random(len(self.lengths)), self.lengths))
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        if epoch >= self.curriculum_epochs:
+            last = batches.pop() if batches and len(batches[-1]) < self.batch_size else None
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+            if last is not None:
+                batches.append(last)
+        for batch in batches:
+            yield from batch.tolist()
+
+
+def batch_padding(lengths, order, batch_size: int) -> float:
+    """Share of padding when `order` is cut into batches padded to their longest example"""
+    lengths = np.asarray(lengths)[np.asarray(order, dtype=np.int64)]
+    if not len(lengths):
+        return 0.0
+    starts = np.arange(0, len(lengths), batch_size)
+    longest = np.maximum.reduceat(lengths, starts)
+    sizes = np.diff(np.append(starts, len(lengths)))
+    return 1 - lengths.sum() / max(int((longest * sizes).sum()), 1)
+
+
+def length_grouping_report(lengths, batch_size: int, sampler: LengthGroupedSampler,
+                           seed: int = 42) -> str:
+    """Padding of random batches vs the sampler's first epoch"""
+    shuffled = np.random.default_rng(seed).permutation(len(lengths))
+    grouped = list(iter(sampler))
+    sampler.set_epoch(0)
+    return (f"Padding (batch size {batch_size}): "
+            f"{batch_padding(lengths, shuffled, batch_size):.0%} with random batches, "
+            f"{batch_padding(lengths, grouped, batch_size):.0%} grouped by length")
+
+
+def first_fit_decreasing(lengths: np.ndarray, capacity: int) -> np.ndarray:
+    """Bin index of every item when packing `lengths` into bins of `capacity`
+
+    Items are placed longest first, each into the lowest-numbered bin it fits
+    in. A max-tree over the bins' remaining capacity finds that bin in
+    O(log n), so millions of examples pack in seconds.
+    """
+    n = len(lengths)
+    if n and int(lengths.max()) > capacity:
+        raise ValueError(f"An item of length {int(lengths.max())} does not fit in {capacity}")
+    size = 1
+    while size < max(n, 1):
+        size *= 2
+    tree = [capacity] * (2 * size)  # unopened bins have the full capacity
+    bins = np.empty(n, dtype=np.int64)
+    for item in np.argsort(-lengths, kind='stable').tolist():
+        length = int(lengths[item])
+        pos = 1
+        while pos < size:
+            pos = 2 * pos if tree[2 * pos] >= length else 2 * pos + 1
+        bins[item] = pos - size
+        tree[pos] -= length
+        pos //= 2
+        while pos:
+            tree[pos] = max(tree[2 * pos], tree[2 * pos + 1])
+            pos //= 2
+    return bins
+
+
+class PackedDataset:
+    """A tokenized split packed into windows of `max_length` tokens
+
+    Items are {'input_ids', 'position_ids', 'seq_lens'} numpy arrays; examples
+    longer than `max_length` are truncated to it.
+    """
+
+    def __init__(self, source: TokenizedDataset, max_length: int):
+        self.source = source
+        self.max_length = max_length
+        self.lengths = np.minimum(np.asarray(source.lengths), max_length)
+        bins = first_fit_decreasing(self.lengths, max_length)
+        self.members = np.argsort(bins, kind='stable')
+        counts = np.bincount(bins, minlength=int(bins.max()) + 1) if len(bins) else np.zeros(0, int)
+        self.starts = np.concatenate(([0], np.cumsum(counts)))
+
+    def __len__(self) -> int:
+        return len(self.starts) - 1
+
+    def __getitem__(self, b: int) -> Dict[str, np.ndarray]:
+        members = self.members[self.starts[b]:self.starts[b + 1]]
+        seq_lens = self.lengths[members]
+        ids = [self.source[int(i)]['input_ids'][:n] for i, n in zip(members, seq_lens)]
+        return {
+            'input_ids': np.concatenate(ids),
+            'position_ids': np.concatenate([np.arange(n) for n in seq_lens]),
+            'seq_lens': seq_lens,
+        }
+
+    @property
+    def utilization(self) -> float:
+        """Share of window tokens that are real tokens"""
+        return float(self.lengths.sum()) / max(len(self) * self.max_length, 1)
+
+    def report(self) -> str:
+        unpacked = float(self.lengths.sum()) / max(len(self.lengths) * self.max_length, 1)
+        return (f"Packed {len(self.lengths)} examples into {len(self)} windows of "
+                f"{self.max_length} tokens — token utilization {self.utilization:.1%} "
+                f"(vs {unpacked:.1%} with one example per {self.max_length}-token window)")
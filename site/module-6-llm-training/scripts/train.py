@@ -10,45 +10,136 @@ Usage:
         --config configs/lora_config.yaml \
         --data data/processed/train.jsonl \
         --output models/healthcare-lora
+
+Pre-tokenized data (prepare_data.py --tokenizer ...):
+    python scripts/train.py --data data/processed/train.tokens.bin
+
+    The memory-mapped token file is used as is — no tokenization at start-up —
+    with a plain Trainer, a padding collator and batches drawn from one length
+    bucket at a time (see token_dataset.py).
+
+Packed training (training.packing: true in the config, or --packing):
+    Examples are packed first-fit-decreasing into full max_seq_length windows.
+    Each example keeps its own position IDs (restarting at 0) and a
+    block-diagonal causal attention mask, so examples in a window never see
+    each other. JSONL input is tokenized once into <name>.tokens.* next to it.
+    The achieved token utilization is printed before training.
+
+Distributed data-parallel on CPU (gloo), one process per socket or core group:
+    torchrun --nproc_per_node 4 scripts/train.py --config configs/lora_config.yaml \
+        --data data/processed/train.jsonl --output models/lithia-lora
+
+    Across hosts, run the same command on every node with
+    --nnodes N --node_rank I --master_addr HOST0 --master_port 29500
+    (set GLOO_SOCKET_IFNAME if the hosts have several network interfaces).
+
+    Each rank trains on its own shard of every epoch and LoRA gradients are
+    all-reduced before each optimizer step. torchrun pins every process to one
+    thread, so train.py gives each rank training.threads_per_rank threads
+    (default: the usable cores divided by the ranks on the node). Only rank 0
+    tokenizes, saves checkpoints and writes the adapter;
+    --resume-from (a checkpoint, or "latest") works the same as single-process.
+
+Precision (training.precision in the config, or --precision):
+    auto  bf16 on CPUs with native bf16 math (AMX / AVX512_BF16), else fp32
+    fp32  everything float32
+    bf16  frozen base weights and activations bfloat16, LoRA adapters float32
+    int8  frozen base Linear weights int8 (weight-only), LoRA adapters float32
+    See cpu_quant.py; benchmark_precision.py compares step time and peak RSS.
+
+Batch order (training.batch_order in the config):
+    random      examples batched at random (the default)
+    length      similar-length examples batched together, batches in random
+                order — less padding once per_device_train_batch_size > 1
+    curriculum  like length, but the first training.curriculum_epochs epochs
+                run from the shortest batches to the longest
+    Padding with random vs grouped batches is printed before training.
+    Pre-tokenized data is always batched by length bucket; curriculum applies.
+
+Metrics (training.metrics_file, default metrics.jsonl in the output directory):
+    Per-step tokens/s, samples/s, step time, data-loader wait, gradient
+    checkpoint recomputation time and peak RSS, plus the Trainer logs, as JSON
+    lines; a summary is printed at the end (see train_metrics.py).
 """
 
 import argparse
+import os
 from pathlib import Path
 
+import numpy as np
 import yaml
 import torch
 from datasets import load_dataset
 from transformers import (
     AutoModelForCausalLM,
     AutoTokenizer,
+    Trainer,
+    TrainingArguments,
 )
+from transformers.trainer_utils import get_last_checkpoint
 from peft import LoraConfig, get_peft_model, TaskType
 from trl import SFTTrainer, SFTConfig
 
+from cpu_quant import PRECISIONS, apply_precision, resolve_precision, weight_bytes
+from train_metrics import MetricsCallback
+from token_dataset import (
+    BATCH_ORDERS,
+    BucketSampler,
+    LengthGroupedSampler,
+    PackedDataset,
+    TokenizedDataset,
+    ensure_tokenized,
+    length_grouping_report,
+    tokens_prefix,
+)
+
 
 def load_config(config_path: str) -> dict:
     with open(config_path, 'r') as f:
         return yaml.safe_load(f)
 
 
+def world_size() -> int:
+    """Number of processes when launched with torchrun (1 otherwise)"""
+    return int(os.environ.get("WORLD_SIZE", 1))
+
+
+def is_main_process() -> bool:
+    return int(os.environ.get("RANK", 0)) == 0
+
+
 def get_device() -> str:
     if torch.cuda.is_available():
         return "cuda"
-    elif hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
-        return "mps"
+    elif world_size() == 1 and hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
+        return "mps"  # MPS has no multi-process backend; distributed runs stay on CPU
     return "cpu"
 
 
-def setup_model_and_tokenizer(config: dict):
+def setup_cpu_threads(config: dict) -> int:
+    """Give each rank its share of the cores (torchrun defaults OMP_NUM_THREADS to 1)"""
+    threads = config.get("training", {}).get("threads_per_rank", "auto")
+    if threads == "auto" and world_size() == 1:
+        return torch.get_num_threads()  # keep torch's own default
+    if threads == "auto":
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+        local_ranks = int(os.environ.get("LOCAL_WORLD_SIZE", 1))
+        threads = max(1, (cores or 1) // local_ranks)
+    torch.set_num_threads(int(threads))
+    return int(threads)
+
+
+def setup_model_and_tokenizer(config: dict, precision: str = "fp32"):
     model_name = config["model"]["name"]
     cache_dir = config["model"].get("cache_dir", "./models")
     device = get_device()
 
-    print(f"\nLoading model: {model_name}")
-    print(f"Device       : {device}")
-    if device == "cuda":
-        print(f"GPU          : {torch.cuda.get_device_name(0)}")
-    
+    if is_main_process():
+        print(f"\nLoading model: {model_name}")
+        print(f"Device       : {device}")
+        if device == "cuda":
+            print(f"GPU          : {torch.cuda.get_device_name(0)}")
+
     tokenizer = AutoTokenizer.from_pretrained(
         model_name, cache_dir=cache_dir, trust_remote_code=True
     )
@@ -56,15 +147,18 @@ def setup_model_and_tokenizer(config: dict):
         tokenizer.pad_token = tokenizer.eos_token
     tokenizer.padding_side = "right"
 
-    # CPU-compatible: no quantization, float32
+    # bf16 / int8 load straight into bfloat16, so peak memory never holds an fp32 copy
     model = AutoModelForCausalLM.from_pretrained(
         model_name,
         cache_dir=cache_dir,
-        dtype=torch.float32,
+        dtype=torch.float32 if precision == "fp32" else torch.bfloat16,
         low_cpu_mem_usage=True,
+        # sdpa accepts the 4D block-diagonal masks used by packed training
+        attn_implementation=config["model"].get("attn_implementation", "sdpa"),
     )
     model.gradient_checkpointing_enable()
-    print("Model loaded successfully")
+    if is_main_process():
+        print("Model loaded successfully")
     return model, tokenizer
 
 
@@ -81,7 +175,8 @@ def setup_lora(model, config: dict):
     model = get_peft_model(model, peft_config)
     trainable = sum(p.numel() for p in model.parameters() if p.requires_grad)
     total = sum(p.numel() for p in model.parameters())
-    print(f"LoRA adapters applied — trainable params: {trainable:,} / {total:,} ({100*trainable/total:.2f}%)")
+    if is_main_process():
+        print(f"LoRA adapters applied — trainable params: {trainable:,} / {total:,} ({100*trainable/total:.2f}%)")
     return model
 
 
@@ -95,28 +190,155 @@ def load_training_data(train_file: str, eval_file: str = None):
     eval_dataset = None
     if eval_file and Path(eval_file).exists():
         eval_dataset = load_dataset("json", data_files=eval_file, split="train")
-    print(f"Training examples  : {len(train_dataset)}")
-    if eval_dataset:
-        print(f"Evaluation examples: {len(eval_dataset)}")
+    if is_main_process():
+        print(f"Training examples  : {len(train_dataset)}")
+        if eval_dataset:
+            print(f"Evaluation examples: {len(eval_dataset)}")
     return train_dataset, eval_dataset
 
 
-def train(config_path: str, data_file: str, output_dir: str, resume_from: str = None):
-    print("\n" + "=" * 60)
-    print("  TinyLlama 1.1B  LoRA Fine-Tuning (CPU)")
-    print("=" * 60)
+def load_tokenized_data(train_prefix: str, model_name: str, max_length: int):
+    """Memory-map the pre-tokenized train split (and eval split next to it, if any)"""
+    train_dataset = TokenizedDataset(train_prefix)
+    tokenizer_name = train_dataset.meta["tokenizer"]
+    if tokenizer_name != model_name and is_main_process():
+        print(f"[warn] {train_prefix} was tokenized with {tokenizer_name}, "
+              f"but the model is {model_name}")
+    if train_dataset.meta["max_length"] > max_length and is_main_process():
+        print(f"[warn] {train_prefix} was tokenized with max_length "
+              f"{train_dataset.meta['max_length']}; examples are truncated to {max_length}")
+    eval_prefix = tokens_prefix(str(Path(train_prefix).parent / "eval.tokens"))
+    eval_dataset = TokenizedDataset(eval_prefix) if eval_prefix else None
+    if is_main_process():
+        print(f"Training examples  : {len(train_dataset)} "
+              f"({train_dataset.meta['num_tokens']:,} tokens, pre-tokenized)")
+        if eval_dataset:
+            print(f"Evaluation examples: {len(eval_dataset)}")
+    return train_dataset, eval_dataset
 
-    config = load_config(config_path)
-    t = config.get("training", {})
-    out = output_dir or t.get("output_dir", "./models/healthcare-lora")
 
-    model, tokenizer = setup_model_and_tokenizer(config)
-    model = setup_lora(model, config)
+class PadCollator:
+    """Pad token-ID arrays to the longest in the batch; padding gets label -100
+
+    Examples longer than `max_length` (a split tokenized with a larger
+    max_length) are truncated to it.
+    """
+
+    def __init__(self, pad_token_id: int, pad_to_multiple_of: int = 8, max_length: int = None):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+        self.max_length = max_length
+
+    def __call__(self, features):
+        features = [{"input_ids": f["input_ids"][:self.max_length]} for f in features]
+        longest = max(len(f["input_ids"]) for f in features)
+        m = self.pad_to_multiple_of
+        width = (longest + m - 1) // m * m
+        input_ids = torch.full((len(features), width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), width), dtype=torch.long)
+        for i, f in enumerate(features):
+            ids = np.asarray(f["input_ids"], dtype=np.int64)  # the only copy of the mmap view
+            input_ids[i, :len(ids)] = torch.from_numpy(ids)
+            attention_mask[i, :len(ids)] = 1
+        labels = input_ids.masked_fill(attention_mask == 0, -100)
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+
+class PackedCollator:
+    """Batch packed windows with a block-diagonal causal mask
+
+    The mask is 4D additive (0 = attend, dtype min = blocked) of shape
+    [batch, 1, seq, seq]: a token attends only to earlier tokens of its own
+    example. Padding forms its own block, so no row is fully masked. Labels
+    are -100 on padding and on the first token of each example, so no loss is
+    taken across an example boundary.
+    """
+
+    def __init__(self, pad_token_id: int, pad_to_multiple_of: int = 8,
+                 mask_dtype: torch.dtype = torch.float32):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+        self.mask_dtype = mask_dtype
+
+    def __call__(self, features):
+        longest = max(len(f["input_ids"]) for f in features)
+        m = self.pad_to_multiple_of
+        width = (longest + m - 1) // m * m
+        batch = len(features)
+        input_ids = torch.full((batch, width), self.pad_token_id, dtype=torch.long)
+        position_ids = torch.zeros((batch, width), dtype=torch.long)
+        segments = torch.full((batch, width), -1, dtype=torch.long)
+        labels = torch.full((batch, width), -100, dtype=torch.long)
+        for i, f in enumerate(features):
+            n = len(f["input_ids"])
+            ids = torch.from_numpy(np.asarray(f["input_ids"], dtype=np.int64))
+            input_ids[i, :n] = ids
+            labels[i, :n] = ids
+            position_ids[i, :n] = torch.from_numpy(np.asarray(f["position_ids"], dtype=np.int64))
+            lens = torch.as_tensor(np.asarray(f["seq_lens"], dtype=np.int64))
+            segments[i, :n] = torch.repeat_interleave(torch.arange(len(lens)), lens)
+            starts = torch.cumsum(lens, 0) - lens
+            labels[i, starts] = -100
+        causal = torch.ones((width, width), dtype=torch.bool).tril()
+        allowed = (segments[:, :, None] == segments[:, None, :]) & causal
+        mask = torch.zeros((batch, 1, width, width), dtype=self.mask_dtype)
+        mask.masked_fill_(~allowed[:, None], torch.finfo(self.mask_dtype).min)
+        return {"input_ids": input_ids, "position_ids": position_ids,
+                "attention_mask": mask, "labels": labels}
 
-    eval_file = str(Path(data_file).parent / "eval.jsonl")
-    train_dataset, eval_dataset = load_training_data(data_file, eval_file)
 
-    training_args = SFTConfig(
+class BucketedTrainer(Trainer):
+    """Trainer whose training batches come from one length bucket at a time"""
+
+    def __init__(self, *args, curriculum_epochs: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.curriculum_epochs = curriculum_epochs
+
+    def _get_train_sampler(self, *args, **kwargs):
+        if self.curriculum_epochs:
+            return LengthGroupedSampler(self.train_dataset.lengths,
+                                        self.args.per_device_train_batch_size,
+                                        self.args.seed, self.curriculum_epochs)
+        return BucketSampler(self.train_dataset.buckets, self.args.per_device_train_batch_size,
+                             self.args.seed)
+
+
+def example_lengths(dataset, tokenizer, max_length: int) -> np.ndarray:
+    """Token count of every example of a text dataset (as SFTTrainer will truncate it)"""
+    if "input_ids" in dataset.column_names:  # already tokenized by SFTTrainer
+        lengths = [len(ids) for ids in dataset["input_ids"]]
+    else:
+        lengths = [len(ids) for ids in tokenizer(dataset["text"])["input_ids"]]
+    return np.minimum(np.asarray(lengths, dtype=np.int64), max_length)
+
+
+class LengthGroupedSFTTrainer(SFTTrainer):
+    """SFTTrainer whose training batches group examples of similar length"""
+
+    def __init__(self, *args, curriculum_epochs: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.curriculum_epochs = curriculum_epochs
+        self.train_lengths = example_lengths(self.train_dataset, self.processing_class,
+                                             self.args.max_length)
+
+    def _get_train_sampler(self, *args, **kwargs):
+        return LengthGroupedSampler(self.train_lengths, self.args.per_device_train_batch_size,
+                                    self.args.seed, self.curriculum_epochs)
+
+
+def training_kwargs(t: dict, out: str, has_eval: bool) -> dict:
+    """TrainingArguments shared by the SFT (text) and pre-tokenized paths"""
+    distributed = {}
+    if world_size() > 1:
+        distributed = dict(
+            ddp_backend="gloo" if get_device() == "cpu" else None,
+            ddp_find_unused_parameters=False,
+            ddp_broadcast_buffers=False,  # identical on every rank (int8 weights are buffers)
+            # reentrant checkpointing and DDP's gradient hooks don't mix
+            gradient_checkpointing_kwargs={"use_reentrant": False},
+        )
+    return dict(
+        **distributed,
         output_dir=out,
         num_train_epochs=t.get("num_train_epochs", 3),
         per_device_train_batch_size=t.get("per_device_train_batch_size", 1),
@@ -131,55 +353,182 @@ def train(config_path: str, data_file: str, output_dir: str, resume_from: str =
         max_grad_norm=t.get("max_grad_norm", 0.3),
         logging_steps=t.get("logging_steps", 5),
         save_steps=t.get("save_steps", 50),
-        eval_steps=t.get("eval_steps", 50) if eval_dataset else None,
-        eval_strategy="steps" if eval_dataset else "no",
+        eval_steps=t.get("eval_steps", 50) if has_eval else None,
+        eval_strategy="steps" if has_eval else "no",
         save_total_limit=2,
+        include_num_input_tokens_seen=True,  # tokens/s in the metrics file
+        # precision is applied to the weights (cpu_quant.apply_precision);
+        # autocast would keep fp32 copies of the frozen base model
         fp16=False,
         bf16=False,
         push_to_hub=False,
         report_to="none",
-        # SFTConfig-specific
-        dataset_text_field="text",
-        max_length=t.get("max_seq_length", 512),
-        packing=False,
     )
 
-    trainer = SFTTrainer(
-        model=model,
-        processing_class=tokenizer,
-        train_dataset=train_dataset,
-        eval_dataset=eval_dataset,
-        args=training_args,
-    )
 
-    print(f"\nOutput directory: {out}")
-    print(f"Epochs          : {t.get('num_train_epochs', 3)}")
-    print(f"Max seq length  : {t.get('max_seq_length', 512)}")
-    print("\nStarting training — watch for 'loss' decreasing each epoch...\n")
+def resolve_checkpoint(resume_from: str, out: str):
+    """--resume-from value for Trainer.train(): a path, or "latest" in the output dir"""
+    if resume_from in ("latest", "auto"):
+        last = get_last_checkpoint(out) if Path(out).is_dir() else None
+        if last is None and is_main_process():
+            print(f"No checkpoint in {out} yet — starting from scratch")
+        return last
+    return resume_from
+
+
+def train(config_path: str, data_file: str, output_dir: str, resume_from: str = None,
+          packing: bool = None, precision: str = None, metrics_file: str = None):
+    main_process = is_main_process()
+    if main_process:
+        print("\n" + "=" * 60)
+        print("  TinyLlama 1.1B  LoRA Fine-Tuning (CPU)")
+        print("=" * 60)
+
+    config = load_config(config_path)
+    t = config.get("training", {})
+    out = output_dir or t.get("output_dir", "./models/healthcare-lora")
+    if get_device() == "cpu":
+        threads = setup_cpu_threads(config)
+        if main_process and world_size() > 1:
+            print(f"Distributed    : {world_size()} ranks (gloo), {threads} threads each")
+
+    precision = resolve_precision(precision or t.get("precision", "auto"), get_device())
+    model, tokenizer = setup_model_and_tokenizer(config, precision)
+    model = setup_lora(model, config)
+    compute_dtype = apply_precision(model, precision)
+    if main_process:
+        print(f"Precision      : {precision} (activations {str(compute_dtype).replace('torch.', '')}, "
+              f"LoRA float32) — weights {weight_bytes(model) / 2**20:,.0f} MB")
+
+    model_name = config["model"]["name"]
+    max_len = t.get("max_seq_length", 512)
+    packing = t.get("packing", False) if packing is None else packing
+    batch_order = t.get("batch_order", "random")
+    if batch_order not in BATCH_ORDERS:
+        raise ValueError(f"training.batch_order must be one of {', '.join(BATCH_ORDERS)}, "
+                         f"not {batch_order!r}")
+    curriculum_epochs = t.get("curriculum_epochs", 1) if batch_order == "curriculum" else 0
+    eval_jsonl = Path(data_file).parent / "eval.jsonl"
+    token_prefix = tokens_prefix(data_file)
+    tokenized = bool(token_prefix) or packing
+
+    if tokenized:
+        has_eval = bool(tokens_prefix(str(Path(data_file).parent / "eval.tokens"))) or \
+            (packing and eval_jsonl.exists())
+        training_args = TrainingArguments(
+            **training_kwargs(t, out, has_eval),
+            remove_unused_columns=False,
+        )
+        if not token_prefix:
+            # rank 0 tokenizes; the other ranks wait, then read its files
+            with training_args.main_process_first(desc="tokenizing"):
+                token_prefix = ensure_tokenized(data_file, tokenizer, model_name, max_len)
+                if eval_jsonl.exists():
+                    ensure_tokenized(str(eval_jsonl), tokenizer, model_name, max_len)
+
+        train_dataset, eval_dataset = load_tokenized_data(token_prefix, model_name, max_len)
+        if training_args.gradient_checkpointing:
+            model.enable_input_require_grads()  # LoRA: frozen embeddings + checkpointing
+        pad_token_id = train_dataset.meta["pad_token_id"]
+        if packing:
+            train_dataset = PackedDataset(train_dataset, max_len)
+            if main_process:
+                print(train_dataset.report())
+            if eval_dataset is not None:
+                eval_dataset = PackedDataset(eval_dataset, max_len)
+            trainer = Trainer(
+                model=model,
+                processing_class=tokenizer,
+                train_dataset=train_dataset,
+                eval_dataset=eval_dataset,
+                data_collator=PackedCollator(pad_token_id, mask_dtype=compute_dtype),
+                args=training_args,
+            )
+        else:
+            trainer = BucketedTrainer(
+                model=model,
+                processing_class=tokenizer,
+                train_dataset=train_dataset,
+                eval_dataset=eval_dataset,
+                data_collator=PadCollator(pad_token_id, max_length=max_len),
+                args=training_args,
+                curriculum_epochs=curriculum_epochs,
+            )
+    else:
+        train_dataset, eval_dataset = load_training_data(data_file, str(eval_jsonl))
+
+        training_args = SFTConfig(
+            **training_kwargs(t, out, eval_dataset is not None),
+            # SFTConfig-specific
+            dataset_text_field="text",
+            max_length=t.get("max_seq_length", 512),
+            packing=False,
+        )
+
+        grouped = {} if batch_order == "random" else {"curriculum_epochs": curriculum_epochs}
+        trainer = (LengthGroupedSFTTrainer if grouped else SFTTrainer)(
+            model=model,
+            processing_class=tokenizer,
+            train_dataset=train_dataset,
+            eval_dataset=eval_dataset,
+            args=training_args,
+            **grouped,
+        )
+        if main_process and training_args.per_device_train_batch_size > 1:
+            lengths = trainer.train_lengths if grouped else \
+                example_lengths(trainer.train_dataset, tokenizer, max_len)
+            sampler = LengthGroupedSampler(lengths, training_args.per_device_train_batch_size,
+                                           training_args.seed, curriculum_epochs)
+            print(length_grouping_report(lengths, training_args.per_device_train_batch_size,
+                                         sampler, training_args.seed)
+                  + ("" if grouped else " (set training.batch_order: length to use it)"))
+
+    metrics_file = metrics_file or t.get("metrics_file", "metrics.jsonl")
+    if metrics_file:
+        metrics_file = str(Path(out) / metrics_file)  # an absolute path stays as is
+    trainer.add_callback(MetricsCallback(metrics_file))
+
+    if main_process:
+        print(f"\nOutput directory: {out}")
+        print(f"Epochs          : {t.get('num_train_epochs', 3)}")
+        print(f"Max seq length  : {max_len}{' (packed)' if packing else ''}")
+        if not packing:
+            print(f"Batch order     : {batch_order}"
+                  + (f" ({curriculum_epochs} epoch(s) short to long)" if curriculum_epochs else ""))
+        print("\nStarting training — watch for 'loss' decreasing each epoch...\n")
 
-    trainer.train(resume_from_checkpoint=resume_from)
+    trainer.train(resume_from_checkpoint=resolve_checkpoint(resume_from, out))
 
-    print("\nSaving model...")
-    trainer.save_model(out)
-    tokenizer.save_pretrained(out)
+    trainer.save_model(out)  # writes on rank 0 only
+    if trainer.is_world_process_zero():
+        print("\nSaving model...")
+        tokenizer.save_pretrained(out)
 
-    print("\n" + "=" * 60)
-    print("  Training complete!")
-    print("=" * 60)
-    print(f"\nAdapter saved to: {out}")
-    print("\nNext: python scripts/inference.py --model", out)
+        print("\n" + "=" * 60)
+        print("  Training complete!")
+        print("=" * 60)
+        print(f"\nAdapter saved to: {out}")
+        print("\nNext: python scripts/inference.py --model", out)
 
 
 def main():
     parser = argparse.ArgumentParser(description="Fine-tune TinyLlama 1.1B with LoRA (CPU)")
     parser.add_argument("--config", type=str, default="./configs/lora_config.yaml")
     parser.add_argument("--data", type=str, default="./data/processed/train.jsonl",
-                        help="Path to training JSONL file")
+                        help="Training JSONL file, or train.tokens.bin from prepare_data.py --tokenizer")
     parser.add_argument("--output", type=str, default="./models/healthcare-lora",
                         help="Directory to save the LoRA adapter")
-    parser.add_argument("--resume-from", type=str, default=None)
+    parser.add_argument("--resume-from", type=str, default=None,
+                        help='Checkpoint directory to resume from, or "latest" in --output')
+    parser.add_argument("--packing", action=argparse.BooleanOptionalAction, default=None,
+                        help="Pack examples into full windows (default: training.packing in the config)")
+    parser.add_argument("--precision", choices=PRECISIONS, default=None,
+                        help="Base-weight precision (default: training.precision in the config)")
+    parser.add_argument("--metrics-file", type=str, default=None,
+                        help="Per-step metrics JSONL, relative to --output (default: training.metrics_file)")
     args = parser.parse_args()
-    train(args.config, args.data, args.output, args.resume_from)
+    train(args.config, args.data, args.output, args.resume_from, args.packing, args.precision,
+          args.metrics_file)
 
 
 if __name__ == "__main__":
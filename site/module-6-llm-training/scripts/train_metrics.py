@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Throughput and memory instrumentation for train.py
+
+MetricsCallback appends one JSON line per optimizer step to a metrics file
+(default: <output>/metrics.jsonl) and prints a summary when training ends:
+
+    step_time      seconds from the end of the previous step to the end of
+                   this one (data_wait + compute)
+    data_wait      time spent fetching and collating the step's batches
+    compute        forward + backward + optimizer step
+    recompute      part of compute spent re-running checkpointed layers in
+                   backward (gradient checkpointing)
+    tokens_per_s   input tokens (padding included) per second of step_time
+    samples_per_s  examples (or packed windows) per second
+    peak_rss_mb    peak resident memory of this process so far
+
+Trainer "log" events (loss, learning rate, ...) are written to the same file
+with "event": "log", so one file has everything for a run. Resumed runs
+append after an "event": "start" line.
+
+How the times are taken, with only callback hooks:
+  - the Trainer fetches a step's batches between on_step_end of one step and
+    on_step_begin of the next; logging, evaluation and checkpoint saves also
+    happen there but end in on_log / on_evaluate / on_save, which move the
+    mark forward, so they are not counted as data wait.
+  - recomputation is a decoder layer running forward after the model's
+    forward has returned — i.e. during backward.
+
+Only the main process writes; peak RSS is rank 0's.
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from transformers import TrainerCallback
+
+try:
+    from transformers.modeling_layers import GradientCheckpointingLayer
+except ImportError:  # transformers < 4.52
+    GradientCheckpointingLayer = None
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (nan where unavailable)"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0-100)"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def _checkpointed_layers(model):
+    for module in model.modules():
+        if GradientCheckpointingLayer is not None:
+            if isinstance(module, GradientCheckpointingLayer):
+                yield module
+        elif type(module).__name__.endswith("DecoderLayer"):
+            yield module
+
+
+class RecomputeTimer:
+    """Time decoder-layer forwards that run during backward"""
+
+    def __init__(self, model):
+        self.total = 0.0
+        self._in_backward = False
+        self._started = {}
+        self._handles = [
+            model.register_forward_pre_hook(self._model_begin),
+            model.register_forward_hook(self._model_end),
+        ]
+        for layer in _checkpointed_layers(model):
+            self._handles.append(layer.register_forward_pre_hook(self._layer_begin))
+            self._handles.append(layer.register_forward_hook(self._layer_end))
+
+    def _model_begin(self, module, args):
+        self._in_backward = False
+
+    def _model_end(self, module, args, output):
+        self._in_backward = True
+
+    def _layer_begin(self, module, args):
+        if self._in_backward:
+            self._started[id(module)] = time.perf_counter()
+
+    def _layer_end(self, module, args, output):
+        start = self._started.pop(id(module), None)
+        if start is not None:
+            self.total += time.perf_counter() - start
+
+    def remove(self):
+        for handle in self._handles:
+            handle.remove()
+
+
+class MetricsCallback(TrainerCallback):
+    def __init__(self, metrics_file: Optional[str]):
+        self.metrics_file = metrics_file
+        self.out = None
+        self.recompute = None
+        self.step_times, self.waits, self.computes = [], [], []
+        self.recompute_total = 0.0
+        self.tokens_total = 0
+        self.samples_total = 0
+
+    def _write(self, record: Dict):
+        if self.out is not None:
+            self.out.write(json.dumps(record) + "\n")
+            self.out.flush()
+
+    def on_train_begin(self, args, state, control, model=None, **kwargs):
+        if state.is_world_process_zero and self.metrics_file:
+            Path(self.metrics_file).parent.mkdir(parents=True, exist_ok=True)
+            self.out = open(self.metrics_file, "a")
+            self._write({"event": "start", "time": time.time(), "global_step": state.global_step,
+                         "world_size": args.world_size,
+                         "per_device_train_batch_size": args.per_device_train_batch_size,
+                         "gradient_accumulation_steps": args.gradient_accumulation_steps})
+        if args.gradient_checkpointing and model is not None:
+            self.recompute = RecomputeTimer(model)
+        self.samples_per_step = (args.per_device_train_batch_size
+                                 * args.gradient_accumulation_steps * args.world_size)
+        self.tokens_seen = state.num_input_tokens_seen
+        self.train_start = time.perf_counter()
+        self.mark = self.train_start
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self.mark = time.perf_counter()
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        self.step_start = time.perf_counter()
+        self.wait = self.step_start - self.mark
+        self.recompute_start = self.recompute.total if self.recompute else 0.0
+
+    def on_step_end(self, args, state, control, **kwargs):
+        now = time.perf_counter()
+        compute = now - self.step_start
+        step_time = compute + self.wait
+        recompute = (self.recompute.total - self.recompute_start) if self.recompute else 0.0
+        tokens = state.num_input_tokens_seen - self.tokens_seen
+        self.tokens_seen = state.num_input_tokens_seen
+        self.mark = now
+
+        self.step_times.append(step_time)
+        self.waits.append(self.wait)
+        self.computes.append(compute)
+        self.recompute_total += recompute
+        self.tokens_total += tokens
+        self.samples_total += self.samples_per_step
+        self._write({
+            "event": "step",
+            "step": state.global_step,
+            "epoch": state.epoch,
+            "step_time": round(step_time, 4),
+            "data_wait": round(self.wait, 4),
+            "compute": round(compute, 4),
+            "recompute": round(recompute, 4),
+            "tokens": tokens,
+            "tokens_per_s": round(tokens / step_time, 1),
+            "samples_per_s": round(self.samples_per_step / step_time, 3),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        })
+
+    # logging, evaluation and saving happen between steps; don't count them as data wait
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        self._write({"event": "log", "step": state.global_step, **(logs or {})})
+        self.mark = time.perf_counter()
+
+    def on_evaluate(self, args, state, control, **kwargs):
+        self.mark = time.perf_counter()
+
+    def on_save(self, args, state, control, **kwargs):
+        self.mark = time.perf_counter()
+
+    def on_train_end(self, args, state, control, **kwargs):
+        if self.recompute is not None:
+            self.recompute.remove()
+        summary = self.summary(time.perf_counter() - self.train_start)
+        self._write({"event": "summary", **summary})
+        if state.is_world_process_zero:
+            print(self.report(summary))
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+
+    def summary(self, wall: float) -> Dict:
+        busy = sum(self.step_times) or float("nan")
+        return {
+            "steps": len(self.step_times),
+            "wall_time": round(wall, 2),
+            "tokens": self.tokens_total,
+            "tokens_per_s": round(self.tokens_total / busy, 1),
+            "samples_per_s": round(self.samples_total / busy, 3),
+            "step_time_p50": round(percentile(self.step_times, 50), 4),
+            "step_time_p90": round(percentile(self.step_times, 90), 4),
+            "step_time_p99": round(percentile(self.step_times, 99), 4),
+            "data_wait": round(sum(self.waits), 2),
+            "data_wait_pct": round(100 * sum(self.waits) / busy, 1),
+            "recompute": round(self.recompute_total, 2),
+            "recompute_pct": round(100 * self.recompute_total / busy, 1),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+
+    def report(self, s: Dict) -> str:
+        lines = [
+            "\nTraining metrics" + (f" (details: {self.metrics_file})" if self.metrics_file else "") + ":",
+            f"  Steps           : {s['steps']} in {s['wall_time']:.0f}s",
+            f"  Throughput      : {s['tokens_per_s']:,.0f} tokens/s, {s['samples_per_s']:.2f} samples/s",
+            f"  Step time       : p50 {s['step_time_p50']:.2f}s  p90 {s['step_time_p90']:.2f}s  "
+            f"p99 {s['step_time_p99']:.2f}s",
+            f"  Data-loader wait: {s['data_wait']:.1f}s ({s['data_wait_pct']:.1f}% of step time)",
+            f"  Recomputation   : {s['recompute']:.1f}s ({s['recompute_pct']:.1f}% of step time)",
+            f"  Peak RSS        : {s['peak_rss_mb']:,.0f} MB",
+        ]
+        return "\n".join(lines)